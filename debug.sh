@@ -1,6 +1,7 @@
 export VM_PATH="/data/code/VM/Ubuntu.vmx"
 export DEBUG_MODE=True
-# export ACTION_PATH="/data/code/ScienceBoard/logs/tars_dpo-vm-screenshot/Celestia/A-01/request_mono.json"
+# export MODEL_CACHE_PATH="/data/code/ScienceBoard/cache"
+# export MODEL_CACHE_MODE=replay
 export TASK_PATH='./tasks/VM/ChimeraX/A-01.json'
 # export DEBUG_ERR_FACT=True
 
@@ -3,19 +3,18 @@ import os
 import json
 import subprocess
 
-from typing import Dict, Any, Self
+from typing import Dict, Any, Optional, Self
 
 import requests
 from PIL import Image
 
 sys.dont_write_bytecode = True
 from ..base import Manager
+from ..base.utils import error_factory
 from ..vm import VManager
 
 
 class ManagerMixin:
-    STARTUP_WAIT_TIME = 5
-
     def __init__(self, ip: str, port: int) -> None:
         # legality is not checked due to inner usage
         self.base_url = f"http://{ip}:{port}"
@@ -32,6 +31,10 @@ class ManagerMixin:
     def status_version(self) -> str:
         return self._get("/version").text
 
+    # probe of wait_ready(): server is up with the expected version
+    def status_ready(self) -> bool:
+        return self.http_ready("/version")
+
     def status_dump(self, query) -> Dict[str, Any]:
         return self._post("/dump", data=json.dumps(query)).json()
 
@@ -70,10 +73,18 @@ class RawManager(Manager, ManagerMixin):
             text=True
         )
 
-        Manager.pause(self.STARTUP_WAIT_TIME)
-        assert self.status_version() == self.version
+        self.wait_ready(self.__ready)
         return super().__enter__()
 
+    def __ready(self) -> bool:
+        assert self.process.poll() is None, "Celestia exited unexpectedly"
+        return self.status_ready()
+
+    # HTTP server shares event loop of app, answering after pending inputs
+    @error_factory(False)
+    def ready(self) -> Optional[bool]:
+        return self.__ready()
+
     def __exit__(self, exc_type, exc_value, traceback) -> None:
         self.process.kill()
         super().__exit__(exc_type, exc_value, traceback)
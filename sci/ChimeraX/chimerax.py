@@ -52,7 +52,6 @@ class RawManager(Manager, ManagerMixin):
         ]
     }
     TIMEOUT = 15
-    REST_FLAG: str = "REST server started"
     BASE_URL: Callable[[int], str] = lambda port: f"http://localhost:{port}/run"
     TOOL_URL: Callable[[str], str] = lambda version: \
         f"https://github.com/ShiinaHiiragi/chimerax-states/archive/refs/tags/{version}.zip"
@@ -152,19 +151,26 @@ class RawManager(Manager, ManagerMixin):
             if self.path is not None \
             else RawManager.SORT_MAP[self.sort]
 
+        # stdout is not read, and should not be piped to block ChimeraX
         self.process = subprocess.Popen([
             *startup_commands,
             *nogui,
             "--cmd",
             f"remotecontrol rest start json true port {self.port}",
-        ], stdout=subprocess.PIPE, text=True)
-
-        timeout = time.time() + RawManager.TIMEOUT
-        while True:
-            if self.process.stdout.readline().startswith(RawManager.REST_FLAG):
-                self.__prepare_env(self.version)
-                return super().__enter__()
-            assert time.time() <= timeout, "Timeout when opening ChimeraX"
+        ], stdout=subprocess.DEVNULL, text=True)
+
+        self.wait_ready(self.__ready, RawManager.TIMEOUT)
+        self.__prepare_env(self.version)
+        return super().__enter__()
+
+    # REST server is started and able to run commands
+    def __ready(self) -> bool:
+        assert self.process.poll() is None, "ChimeraX exited unexpectedly"
+        return requests.get(
+            RawManager.BASE_URL(self.port),
+            params={"command": "version"},
+            timeout=Manager.PROBE_TIMEOUT
+        ).json()["error"] is None
 
     def __exit__(self, exc_type, exc_value, traceback) -> None:
         self.process.kill()
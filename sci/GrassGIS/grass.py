@@ -3,19 +3,18 @@ import os
 import signal
 import subprocess
 
-from typing import Dict, Self
+from typing import Dict, Optional, Self
 
 import requests
 from PIL import Image
 
 sys.dont_write_bytecode = True
 from ..base import Manager
+from ..base.utils import error_factory
 from ..vm import VManager
 
 
 class ManagerMixin:
-    STARTUP_WAIT_TIME = 5
-
     def __init__(self, ip: str, port: int) -> None:
         # legality is not checked due to inner usage
         self.base_url = f"http://{ip}:{port}"
@@ -30,7 +29,11 @@ class ManagerMixin:
         )
 
     def status_version(self) -> str:
-        return self._get("version").text
+        return self._get("/version").text
+
+    # probe of wait_ready(): server is up with the expected version
+    def status_ready(self) -> bool:
+        return self.http_ready("/version")
 
     def operate_cmd(self) -> bool:
         return self._get("/init/cmd").text == "OK"
@@ -103,10 +106,15 @@ class RawManager(Manager, ManagerMixin):
             f"{self.data_path}/world_latlong_wgs84/PERMANENT\"",
         ), shell=True, stdout=subprocess.PIPE, text=True)
 
-        Manager.pause(self.STARTUP_WAIT_TIME)
-        assert self.status_version() == self.version
+        # grass is started in a terminal detached from self.process
+        self.wait_ready(self.status_ready)
         return super().__enter__()
 
+    # HTTP server shares event loop of app, answering after pending inputs
+    @error_factory(False)
+    def ready(self) -> Optional[bool]:
+        return self.status_ready()
+
     def __exit__(self, exc_type, exc_value, traceback) -> None:
         self.operate_quit()
         super().__exit__(exc_type, exc_value, traceback)
@@ -2,13 +2,14 @@ import sys
 import os
 import subprocess
 
-from typing import List, Dict, Union, Self
+from typing import List, Dict, Union, Optional, Self
 
 import requests
 from PIL import Image
 
 sys.dont_write_bytecode = True
 from ..base import Manager
+from ..base.utils import error_factory
 from ..vm import VManager
 
 
@@ -29,6 +30,10 @@ class ManagerMixin:
     def status_version(self) -> str:
         return self._get("/version").text
 
+    # probe of wait_ready(): server is up with the expected version
+    def status_ready(self) -> bool:
+        return self.http_ready("/version")
+
     def status_vars(self) -> Dict[str, str]:
         return self._get("/vars").json()
 
@@ -91,10 +96,18 @@ class RawManager(Manager, ManagerMixin):
             text=True
         )
 
-        Manager.pause()
-        assert self.status_version() == self.version
+        self.wait_ready(self.__ready)
         return super().__enter__()
 
+    def __ready(self) -> bool:
+        assert self.process.poll() is None, "KAlgebra exited unexpectedly"
+        return self.status_ready()
+
+    # HTTP server shares event loop of app, answering after pending inputs
+    @error_factory(False)
+    def ready(self) -> Optional[bool]:
+        return self.__ready()
+
     def __exit__(self, exc_type, exc_value, traceback) -> None:
         self.process.kill()
         super().__exit__(exc_type, exc_value, traceback)
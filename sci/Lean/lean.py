@@ -1,9 +1,8 @@
 import sys
 import os
 import json
-import subprocess
 
-from typing import Dict, List, Union
+from typing import Dict, List, Union, Optional
 from typing import Callable, Self
 
 sys.dont_write_bytecode = True
@@ -11,13 +10,18 @@ from ..base import utils
 from ..base import Manager, PromptFactory
 from ..vm import VManager
 from .format import *
+from .pool import REPL, REPLPool
 
 
 # simple encapsulation of Lean REPL
+# - pool_size = 0 (default): a fresh REPL is started for each task
+# - pool_size > 0: REPLs are taken from REPLPool with preloads imported
+#   and commands of preloads are answered by their env ids
 class RawManager(Manager):
     Message = Dict[str, Union[str, int]]
     REPL_URL = "https://github.com/leanprover-community/repl"
     TIMEOUT = 120
+    POOL_DIRNAME = ".pool"
 
     # lower version NG (e.g. v4.9.0)
     VERSION_MAP = {
@@ -29,7 +33,9 @@ class RawManager(Manager):
     def __init__(
         self,
         version: str = "0.1",
-        lib_path: str = None
+        lib_path: str = None,
+        pool_size: int = 0,
+        preloads: List[str] = ["import Mathlib"]
     ) -> None:
         # this assertion is prior to __check_version()
         assert version in RawManager.VERSION_MAP
@@ -47,6 +53,23 @@ class RawManager(Manager):
         else:
             self.__version()
 
+        assert isinstance(pool_size, int) and pool_size >= 0
+        self.pool_size = pool_size
+        self.preloads = list(preloads)
+        self.repl: Optional[REPL] = None
+
+    @property
+    def pool(self) -> Optional[REPLPool]:
+        if self.pool_size == 0:
+            return None
+        return REPLPool.get(
+            self.cwd_path,
+            size=self.pool_size,
+            headers=self.preloads,
+            pickle_path=os.path.join(self.lib_path, RawManager.POOL_DIRNAME),
+            tag=RawManager.VERSION_MAP[self.version]["tag"]
+        )
+
     def set_headers(self, func: Callable) -> None:
         setattr(self.__class__, "headers", property(func))
 
@@ -66,27 +89,22 @@ class RawManager(Manager):
         with utils.temp_chdir(self.lib_path):
             assert os.system(f"git checkout tags/{tag_name} --quiet") == 0
 
-    def __read(self) -> Dict:
-        raw_outputs = ""
-        read_line = lambda: self.process.stdout.readline()
-
-        while (line := read_line()) == "\n": ...
-        raw_outputs += line
-
-        while (line := read_line()) != "\n":
-            raw_outputs += line
-        return json.loads(raw_outputs)
-
     def _call(self, query: Message, tactic_only: bool = False) -> REPLOutput:
         input = REPLInput.from_dict(query)
         output = None
         force = lambda input: ("sorry" in input.tactic) or ("admit" in input.tactic)
 
-        if (isinstance(input, REPLInputTactic) and not force(input)) \
+        # preloads: forked from their envs instead of imported again
+        if isinstance(input, REPLInputCommand) and not tactic_only \
+            and input.env is None and input.cmd in self.repl.envs:
+            output = REPLOutputCommand(input=query, env=self.repl.envs[input.cmd])
+
+        elif (isinstance(input, REPLInputTactic) and not force(input)) \
             or (not tactic_only and isinstance(input, REPLInputCommand)):
-            self.process.stdin.write(input.dumps())
-            self.process.stdin.flush()
-            output = REPLOutput.from_dict(input=input, output=self.__read())
+            output = REPLOutput.from_dict(
+                input=input,
+                output=self.repl.call(json.loads(input.dumps()))
+            )
 
         else:
             message = "Could not apply `sorry` or `admit` in tactic mode." \
@@ -109,22 +127,29 @@ class RawManager(Manager):
 
         return not output.is_error()
 
+    # latency of acquiring is recorded as startup, near 0 if pool is warm
     def __enter__(self) -> Self:
-        self.process = subprocess.Popen(
-            "lake env ../../.lake/build/bin/repl",
-            shell=True,
-            cwd=self.cwd_path,
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            encoding="utf-8"
-        )
+        # REPL is spawned once and polled by handshakes until it responds
+        if self.pool is None:
+            self.repl = REPL(self.cwd_path)
+            self.repl.spawn()
+            self.wait_ready(self.repl.handshake, RawManager.TIMEOUT)
+        else:
+            self.wait_ready(self.__acquire, REPL.HEADER_TIMEOUT)
 
         self.history.clear()
         return super().__enter__()
 
+    def __acquire(self) -> bool:
+        self.repl = self.pool.acquire(timeout=Manager.PROBE_TIMEOUT)
+        return self.repl is not None
+
     def __exit__(self, exc_type, exc_value, traceback) -> None:
-        self.process.kill()
+        if self.pool is None:
+            self.repl.kill()
+        else:
+            self.pool.release(self.repl)
+        self.repl = None
         return super().__exit__(exc_type, exc_value, traceback)
 
     def textual(self) -> str:
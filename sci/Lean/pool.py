@@ -0,0 +1,277 @@
+import sys
+import os
+import json
+import signal
+import time
+import queue
+import atexit
+import hashlib
+import threading
+import subprocess
+
+from typing import Optional, List, Dict, Any
+
+sys.dont_write_bytecode = True
+from ..base import Manager, VirtualLog
+
+
+# a REPL process read by a background thread
+# so that calls can time out instead of blocking forever
+# headers are imported (or unpickled) once, whose env ids are kept in envs
+class REPL:
+    COMMAND = "lake env ../../.lake/build/bin/repl"
+    # command without imports to tell whether REPL is responding
+    HANDSHAKE = {"cmd": "example : True := trivial"}
+    HANDSHAKE_TIMEOUT = 120
+    HEADER_TIMEOUT = 900
+
+    def __init__(
+        self,
+        cwd_path: str,
+        headers: List[str] = [],
+        pickle_path: Optional[str] = None,
+        tag: str = ""
+    ) -> None:
+        self.cwd_path = cwd_path
+        self.headers = list(headers)
+        self.pickle_path = pickle_path
+        self.tag = tag
+
+        self.process: Optional[subprocess.Popen] = None
+        self.lines: "queue.Queue[Optional[str]]" = queue.Queue()
+        # lines of output not completed when reading timed out
+        self.partial = ""
+        self.greeting = False
+        self.envs: Dict[str, int] = {}
+        self.calls = 0
+        self.busy_since: Optional[float] = None
+        # a query is sent but its answer is not read yet
+        self.pending = False
+
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def hung(self, timeout: float) -> bool:
+        busy_since = self.busy_since
+        return busy_since is not None and time.time() - busy_since > timeout
+
+    @staticmethod
+    def __pump(process: subprocess.Popen, lines: "queue.Queue[Optional[str]]") -> None:
+        for line in process.stdout:
+            lines.put(line)
+        lines.put(None)
+
+    # EOFError if REPL exits, TimeoutError if it does not respond in time
+    # output read before timeout is kept for the next read
+    def __read(self, timeout: float) -> Dict[str, Any]:
+        deadline = time.time() + timeout
+        while True:
+            try:
+                line = self.lines.get(timeout=max(0, deadline - time.time()))
+            except queue.Empty:
+                raise TimeoutError(f"REPL did not respond in {timeout}s")
+            if line is None:
+                raise EOFError("REPL exited unexpectedly")
+            if line == "\n" and self.partial == "":
+                continue
+            if line == "\n":
+                raw_outputs, self.partial = self.partial, ""
+                return json.loads(raw_outputs)
+            self.partial += line
+
+    # REPL is killed if it times out, as its late answer
+    # would otherwise be read as the answer of the next query
+    def call(self, query: Dict[str, Any], timeout: float = Manager.HOMO_TIMEOUT) -> Dict[str, Any]:
+        assert self.alive() and not self.pending, "REPL is not ready"
+        self.busy_since, self.pending = time.time(), True
+        try:
+            self.process.stdin.write(json.dumps(query, ensure_ascii=False) + "\n\n")
+            self.process.stdin.flush()
+            output = self.__read(timeout)
+            self.pending = False
+            return output
+        except TimeoutError:
+            self.kill()
+            raise
+        finally:
+            self.busy_since = None
+            self.calls += 1
+
+    def __pickle_file(self, header: str) -> Optional[str]:
+        if self.pickle_path is None:
+            return None
+        digest = hashlib.sha1(f"{self.tag}\n{header}".encode("utf-8")).hexdigest()
+        return os.path.join(self.pickle_path, f"{digest[:16]}.olean")
+
+    # unpickling is tried first, and failures fall back to importing
+    def __load(self, header: str) -> int:
+        pickle_file = self.__pickle_file(header)
+        if pickle_file is not None and os.path.exists(pickle_file):
+            output = self.call({"unpickleEnvFrom": pickle_file}, self.HEADER_TIMEOUT)
+            if "env" in output:
+                return output["env"]
+
+        output = self.call({"cmd": header}, self.HEADER_TIMEOUT)
+        assert "env" in output, f"Failed to load header `{header}`: {output}"
+        if pickle_file is not None:
+            os.makedirs(self.pickle_path, exist_ok=True)
+            self.call({"pickleTo": pickle_file, "env": output["env"]}, self.HEADER_TIMEOUT)
+        return output["env"]
+
+    def spawn(self) -> None:
+        self.kill()
+        self.process = subprocess.Popen(
+            self.COMMAND,
+            shell=True,
+            cwd=self.cwd_path,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            encoding="utf-8",
+            start_new_session=sys.platform != "win32"
+        )
+        self.lines = queue.Queue()
+        threading.Thread(
+            target=REPL.__pump,
+            args=(self.process, self.lines),
+            daemon=True
+        ).start()
+        self.envs, self.calls = {}, 0
+        self.partial, self.greeting, self.pending = "", False, False
+
+    # probe of wait_ready(): handshake is sent once and awaited
+    # for at most timeout in each call until it is answered,
+    # so that a hung REPL does not block beyond deadline of caller
+    # AssertionError is raised if REPL exits during startup
+    def handshake(self, timeout: float = Manager.PROBE_TIMEOUT) -> bool:
+        assert self.alive(), "REPL exited during startup"
+        if not self.greeting:
+            self.process.stdin.write(json.dumps(self.HANDSHAKE) + "\n\n")
+            self.process.stdin.flush()
+            self.greeting = True
+
+        try:
+            output = self.__read(timeout)
+        except TimeoutError:
+            return False
+        except EOFError:
+            raise AssertionError("REPL exited during startup")
+        self.greeting = False
+        return "env" in output
+
+    # return True if REPL responds and all headers are loaded
+    # AssertionError is raised if REPL exits or does not respond
+    def start(self) -> bool:
+        self.spawn()
+        deadline = time.time() + self.HANDSHAKE_TIMEOUT
+        while not self.handshake(min(Manager.PROBE_TIMEOUT, self.HANDSHAKE_TIMEOUT)):
+            assert time.time() < deadline, \
+                f"REPL did not respond in {self.HANDSHAKE_TIMEOUT}s"
+
+        try:
+            for header in self.headers:
+                self.envs[header] = self.__load(header)
+        except (EOFError, TimeoutError) as err:
+            raise AssertionError(f"REPL failed during startup: {err}")
+        return True
+
+    # REPL is a grandchild of shell and lake, so the whole group is killed
+    def kill(self) -> None:
+        if self.process is not None and self.process.poll() is None:
+            if sys.platform == "win32":
+                self.process.kill()
+            else:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            self.process.wait()
+
+
+# long-lived REPLs shared by Lean.RawManager of the same lib path
+# - tasks are isolated by env ids rather than by processes:
+#   each task starts from env of a preloaded header and forks from there
+# - REPLs are recycled after RECYCLE_CALLS to release memory of old envs
+# - watchdog kills REPLs busy for more than HANG_TIMEOUT
+#   and restarts dead ones in background
+# use REPLPool.get() instead of REPLPool() to share instances
+class REPLPool:
+    HANG_TIMEOUT = Manager.HOMO_TIMEOUT
+    WATCHDOG_INTERVAL = 5
+    RECYCLE_CALLS = 1000
+
+    POOLS: Dict[str, "REPLPool"] = {}
+    LOCK = threading.Lock()
+
+    def __init__(
+        self,
+        cwd_path: str,
+        size: int = 1,
+        headers: List[str] = [],
+        pickle_path: Optional[str] = None,
+        tag: str = ""
+    ) -> None:
+        assert isinstance(size, int) and size > 0
+        self.repls = [
+            REPL(cwd_path, headers, pickle_path, tag)
+            for _ in range(size)
+        ]
+        self.idle: "queue.Queue[REPL]" = queue.Queue()
+        self.vlog = VirtualLog()
+
+        self.closed = threading.Event()
+        for repl in self.repls:
+            self.__restart(repl)
+        threading.Thread(target=self.__watchdog, daemon=True).start()
+
+    @staticmethod
+    def get(cwd_path: str, *args, **kwargs) -> "REPLPool":
+        key = os.path.abspath(cwd_path)
+        with REPLPool.LOCK:
+            if key not in REPLPool.POOLS:
+                if len(REPLPool.POOLS) == 0:
+                    atexit.register(REPLPool.close_all)
+                REPLPool.POOLS[key] = REPLPool(cwd_path, *args, **kwargs)
+            return REPLPool.POOLS[key]
+
+    @staticmethod
+    def close_all() -> None:
+        with REPLPool.LOCK:
+            for pool in REPLPool.POOLS.values():
+                pool.close()
+            REPLPool.POOLS.clear()
+
+    def __restart(self, repl: REPL) -> None:
+        def restart():
+            while not self.closed.is_set():
+                try:
+                    repl.start()
+                    self.idle.put(repl)
+                    return
+                except Exception as err:
+                    self.vlog.error(f"Failed to start Lean REPL: {err}; retrying.")
+                    time.sleep(self.WATCHDOG_INTERVAL)
+        threading.Thread(target=restart, daemon=True).start()
+
+    def __watchdog(self) -> None:
+        while not self.closed.wait(self.WATCHDOG_INTERVAL):
+            for repl in self.repls:
+                if repl.hung(self.HANG_TIMEOUT):
+                    self.vlog.warning(f"Lean REPL hung for over {self.HANG_TIMEOUT}s; killed.")
+                    repl.kill()
+
+    # None if no REPL is ready in time
+    def acquire(self, timeout: Optional[float] = None) -> Optional[REPL]:
+        try:
+            return self.idle.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    # dead, worn or pending REPLs are restarted before being handed out again
+    def release(self, repl: REPL) -> None:
+        if repl.alive() and not repl.pending and repl.calls < self.RECYCLE_CALLS:
+            self.idle.put(repl)
+        else:
+            self.__restart(repl)
+
+    def close(self) -> None:
+        self.closed.set()
+        for repl in self.repls:
+            repl.kill()
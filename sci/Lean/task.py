@@ -166,16 +166,30 @@ class VMTask(VTask, TaskMixin):
     def _query(self, expr: str) -> bool:
         self.__probe()
         self.buffer.append(self.query + "\n  sorry\n")
+        self.__warm()
         return self._append(
             path=self.BASE_PATH,
             content="\n".join(self.buffer)
         )
 
+    # Mathlib is loaded by server in background while agent is working
+    # servers without /lean/warm simply fall back to `lake build` in eval
+    def __warm(self) -> None:
+        try:
+            self.manager._request("POST/lean/warm", {})
+        except Exception: ...
+
     @Task._stop_handler
     def eval(self) -> bool:
         response = self.manager._request("POST/lean/check", {
             "json": {
                 "header": self.query
             }
-        })
-        return response.json()["pass"]
+        }).json()
+
+        if "latency" in response:
+            self.vlog.info(
+                f"Lean check by {response['mode']} "
+                f"took {response['latency']:.2f}s."
+            )
+        return response["pass"]
@@ -1,8 +1,11 @@
 import sys
 import os
+import importlib
+import threading
 
-from typing import Optional, Dict, Any
-from typing import Callable, TypeAlias
+from types import ModuleType
+from typing import Optional, Dict, Any, Iterable, Iterator
+from typing import Callable, TypeAlias, Mapping
 
 sys.dont_write_bytecode = True
 from . import TypeSort
@@ -59,20 +62,36 @@ def spawn_managers(
         }
     }
 
-def spawn_modules(manager_args: Optional[Config] = None):
-    from . import ChimeraX
-    from . import KAlgebra
-    from . import Celestia
-    from . import GrassGIS
-    from . import TeXstudio
-    from . import Lean
+# app packages are imported when first looked up
+# so that only apps present in the task tree are loaded
+class Modules(Mapping):
+    def __init__(self, names: Iterable[str]) -> None:
+        self.names = list(names)
+        self.lock = threading.Lock()
 
-    frozen = locals()
+    def __getitem__(self, name: str) -> ModuleType:
+        if name not in self.names:
+            raise KeyError(name)
+        with self.lock:
+            return importlib.import_module(f".{name}", __package__)
+
+    # checked without importing
+    def __contains__(self, name: object) -> bool:
+        return name in self.names
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.names)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+def spawn_modules(manager_args: Optional[Config] = None) -> Modules:
     if manager_args == None:
         manager_args = spawn_managers()
 
-    return {
-        type_sort.type: frozen[type_sort.type]
+    return Modules([
+        type_sort.type
         for type_sort in manager_args
         if type_sort.sort == TypeSort.Sort.Raw
-    }
+    ])
@@ -0,0 +1,255 @@
+import sys
+import os
+import re
+import time
+import glob
+import shutil
+import hashlib
+import tempfile
+import threading
+import subprocess
+
+from dataclasses import dataclass, asdict
+from typing import Optional, List, Dict, Tuple, Any
+
+sys.dont_write_bytecode = True
+
+# this module only depends on standard library
+# as it is also copied into VM to be imported by server
+
+
+@dataclass
+class Compiled:
+    passed: bool
+    # runs of pdflatex and bibtex
+    runs: int
+    latency: float
+    # whether preamble is loaded from format file
+    preloaded: bool = False
+
+    def _asdict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def __str__(self) -> str:
+        return (
+            f"passed={self.passed}, runs={self.runs}, "
+            f"latency={self.latency:.2f}s, preloaded={self.preloaded}"
+        )
+
+
+# pdflatex (and bibtex) of {path}/{file}.tex with states kept between calls
+# - .aux/.bbl are kept in build_path, so unchanged documents need one run
+# - pdflatex is rerun until aux files reach a fixed point
+# - bibtex is rerun only if citations in aux files change
+# - preamble may be dumped into a format file by mylatexformat
+# build_path is cleared and compiled again if a run fails with old states
+# use Compiler.get() instead of Compiler() to share instances
+class Compiler:
+    MAX_RUNS = 5
+    TIMEOUT = 120
+    AUX_EXTS = ("aux", "toc", "lof", "lot", "out", "nav", "snm", "bbl")
+    CITE_PATTERN = r"^\\(?:citation|bibdata|bibstyle)\{.*\}$"
+    BIB_PATTERN = r"^\\(bibdata|bibstyle)\{(.*)\}$"
+    BIB_EXTS = {"bibdata": "bib", "bibstyle": "bst"}
+    DOCUMENT_BEGIN = r"\begin{document}"
+    FORMAT_PREFIX = "preamble-"
+
+    COMPILERS: Dict[Tuple[str, str], "Compiler"] = {}
+    LOCK = threading.Lock()
+
+    def __init__(
+        self,
+        path: str,
+        file: str = "main",
+        build_path: Optional[str] = None,
+        preload: bool = False
+    ) -> None:
+        self.path = os.path.abspath(os.path.expanduser(path))
+        self.file = file
+        self.preload = preload
+
+        if build_path is None:
+            digest = hashlib.sha1(f"{self.path}/{file}".encode()).hexdigest()
+            build_path = os.path.join(tempfile.gettempdir(), f"tex-{digest[:16]}")
+        self.build_path = build_path
+
+        self.lock = threading.Lock()
+        self.cites: Optional[str] = None
+        # digests of preambles whose format files failed to build or broke documents
+        self.failed_formats: List[str] = []
+
+    @staticmethod
+    def get(path: str, file: str = "main", **kwargs) -> "Compiler":
+        key = (os.path.abspath(os.path.expanduser(path)), file)
+        with Compiler.LOCK:
+            if key not in Compiler.COMPILERS:
+                Compiler.COMPILERS[key] = Compiler(path, file, **kwargs)
+            return Compiler.COMPILERS[key]
+
+    @property
+    def env(self) -> Dict[str, str]:
+        # trailing separator keeps default search paths
+        search = self.path + os.pathsep
+        return {
+            **os.environ,
+            "TEXINPUTS": search + os.environ.get("TEXINPUTS", ""),
+            "BIBINPUTS": search + os.environ.get("BIBINPUTS", ""),
+            "BSTINPUTS": search + os.environ.get("BSTINPUTS", "")
+        }
+
+    def __run(self, *args: str, cwd: Optional[str] = None) -> bool:
+        try:
+            return subprocess.run(
+                args,
+                cwd=self.path if cwd is None else cwd,
+                env=self.env,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                timeout=self.TIMEOUT
+            ).returncode == 0
+        except subprocess.TimeoutExpired:
+            return False
+
+    def __digest(self, exts: Tuple[str, ...]) -> str:
+        digest = hashlib.sha1()
+        for ext in exts:
+            pattern = os.path.join(self.build_path, "**", f"*.{ext}")
+            for file_path in sorted(glob.glob(pattern, recursive=True)):
+                digest.update(file_path.encode())
+                with open(file_path, mode="rb") as readable:
+                    digest.update(readable.read())
+        return digest.hexdigest()
+
+    # citations in aux files and contents of .bib and .bst files they refer to,
+    # so that bibtex is rerun if either of them changes
+    # files not in self.path (e.g. styles of TeX Live) are regarded as unchanged
+    def __citations(self) -> str:
+        lines = []
+        pattern = os.path.join(self.build_path, "**", "*.aux")
+        for file_path in sorted(glob.glob(pattern, recursive=True)):
+            with open(file_path, mode="r", encoding="utf-8", errors="ignore") as readable:
+                lines += re.findall(self.CITE_PATTERN, readable.read(), re.MULTILINE)
+
+        digest = hashlib.sha1()
+        for line in lines:
+            if (match := re.match(self.BIB_PATTERN, line)) is None:
+                continue
+            ext = self.BIB_EXTS[match.group(1)]
+            for name in match.group(2).split(","):
+                file_path = os.path.join(self.path, name.strip())
+                if not file_path.endswith(f".{ext}"):
+                    file_path += f".{ext}"
+                if os.path.isfile(file_path):
+                    digest.update(file_path.encode())
+                    with open(file_path, mode="rb") as readable:
+                        digest.update(readable.read())
+        return "\n".join(lines + [digest.hexdigest()])
+
+    # aux files of \include{dir/file} are written into subdirectories
+    def __mirror(self) -> None:
+        os.makedirs(self.build_path, exist_ok=True)
+        for root, dirs, _ in os.walk(self.path):
+            dirs[:] = [name for name in dirs if not name.startswith(".")]
+            relative = os.path.relpath(root, self.path)
+            os.makedirs(os.path.join(self.build_path, relative), exist_ok=True)
+
+    # name of format file, None if preload is disabled or fails
+    def __format(self) -> Optional[str]:
+        if not self.preload or shutil.which("pdflatex") is None:
+            return None
+
+        with open(
+            os.path.join(self.path, f"{self.file}.tex"),
+            mode="r",
+            encoding="utf-8",
+            errors="ignore"
+        ) as readable:
+            preamble = readable.read().split(self.DOCUMENT_BEGIN)[0]
+        digest = hashlib.sha1(preamble.encode()).hexdigest()[:16]
+        if digest in self.failed_formats:
+            return None
+
+        name = f"{self.FORMAT_PREFIX}{digest}"
+        if os.path.exists(os.path.join(self.build_path, f"{name}.fmt")):
+            return name
+
+        if self.__run(
+            "pdflatex",
+            "-ini",
+            "-interaction=nonstopmode",
+            f"-output-directory={self.build_path}",
+            f"-jobname={name}",
+            "&pdflatex",
+            "mylatexformat.ltx",
+            f"{self.file}.tex"
+        ):
+            return name
+        self.failed_formats.append(digest)
+        return None
+
+    def __pdflatex(self, format_name: Optional[str]) -> bool:
+        args = [
+            "pdflatex",
+            "-interaction=nonstopmode",
+            "-halt-on-error",
+            f"-output-directory={self.build_path}"
+        ]
+        if format_name is not None:
+            args.append(f"-fmt={os.path.join(self.build_path, format_name)}")
+        return self.__run(*args, f"{self.file}.tex")
+
+    def __bibtex(self) -> bool:
+        return self.__run("bibtex", self.file, cwd=self.build_path)
+
+    # return (passed, runs)
+    def __compile(self, bibtex: bool, format_name: Optional[str]) -> Tuple[bool, int]:
+        runs = 0
+        while runs < self.MAX_RUNS:
+            before = self.__digest(self.AUX_EXTS)
+            runs += 1
+            if not self.__pdflatex(format_name):
+                return False, runs
+
+            if bibtex:
+                cites = self.__citations()
+                bbl_path = os.path.join(self.build_path, f"{self.file}.bbl")
+                if cites != self.cites or not os.path.exists(bbl_path):
+                    runs += 1
+                    if not self.__bibtex():
+                        return False, runs
+                    self.cites = cites
+
+            if self.__digest(self.AUX_EXTS) == before:
+                return True, runs
+        # aux files of some documents never settle (e.g. page references)
+        return True, runs
+
+    def __call__(self, bibtex: bool = False) -> Compiled:
+        start = time.time()
+
+        with self.lock:
+            fresh = not os.path.exists(self.build_path)
+            self.__mirror()
+            format_name = self.__format()
+            passed, runs = self.__compile(bibtex, format_name)
+
+            # stale states or format may break a correct document
+            if not passed and (not fresh or format_name is not None):
+                shutil.rmtree(self.build_path, ignore_errors=True)
+                self.cites, failed_format = None, format_name
+                format_name = None
+                self.__mirror()
+                passed, extra = self.__compile(bibtex, None)
+                runs += extra
+
+                # format is to blame if the document passes without it
+                if passed and failed_format is not None:
+                    self.failed_formats.append(failed_format[len(self.FORMAT_PREFIX):])
+
+        return Compiled(
+            passed=passed,
+            runs=runs,
+            latency=time.time() - start,
+            preloaded=format_name is not None
+        )
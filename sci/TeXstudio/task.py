@@ -44,6 +44,22 @@ class TaskMixin:
             before = before.replace(eval_item["source"], eval_item["target"])
         return before == after
 
+    @error_factory(False)
+    def _eval_compile(
+        self: Union["RawTask", "VMTask"],
+        eval_item: Dict[str, Any]
+    ) -> bool:
+        compiled = self.manager.compile_tex(
+            path=eval_item["path"],
+            file=eval_item["file"],
+            bibtex=len([
+                item for item in self.initialize
+                if item["func"] == "touch" and item["path"].endswith(".bib")
+            ]) > 0
+        )
+        self.vlog.info(f"Compiled {eval_item['file']}.tex: {compiled}.")
+        return compiled.passed
+
     @error_factory(False)
     def _eval_include(
         self: Union["RawTask", "VMTask"],
@@ -77,10 +93,6 @@ class RawTask(Task, TaskMixin):
         super().__init__(config_path, manager, *args, **kwargs)
         self.check_config()
 
-    @error_factory(False)
-    def _eval_compile(self, eval_item: Dict[str, Any]) -> bool:
-        raise NotImplementedError
-
     @Task._stop_handler
     def eval(self) -> bool:
         # MRO: RawTask -> Task -> TaskMixin -> object
@@ -111,20 +123,6 @@ class VMTask(VTask, TaskMixin):
     def _chimerax_clear_log(self) -> bool:
         return self.manager._chimerax_execute(f"log clear")
 
-    @error_factory(False)
-    def _eval_compile(self, eval_item: Dict[str, Any]) -> bool:
-        response = self.manager._request("POST/tex/check", {
-            "json": {
-                "path": eval_item["path"],
-                "file": eval_item["file"],
-                "bibtex": len([
-                    item for item in self.initialize
-                    if item["func"] == "touch" and item["path"].endswith(".bib")
-                ]) > 0
-            }
-        })
-        return response.json()["pass"]
-
     @Task._stop_handler
     def eval(self) -> bool:
         # MRO: VMTask -> VTask -> Task -> TaskMixin -> object
@@ -8,6 +8,7 @@ from PIL import Image
 sys.dont_write_bytecode = True
 from ..base import Manager
 from ..vm import VManager
+from .compiler import Compiler, Compiled
 
 
 class RawManager(Manager):
@@ -18,6 +19,9 @@ class RawManager(Manager):
     def __call__(self, _) -> None:
         raise NotImplementedError
 
+    def compile_tex(self, path: str, file: str, bibtex: bool = False) -> Compiled:
+        return Compiler.get(path, file, preload=True)(bibtex=bibtex)
+
     def __enter__(self) -> Self:
         self.process = subprocess.Popen(["texstudio"], text=True)
         Manager.pause()
@@ -43,6 +47,22 @@ class VMManager(VManager):
         assert port in range(1024, 65536)
         self.port = port
 
+    # servers without Compiler only report whether it passes
+    def compile_tex(self, path: str, file: str, bibtex: bool = False) -> Compiled:
+        response = self._request("POST/tex/check", {
+            "json": {
+                "path": path,
+                "file": file,
+                "bibtex": bibtex
+            }
+        }).json()
+        return Compiled(
+            passed=response["pass"],
+            runs=response.get("runs", 0),
+            latency=response.get("latency", 0.0),
+            preloaded=response.get("preloaded", False)
+        )
+
     def _chimerax_execute(self, command: str):
         return self._request(
             f"POST:{VManager.SERVER_PORT}/chimerax/run",
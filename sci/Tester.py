@@ -2,9 +2,13 @@ import sys
 import os
 import re
 import copy
+import json
+import time
 import shutil
 import inspect
+import functools
 import tempfile
+import threading
 import traceback
 
 from dataclasses import dataclass
@@ -15,11 +19,12 @@ from typing import TypeVar, TypedDict, Unpack, NotRequired
 
 sys.dont_write_bytecode = True
 from . import TypeSort
-from . import Model, ModelType
-from . import Agent, AIOAgent, Community
-from . import Manager, VManager, Task
-from . import Log, VirtualLog
-from . import OBS, Presets
+from . import Model, ModelType, Transport, Cassette
+from . import Agent, AIOAgent, Community, Replay
+from . import Manager, VManager, VPool, Task
+from . import Log, VirtualLog, BlobStore, RunIndex
+from . import OBS, Presets, Catalog
+from .base.manager import drain_startups
 
 POLY = TypeVar("POLY")
 
@@ -76,10 +81,19 @@ class AutomataType(TypedDict):
     max_tokens: NotRequired[Optional[int]]
     top_p: NotRequired[Optional[float]]
     temperature: NotRequired[Optional[float]]
+    transport: NotRequired[Optional[Transport]]
+    cache_path: NotRequired[Optional[str]]
+    cache_mode: NotRequired[str]
+    rpm: NotRequired[Optional[int]]
+    tpm: NotRequired[Optional[int]]
+    retries: NotRequired[int]
     overflow_style: NotRequired[Optional[str]]
     context_window: NotRequired[int]
     hide_text: NotRequired[bool]
     code_style: NotRequired[str]
+    image_codec: NotRequired[str]
+    image_quality: NotRequired[Optional[int]]
+    context_limit: NotRequired[Optional[int]]
 
 
 # Automata receive keyword args from Model and Agent
@@ -146,28 +160,74 @@ class Automata:
         return self().prompt_factory(obs, type_sort)("...")
 
 
+# task is built lazily by factory when first accessed
+# while metadata needed for scheduling comes from Catalog
 class TaskInfo:
-    def __init__(self, task: Task, infix: str = "") -> None:
-        assert isinstance(task, Task)
-        self.task = task
+    def __init__(
+        self,
+        task: Union[Task, Callable[[], Task]],
+        infix: str = "",
+        name: Optional[str] = None,
+        entry: Optional[Dict[str, Any]] = None
+    ) -> None:
+        if isinstance(task, Task):
+            self.built: Optional[Task] = task
+            self.factory = None
+            self.name = task.name
+            self.entry = {key: getattr(task, key) for key in Catalog.FIELDS}
+        else:
+            assert hasattr(task, "__call__")
+            assert isinstance(name, str) and isinstance(entry, dict)
+            self.built = None
+            self.factory = task
+            self.name = name
+            self.entry = entry
 
         assert isinstance(infix, str)
         self.infix = infix
+        self.lock = threading.Lock()
+
+    # kwargs are passed to factory only if task is not built yet
+    def build(self, **kwargs) -> Task:
+        with self.lock:
+            if self.built is None:
+                self.built = self.factory(**kwargs)
+            return self.built
+
+    @property
+    def task(self) -> Task:
+        return self.build()
+
+    @property
+    def type(self) -> str:
+        return self.entry["type"]
+
+    @property
+    def sort(self) -> str:
+        return self.entry["sort"]
+
+    @property
+    def steps(self) -> int:
+        return self.entry["steps"]
+
+    @property
+    def type_sort(self) -> TypeSort:
+        return TypeSort(self.type, TypeSort.Sort._member_map_[self.sort])
 
     @property
     def ident(self):
-        identifier = os.path.join(self.infix, self.task.name)
+        identifier = os.path.join(self.infix, self.name)
         if sys.platform == "win32":
             identifier.replace("\\", "/")
         return identifier
 
     def __lt__(self, __value: "TaskInfo") -> bool:
-        left, right = self.task, __value.task
+        left, right = self, __value
         return left.sort < right.sort or \
             (left.sort == right.sort and left.type < right.type)
 
     def __repr__(self) -> str:
-        return f"{self.ident}: {self.task.sort}.{self.task.type}"
+        return f"{self.ident}: {self.sort}.{self.type}"
 
     def __call__(self) -> bool:
         return self.task()
@@ -190,31 +250,56 @@ class TaskGroup:
         for task_info in raw:
             assert isinstance(task_info, TaskInfo)
             if last_info is not None \
-                and task_info.task.type_sort == last_info.task.type_sort:
+                and task_info.type_sort == last_info.type_sort:
                 self.groups[-1].append(task_info)
             else:
                 self.groups.append([task_info])
             last_info = task_info
 
+    # only tasks already built are checked
     def __check(self) -> None:
         for group in self.groups:
             assert len(group) > 0
-            for task_info in group:
-                first = group[0].task.manager
-                current = task_info.task.manager
+            built = [task_info.built for task_info in group if task_info.built is not None]
+            for task in built:
+                first = built[0].manager
+                current = task.manager
                 if first != current:
                     assert VManager in first.__class__.mro() \
                         and VManager in current.__class__.mro()
 
-    def __call__(self, base_path: str, ignore: bool) -> Generator:
+    # manager of the first task that can be built
+    # tasks failed to be built will be skipped when called
+    @staticmethod
+    def __manager(group: List[TaskInfo]) -> Optional[Manager]:
+        for task_info in group:
+            try:
+                return task_info.task.manager
+            except Exception:
+                continue
+        return None
+
+    # finished: idents of finished tasks if queried from RunIndex
+    # tasks not indexed as finished are still snooped on disk,
+    # as runs before the index was created may not be imported
+    def __call__(
+        self,
+        base_path: str,
+        ignore: bool,
+        finished: Optional[Set[str]] = None
+    ) -> Generator:
         assert isinstance(base_path, str)
         assert isinstance(ignore, bool)
         self.__check()
 
+        snoop = (lambda item: item.snoop(base_path)) if finished is None \
+            else (lambda item: item.ident not in finished and item.snoop(base_path))
         for group in self.groups:
-            has_unfinished = any([item.snoop(base_path) for item in group])
-            if has_unfinished or not ignore:
-                with group[0].task.manager:
+            has_unfinished = any([snoop(item) for item in group])
+            manager = TaskGroup.__manager(group) \
+                if has_unfinished or not ignore else None
+            if manager is not None:
+                with manager:
                     for task_info in group:
                         yield task_info
             else:
@@ -222,14 +307,220 @@ class TaskGroup:
                     yield task_info
 
 
+# balance tasks among workers by estimated duration
+# - estimation comes from past run time of the same task if recorded
+# - or from `steps` multiplied by average time cost per step
+# - longest tasks are handed out first (LPT scheduling)
+class Scheduler:
+    DURATION_FILENAME = "durations.json"
+    STEP_DURATION = 60
+
+    def __init__(self, task_info: List[TaskInfo], logs_path: str) -> None:
+        assert isinstance(logs_path, str)
+        self.logs_path = logs_path
+
+        self.lock = threading.Lock()
+        self.durations: Dict[str, float] = self.__load()
+        self.step_duration = self.__step_duration(task_info)
+        self.pending = sorted(task_info, key=self.estimate, reverse=True)
+
+    @property
+    def durations_file_path(self) -> str:
+        return os.path.join(self.logs_path, self.DURATION_FILENAME)
+
+    def __load(self) -> Dict[str, float]:
+        if not os.path.exists(self.durations_file_path):
+            return {}
+        with open(self.durations_file_path, mode="r", encoding="utf-8") as readable:
+            return json.load(readable)
+
+    def __dump(self) -> None:
+        with open(self.durations_file_path, mode="w", encoding="utf-8") as writable:
+            json.dump(self.durations, writable, ensure_ascii=False, indent=2)
+
+    def __step_duration(self, task_info: List[TaskInfo]) -> float:
+        recorded = [
+            (self.durations[item.ident], item.steps)
+            for item in task_info
+            if item.ident in self.durations
+        ]
+        total_steps = sum([steps for _, steps in recorded])
+        return self.STEP_DURATION if total_steps == 0 \
+            else sum([duration for duration, _ in recorded]) / total_steps
+
+    def estimate(self, task_info: TaskInfo) -> float:
+        return self.durations[task_info.ident] \
+            if task_info.ident in self.durations \
+            else task_info.steps * self.step_duration
+
+    # raw apps are bound to local ports and processes
+    # so they are only handed to the first worker
+    def take(self, worker: "Worker") -> Optional[TaskInfo]:
+        with self.lock:
+            for index, task_info in enumerate(self.pending):
+                if worker.index == 0 \
+                    or task_info.type_sort.sort == TypeSort.Sort.VM:
+                    return self.pending.pop(index)
+        return None
+
+    def record(self, task_info: TaskInfo, duration: float) -> None:
+        with self.lock:
+            self.durations[task_info.ident] = duration
+            self.__dump()
+
+
+# a worker owns a VM (claimed by VManager with parallel=True)
+# together with its own log and copy of community
+# managers of different apps are attached to the same VM
+class Worker:
+    def __init__(
+        self,
+        index: int,
+        tester: "Tester",
+        pool: Optional[VPool] = None
+    ) -> None:
+        assert isinstance(index, int)
+        self.index = index
+        self.tester = tester
+
+        assert pool is None or isinstance(pool, VPool)
+        self.pool = pool
+
+        self.log = Log(global_vlog=False)
+        self.log.blob_store = tester.blob_store
+        self.community: Community = copy.deepcopy(tester.community)
+        self.community.vlog.set(self.log)
+        for _, agent in self.community:
+            agent.vlog.set(self.log)
+
+        self.managers: Dict[str, Manager] = {}
+        self.vm_path: Optional[str] = None
+        # VM managers entered by this worker, exited in __call__()
+        self.entered: List[Manager] = []
+
+    # with VM pool, VM managers are attached to the acquired VM instead
+    def manager(self, type_sort: TypeSort, vm_path: Optional[str] = None) -> Manager:
+        key = str(type_sort) if vm_path is None else f"{vm_path}:{type_sort}"
+        if key in self.managers:
+            return self.managers[key]
+
+        overrides = {}
+        if vm_path is not None:
+            overrides["parallel"] = False
+            overrides["vm_path"] = vm_path
+        elif type_sort.sort == TypeSort.Sort.VM:
+            # the first VM manager claims a free VM or clones a new one
+            # the others share it since env is keyed by vm path
+            overrides["parallel"] = self.vm_path is None
+            overrides["clone"] = True
+            if self.vm_path is not None:
+                overrides["vm_path"] = self.vm_path
+
+        manager = self.tester._spawn(type_sort, **overrides)
+        manager.vlog.set(self.log)
+        if type_sort.sort == TypeSort.Sort.VM and vm_path is None:
+            self.vm_path = manager.path
+
+        self.managers[key] = manager
+        return manager
+
+    # tasks are built with managers of this worker instead of Tester's
+    # VM managers are kept entered until the worker exits
+    def bind(self, task_info: TaskInfo, vm_path: Optional[str] = None) -> Task:
+        manager = self.manager(task_info.type_sort, vm_path)
+        if task_info.type_sort.sort == TypeSort.Sort.VM and not manager.entered:
+            manager.__enter__()
+            self.entered.append(manager)
+
+        task = task_info.build(manager=manager)
+        task.manager = manager
+        task.community = self.community
+        task.vlog.set(self.log)
+        return task
+
+    # raw managers are entered for each task as in TaskGroup
+    # and apps of the same type are not opened by two workers at once
+    def call(self, task_info: TaskInfo, task: Task) -> bool:
+        if task_info.type_sort.sort == TypeSort.Sort.VM:
+            return task_info()
+        with self.tester.raw_lock(task_info.type_sort), task.manager:
+            return task_info()
+
+    def count(
+        self,
+        scheduler: Scheduler,
+        counter: Counter,
+        method: Callable[[Counter], None]
+    ) -> None:
+        with scheduler.lock:
+            counter.vlog.set(self.log)
+            method(counter)
+
+    def run(
+        self,
+        task_info: TaskInfo,
+        scheduler: Scheduler,
+        counter: Counter
+    ) -> None:
+        with self.log(
+            base_path=self.tester.logs_path,
+            ident=task_info.ident,
+            ignore=self.tester.ignore
+        ) as result_exist:
+            if result_exist:
+                self.count(scheduler, counter, Counter._ignore)
+                return
+
+            start_time = time.time()
+            vm_path, passed = None, None
+            try:
+                if self.pool is not None \
+                    and task_info.type_sort.sort == TypeSort.Sort.VM:
+                    vm_path = self.pool.acquire()
+                    assert vm_path is not None, "No VM available in pool"
+
+                task = self.bind(task_info, vm_path)
+                if self.tester.replay_path is not None:
+                    task.community = self.tester._replay(task_info, self.log)
+                passed = self.call(task_info, task)
+                self.count(
+                    scheduler,
+                    counter,
+                    Counter._pass if passed else Counter._fail
+                )
+            except Exception:
+                self.count(scheduler, counter, Counter._skip)
+            finally:
+                if vm_path is not None:
+                    self.pool.release(vm_path)
+            scheduler.record(task_info, time.time() - start_time)
+            self.tester._record(task_info, passed, time.time() - start_time)
+
+    def __call__(self, scheduler: Scheduler, counter: Counter) -> None:
+        try:
+            while (task_info := scheduler.take(self)) is not None:
+                self.run(task_info, scheduler, counter)
+        finally:
+            for manager in self.entered:
+                try:
+                    manager.__exit__(None, None, None)
+                except Exception:
+                    self.log.error(
+                        f"Error when exiting manager of worker {self.index}.\n"
+                            + traceback.format_exc()
+                    )
+            self.log.callback()
+
+
 class Tester:
     SHUTDOWN_INTERVAL = 10
+    REPLAY_FILENAME = "replay.jsonl"
 
     def __init__(
         self,
         tasks_path: str,
         logs_path: str,
-        community: Community,
+        community: Optional[Community] = None,
         obs_types: Set[str] = {OBS.screenshot},
         vm_path: Optional[str] = None,
         headless: bool = False,
@@ -238,6 +529,13 @@ class Tester:
         debug: bool = False,
         optimize: bool = True,
         relative: bool = False,
+        workers: int = 1,
+        spares: int = 0,
+        blob_store: bool = False,
+        blob_codec: str = "png",
+        blob_packed: bool = False,
+        replay_path: Optional[str] = None,
+        settle: bool = False,
         handle_managers: Callable = Presets.spawn_managers
     ) -> None:
         assert isinstance(tasks_path, str)
@@ -267,6 +565,20 @@ class Tester:
         # should be converted into the form of vlog.info()
         self.log = Log()
 
+        # actions are replayed from traj.jsonl under replay_path
+        # in which case community is not needed and never called
+        if isinstance(replay_path, str):
+            replay_path = os.path.expanduser(replay_path)
+            assert os.path.isdir(replay_path)
+            assert os.path.abspath(replay_path) != os.path.abspath(logs_path)
+        else:
+            assert replay_path is None
+        self.replay_path = replay_path
+        self.replays: List[Dict[str, Any]] = []
+
+        if community is None:
+            assert replay_path is not None, "Community is required unless replaying"
+            community = Community()
         assert isinstance(community, Community)
         self.community = community
         self.community.vlog.set(self.log)
@@ -300,6 +612,32 @@ class Tester:
         assert isinstance(relative, bool)
         self.relative = relative
 
+        assert isinstance(workers, int) and workers > 0
+        assert workers == 1 or vm_path is not None
+        self.workers = workers
+
+        assert isinstance(spares, int) and spares >= 0
+        assert spares == 0 or vm_path is not None
+        self.spares = spares
+
+        # fixed pauses after actions are replaced by Manager.settle()
+        assert isinstance(settle, bool)
+        self.settle = settle
+
+        # screenshots of all tasks are deduplicated in one store
+        assert isinstance(blob_store, bool)
+        self.blob_store = BlobStore(
+            os.path.join(self.logs_path, BlobStore.DIRNAME),
+            codec=blob_codec,
+            packed=blob_packed
+        ) if blob_store else None
+        self.log.blob_store = self.blob_store
+
+        # logs of previous runs are imported when index is created
+        self.index = RunIndex(self.logs_path)
+
+        self.lock = threading.Lock()
+        self.raw_locks: Dict[str, threading.Lock] = {}
         self.task_info: List[TaskInfo] = []
         self.__traverse()
         self.task_group = TaskGroup(sorted(self.task_info))
@@ -308,25 +646,162 @@ class Tester:
         if self.__temp_dir is not None:
             self.__temp_dir.cleanup()
 
-    def __manager(self, type_sort: TypeSort):
-        # add __str__() to differentiate all managers
-        if str(type_sort) in self.managers:
-            return self.managers[str(type_sort)]
-
+    # kwargs are used to override args of handle_managers
+    def _spawn(self, type_sort: TypeSort, **kwargs) -> Manager:
         manager_class = getattr(
             self.modules[type_sort.type],
             type_sort(Manager.__name__)
         )
 
         manager_args = self.manager_args[type_sort]()
+        manager_args.update(kwargs)
         manager = manager_class(**manager_args)
-        self.managers[str(type_sort)] = manager
+        manager.settling = self.settle
+        return manager
+
+    def raw_lock(self, type_sort: TypeSort) -> threading.Lock:
+        with self.lock:
+            return self.raw_locks.setdefault(str(type_sort), threading.Lock())
+
+    # passed is None if the task is skipped due to errors
+    # or failed to be built, when only metadata is recorded
+    def _record(
+        self,
+        task_info: TaskInfo,
+        passed: Optional[bool],
+        duration: float
+    ) -> None:
+        task = task_info.built
+        try:
+            self.index.record(
+                ident=task_info.ident,
+                app=task_info.type,
+                sort=task_info.sort,
+                result=passed,
+                stop_type=None if task is None else task.stop_type,
+                steps_used=0 if task is None else task.steps_used,
+                steps=task_info.steps,
+                duration=duration,
+                usage=task.usage \
+                    if task is not None and task.community is not None \
+                    else None
+            )
+        except Exception:
+            self.log.error(
+                f"Error when indexing {task_info.ident}.\n"
+                    + traceback.format_exc()
+            )
+
+        if self.replay_path is not None:
+            self._compare(task_info, passed)
+        self._record_startups()
+
+    # startup latency of apps opened since last call
+    def _record_startups(self) -> None:
+        try:
+            for record in drain_startups():
+                self.index.record_startup(*record)
+        except Exception:
+            self.log.error(
+                "Error when indexing startup latency.\n"
+                    + traceback.format_exc()
+            )
+
+    # community replaying trajectory of the same task under replay_path
+    def _replay(self, task_info: TaskInfo, log: Log) -> Replay:
+        community = Replay(os.path.join(
+            self.replay_path,
+            task_info.ident,
+            Log.TRAJ_FILENAME
+        ))
+        community.vlog.set(log)
+        return community
+
+    # compare result with the recorded one and collect timings of steps
+    def _compare(self, task_info: TaskInfo, passed: Optional[bool]) -> None:
+        result_file_path = os.path.join(
+            self.replay_path,
+            task_info.ident,
+            Log.RESULT_FILENAME
+        )
+        recorded = None
+        if os.path.exists(result_file_path):
+            with open(result_file_path, mode="r", encoding="utf-8") as readable:
+                recorded = int(readable.read().strip() or 0)
+
+        task = task_info.built
+        timings = [] if task is None else task.timings
+        replay = {
+            "ident": task_info.ident,
+            "result": None if passed is None else int(passed),
+            "recorded": recorded,
+            "steps": len(timings),
+            **{key: round(sum([timing[key] for timing in timings]), 3)
+                for key in ("observe", "execute", "settle", "saved")}
+        }
+
+        with self.lock:
+            self.replays.append(replay)
+            replay_file_path = os.path.join(self.logs_path, self.REPLAY_FILENAME)
+            with open(replay_file_path, mode="a", encoding="utf-8") as writable:
+                writable.write(json.dumps(replay, ensure_ascii=False) + "\n")
+
+        per_step = lambda key: replay[key] / max(replay["steps"], 1)
+        self.log.info(
+            f"Replayed {task_info.ident} in {replay['steps']} steps: "
+                + f"observe={per_step('observe'):.2f}s, "
+                + f"execute={per_step('execute'):.2f}s, "
+                + f"settle={per_step('settle'):.2f}s "
+                + f"(saved {per_step('saved'):.2f}s) per step; "
+                + f"result={replay['result']}, recorded={recorded}"
+                + ("" if replay["result"] == recorded else " (MISMATCH)")
+        )
+
+    def _replay_summary(self) -> str:
+        steps = sum([replay["steps"] for replay in self.replays])
+        totals = {
+            key: sum([replay[key] for replay in self.replays])
+            for key in ("observe", "execute", "settle")
+        }
+        matched = [
+            replay for replay in self.replays
+            if replay["result"] == replay["recorded"]
+        ]
+        saved = sum([replay["saved"] for replay in self.replays])
+        elapsed = sum(totals.values())
+        return (
+            f"Replay of {len(self.replays)} tasks in {steps} steps: "
+                + ", ".join([
+                    f"{key}={value / max(steps, 1):.2f}s"
+                    for key, value in totals.items()
+                ])
+                + f" per step, {60 * steps / elapsed if elapsed > 0 else 0:.1f} steps/min, "
+                + f"{saved:.1f}s saved by settle; "
+                + f"{len(matched)}/{len(self.replays)} results reproduced."
+        )
+
+    def __manager(self, type_sort: TypeSort):
+        # add __str__() to differentiate all managers
+        with self.lock:
+            if str(type_sort) in self.managers:
+                return self.managers[str(type_sort)]
+
+            manager = self._spawn(type_sort)
+            self.managers[str(type_sort)] = manager
         manager.vlog.set(self.log)
         return manager
 
-    def __load(self, config_path: str) -> Task:
+    # type_sort can be passed if known from Catalog
+    # manager is passed by Worker, so that Tester does not spawn its own
+    def __load(
+        self,
+        config_path: str,
+        type_sort: Optional[TypeSort] = None,
+        manager: Optional[Manager] = None
+    ) -> Task:
         # using nil agent & manager only to load type field
-        type_sort = Task(config_path=config_path).type_sort
+        if type_sort is None:
+            type_sort = Task(config_path=config_path).type_sort
         if type_sort.sort == TypeSort.Sort.VM:
             assert self.vm_path is not None
 
@@ -335,40 +810,67 @@ class Tester:
             type_sort(Task.__name__)
         )
 
-        return task_class(
+        new_task = task_class(
             config_path=config_path,
-            manager=self.__manager(type_sort),
+            manager=self.__manager(type_sort) if manager is None else manager,
             community=self.community,
             obs_types=self.obs_types,
             debug=self.debug,
             relative=self.relative
         )
+        new_task.vlog.set(self.log)
+        return new_task
 
-    def __traverse(self, current_infix: str = "") -> None:
+    # tasks are built lazily when they are reached
+    # with metadata from Catalog cached under tasks_path
+    def __traverse(self) -> None:
         DEBUG_MODE = os.environ.get("DEBUG_MODE", "False").lower() == "true"
         if DEBUG_MODE:
             # for debugging purpose, 直接加载 debug 文件
             TASK_PATH = os.environ.get("TASK_PATH", None)
             new_task = self.__load(TASK_PATH)
-            new_task.vlog.set(self.log)
-            self.task_info.append(TaskInfo(new_task, infix=current_infix))
-        else:
-            current_dir_path = os.path.join(self.tasks_path, current_infix)
-            for unknown_name in sorted(os.listdir(current_dir_path)):
-                unknown_path = os.path.join(current_dir_path, unknown_name)
-                if os.path.isfile(unknown_path):
-                    try:
-                        new_task = self.__load(unknown_path)
-                        new_task.vlog.set(self.log)
-                        self.task_info.append(TaskInfo(new_task, infix=current_infix))
-                    except Exception:
-                        error_info = "Config loading failed; skipped: " \
-                            + unknown_path \
-                            + "\n" \
-                            + traceback.format_exc()
-                        self.log.error(error_info)
-                else:
-                    self.__traverse(os.path.join(current_infix, unknown_name))
+            self.task_info.append(TaskInfo(new_task))
+            return
+
+        catalog = Catalog(self.tasks_path)
+        entries, errors = catalog.build()
+        for rel_path, error in errors.items():
+            self.log.error(
+                "Config loading failed; skipped: "
+                    + os.path.join(self.tasks_path, rel_path)
+                    + "\n"
+                    + error
+            )
+
+        for rel_path, entry in entries.items():
+            config_path = os.path.join(self.tasks_path, rel_path)
+            infix, filename = os.path.split(rel_path)
+            try:
+                task_info = TaskInfo(
+                    functools.partial(
+                        self.__load,
+                        config_path,
+                        TypeSort(entry["type"], TypeSort.Sort._member_map_[entry["sort"]])
+                    ),
+                    infix=infix,
+                    name=filename.split(".")[0],
+                    entry=entry
+                )
+                assert task_info.sort != TypeSort.Sort.VM.name \
+                    or self.vm_path is not None
+                assert task_info.type in self.modules
+                self.task_info.append(task_info)
+            except Exception:
+                self.log.error(
+                    "Config loading failed; skipped: "
+                        + config_path
+                        + "\n"
+                        + traceback.format_exc()
+                )
+        self.log.info(
+            f"{len(self.task_info)} tasks loaded from catalog "
+            f"with {catalog.hits}/{len(catalog.entries)} cached."
+        )
 
     @staticmethod
     def _log_handler(method: Callable) -> Callable:
@@ -382,15 +884,73 @@ class Tester:
             )
             method(self, local_counter)
             local_counter.callback()
+            self._record_startups()
+            self.log.info(str(self.index))
+            for row in self.index.startups():
+                self.log.info(
+                    f"Startup of {row['app']} ({row['manager']} {row['version']}): "
+                        + f"mean={row['mean']:.2f}s, min={row['min']:.2f}s, "
+                        + f"max={row['max']:.2f}s over {row['count']} launches."
+                )
+            if self.replay_path is not None:
+                self.log.info(self._replay_summary())
+            for cassette in Cassette.CASSETTES.values():
+                self.log.info(f"Cassette at {cassette.file_path}: {cassette}")
+            # wait for apps to shut down unless all of them have exited
+            shutdown = not self.settle or any([
+                manager.entered for manager in self.managers.values()
+            ])
+            if not shutdown:
+                self.log.info(f"Settle saved {Tester.SHUTDOWN_INTERVAL}s at shutdown.")
             self.log.callback()
-            Manager.pause(Tester.SHUTDOWN_INTERVAL)
+            if shutdown:
+                Manager.pause(Tester.SHUTDOWN_INTERVAL)
         return _log_wrapper
 
+    # tasks are handed to whichever worker is free
+    # with spare VMs, VMs are prepared in a pool shared by workers
+    def __schedule(self, counter: Counter) -> None:
+        scheduler = Scheduler(self.task_info, self.logs_path)
+        pool = None if self.spares == 0 else VPool(
+            lambda **kwargs: VManager(**{
+                **self.manager_args[TypeSort.VM](),
+                "clone": True,
+                **kwargs
+            }),
+            size=self.workers + self.spares
+        )
+
+        workers = [Worker(index, self, pool) for index in range(self.workers)]
+        threads = [
+            threading.Thread(target=worker, args=(scheduler, counter))
+            for worker in workers
+        ]
+
+        if pool is not None:
+            pool.vlog.set(self.log)
+            pool.__enter__()
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            if pool is not None:
+                pool.__exit__(None, None, None)
+        counter.vlog.set(self.log)
+
     # there is no need to pass counter
     # as decorator has done all for it
     @_log_handler
     def __call__(self, counter: Counter) -> None:
-        generator = self.task_group(self.logs_path, self.ignore)
+        if self.workers > 1 or self.spares > 0:
+            return self.__schedule(counter)
+
+        generator = self.task_group(
+            self.logs_path,
+            self.ignore,
+            finished=self.index.finished()
+        )
         for task_info in generator if self.optimize else self.task_info:
             with self.log(
                 base_path=self.logs_path,
@@ -400,10 +960,16 @@ class Tester:
                 if result_exist:
                     counter._ignore()
                     continue
+
+                start_time, passed = time.time(), None
                 try:
-                    counter._pass() if task_info() else counter._fail()
+                    if self.replay_path is not None:
+                        task_info.task.community = self._replay(task_info, self.log)
+                    passed = task_info()
+                    counter._pass() if passed else counter._fail()
                 except Exception:
                     counter._skip()
+                self._record(task_info, passed, time.time() - start_time)
 
     # alternative for multiple Tester(...)()
     @staticmethod
@@ -1,4 +1,5 @@
 import sys
+import importlib
 from typing import Annotated
 
 sys.dont_write_bytecode = True
@@ -11,6 +12,10 @@ from .base import Log
 from .base import VirtualLog
 from .base import GLOBAL_VLOG
 
+from .base import Traffic
+from .base import Transport
+from .base import SHARED_TRANSPORT
+
 from .base import Content
 from .base import TextContent
 from .base import ImageContent
@@ -20,6 +25,13 @@ from .base import Model
 from .base import ModelType
 from .base import RoleType
 
+from .base import BlobStore
+from .base import RunIndex
+
+from .base import Estimator
+from .base import Limiter
+from .base import Cassette
+
 from .base import Primitive
 from .base import CodeLike
 
@@ -42,19 +54,16 @@ from .base import Community
 from .base import AllInOne
 from .base import SeeAct
 from .base import Disentangled
+from .base import Replay
 
 from .base import OBS
 from .base import Manager
 from .base import Task
+from .base import Catalog
 
 from .vm import VManager
 from .vm import VTask
-
-from . import ChimeraX
-from . import KAlgebra
-from . import Celestia
-from . import TeXstudio
-from . import Lean
+from .vm import VPool
 
 from . import Presets
 from . import Prompts
@@ -64,7 +73,21 @@ from .Tester import Automata
 
 from .Tester import TaskInfo
 from .Tester import TaskGroup
+from .Tester import Scheduler
+from .Tester import Worker
 from .Tester import Tester
 
 # DO NOT IMPORT TEMPLATE
 Template = NotImplemented
+
+# app packages are imported on first access (PEP 562)
+# e.g. sci.Lean or Presets.spawn_modules()["Lean"]
+APPS = ("ChimeraX", "KAlgebra", "Celestia", "GrassGIS", "TeXstudio", "Lean")
+
+def __getattr__(name: str):
+    if name in APPS:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted([*globals(), *APPS])
@@ -10,6 +10,10 @@ from .log import Log
 from .log import VirtualLog
 from .log import GLOBAL_VLOG
 
+from .transport import Traffic
+from .transport import Transport
+from .transport import SHARED_TRANSPORT
+
 from .model import Content
 from .model import TextContent
 from .model import ImageContent
@@ -19,6 +23,13 @@ from .model import Model
 from .model import ModelType
 from .model import RoleType
 
+from .blob import BlobStore
+from .index import RunIndex
+
+from .tokens import Estimator
+from .limiter import Limiter
+from .cassette import Cassette
+
 from .prompt import Primitive
 from .prompt import CodeLike
 
@@ -41,8 +52,10 @@ from .community import Community
 from .community import AllInOne
 from .community import SeeAct
 from .community import Disentangled
+from .community import Replay
 
 from .manager import OBS
 from .manager import Manager
 
 from .task import Task
+from .catalog import Catalog
@@ -3,10 +3,12 @@ import functools
 import string
 
 from typing import Optional, List, Tuple, Dict
-from typing import Callable, Any, Set, FrozenSet
+from typing import Callable, Any, Set, FrozenSet, TYPE_CHECKING
 
 from PIL import Image
-from requests import Response
+
+if TYPE_CHECKING:
+    from requests import Response
 
 sys.dont_write_bytecode = True
 from . import utils
@@ -14,6 +16,8 @@ from .manager import OBS, Manager
 from .log import VirtualLog
 from .model import Content, TextContent, ImageContent
 from .model import Message, Model
+from .tokens import Estimator
+from .limiter import Limiter
 from .utils import TypeSort
 from .prompt import CodeLike, Primitive
 from .prompt import AIOPromptFactory
@@ -26,45 +30,50 @@ from .prompt import ActorPromptFactory
 class Overflow:
     @staticmethod
     @utils.error_factory(False)
-    def openai_gpt(response: Response) -> bool:
+    def openai_gpt(response: "Response") -> bool:
         return response.json()["error"]["code"] == "context_length_exceeded"
 
     @staticmethod
     @utils.error_factory(False)
-    def openai_lmdeploy(response: Response) -> bool:
+    def openai_lmdeploy(response: "Response") -> bool:
         return Model._access_openai(response).content[0].text == ""
 
     @staticmethod
     @utils.error_factory(False)
-    def openai_siliconflow(response: Response) -> bool:
+    def openai_siliconflow(response: "Response") -> bool:
         return response.json()["code"] == 20015
 
     @staticmethod
     @utils.error_factory(False)
-    def openai_newapi(response: Response) -> bool:
+    def openai_newapi(response: "Response") -> bool:
         return response.json()["error"]["message"].startswith("The input token count")
 
     @staticmethod
     @utils.error_factory(False)
-    def anthropic(response: Response) -> bool:
+    def anthropic(response: "Response") -> bool:
         return response.json()["error"]["type"] == "request_too_large"
 
 
 class Agent:
+    RETRY = 3
+
     def __init__(
         self,
         model: Model,
         overflow_style: Optional[str] = None,
         context_window: int = 3,
         hide_text: bool = False,
-        code_style: str = "antiquot"
+        code_style: str = "antiquot",
+        image_codec: str = "png",
+        image_quality: Optional[int] = None,
+        context_limit: Optional[int] = None
     ) -> None:
         assert isinstance(model, Model)
         self.model = model
 
         assert overflow_style is None or hasattr(Overflow, overflow_style)
         self.overflow_style = overflow_style
-        self.overflow_handler: Optional[Callable[[Response], bool]] = None \
+        self.overflow_handler: Optional[Callable[["Response"], bool]] = None \
             if overflow_style is None \
             else getattr(Overflow, overflow_style)
 
@@ -82,7 +91,31 @@ class Agent:
             List[CodeLike]
         ] = getattr(CodeLike, handler_name)
 
+        assert image_codec in ImageContent.CODECS
+        self.image_codec = image_codec
+
+        assert image_quality is None or 0 < image_quality <= 100
+        self.image_quality = image_quality
+
+        # tokens accepted by model, including those reserved for completion
+        # context is shortened before requesting if estimated to exceed
+        assert context_limit is None or context_limit > 0
+        self.context_limit = context_limit
+        self.estimator = Estimator(model.model_style, model.model_name)
+
         self.vlog = VirtualLog()
+        self.usage = Agent.__usage()
+
+    @staticmethod
+    def __usage() -> Dict[str, int]:
+        return {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+    def _image(self, image: Image.Image) -> ImageContent:
+        return ImageContent(
+            image,
+            codec=self.image_codec,
+            quality=self.image_quality
+        )
 
     def _init(self, inst: str) -> None:
         self.system_message: Message = self.model.message(
@@ -90,6 +123,8 @@ class Agent:
             content=[TextContent(inst.strip())]
         )
         self.context: List[Message] = []
+        self.usage = Agent.__usage()
+        self.estimator.clear()
 
     @staticmethod
     def _init_handler(method: Callable) -> Callable:
@@ -115,23 +150,37 @@ class Agent:
             *self.context[-context_count:]
         ]
 
+    # the longest context not exceeding context_limit
+    # or 0 if even the shortest one exceeds, leaving it to Overflow
+    def _fit(self, context_length: int) -> Tuple[int, int]:
+        reserve = 0 if self.model.max_tokens is None else self.model.max_tokens
+        for length in range(context_length, -1, -1):
+            tokens = self.estimator.payload(
+                self.__dump(length * 2 + 1),
+                self.hide_text
+            )
+            if tokens + reserve <= self.context_limit:
+                break
+        return length, tokens
+
     def dump_payload(self, context_length: int) -> Dict:
         payload = self.__dump(context_length * 2 + 1)
         return [message._asdict(hide_text=(
             not index + 1 == len(payload) and self.hide_text
         )) for index, message in enumerate(payload)]
 
-    def dump_history(self, hide: bool) -> Tuple[Dict, Dict]:
+    # start: skip messages already dumped, counting system message
+    def dump_history(self, hide: bool, start: int = 0) -> List[Dict]:
         return [
             message._asdict(show_context=True, hide_text=hide, hide_image=hide)
-            for message in self.__dump(len(self.context))
+            for message in [self.system_message, *self.context][start:]
         ]
 
     def __call__(
         self,
         contents: List[Content],
         shorten: int = 0,
-        retry: int = 3,
+        retry: int = RETRY,
         timeout: int = Manager.HETERO_TIMEOUT
     ) -> Message:
         assert hasattr(self, "context"), "Call _init() first"
@@ -145,8 +194,37 @@ class Agent:
         assert context_length >= 0, "Error when calculating context length"
 
         self.context.append(self.model.message(role="user", content=contents))
-        
-        response = self.model(self.dump_payload(context_length), timeout)
+
+        # preflight: shorten context in advance instead of waiting for Overflow
+        tokens = 0
+        if self.context_limit is not None:
+            fitted, tokens = self._fit(context_length)
+            if fitted < context_length:
+                self.vlog.warning(
+                    f"Payload to {self.model.model_name} is estimated to exceed "
+                    f"context_limit={self.context_limit}; "
+                    f"set context_window={fitted} ({tokens} tokens)."
+                )
+                context_length = fitted
+        elif self.model.tpm is not None:
+            tokens = self.estimator.payload(
+                self.__dump(context_length * 2 + 1),
+                self.hide_text
+            )
+
+        # tokens are counted against tpm shared by agents of the same model
+        if tokens > 0 and self.model.max_tokens is not None:
+            tokens += self.model.max_tokens
+        response = self.model(self.dump_payload(context_length), timeout, tokens=tokens)
+        prompt_tokens, completion_tokens = self.model.usage(response)
+        self.usage["requests"] += 1
+        self.usage["prompt_tokens"] += prompt_tokens
+        self.usage["completion_tokens"] += completion_tokens
+        self.vlog.info(
+            f"Requested {self.model.model_name}: "
+                + ("replayed from cassette" if getattr(response, "replayed", False)
+                    else str(getattr(response, "traffic", "no traffic info")))
+        )
 
         is_overflow = False if self.overflow_handler is None \
             else self.overflow_handler(response)
@@ -156,7 +234,8 @@ class Agent:
                 f"Overflow detected when requesting {self.model.model_name}; "
                 f"set context_window={context_length - 1}."
             )
-            return self(self.context.pop().content, shorten + 1, retry, timeout)
+            shorten = self.context_window - context_length + 1
+            return self(self.context.pop().content, shorten, retry, timeout)
         assert not is_overflow, f"Unsolvable overflow when requesting {self.model.model_name}"
 
         response_message = self.model.access(response, context_length)
@@ -165,7 +244,13 @@ class Agent:
                 f"Unexpected error when requesting {self.model.model_name}.\n"
                     + response.text
             )
-            Manager.pause(Primitive.WAIT_TIME)
+            # at least WAIT_TIME as before, or longer if Retry-After asks so
+            # and requests of other agents to the same model are held as well
+            retry_after = Limiter.retry_after(response)
+            span = max(Primitive.WAIT_TIME, Limiter.backoff(self.RETRY - retry, retry_after))
+            if getattr(response, "status_code", None) == 429:
+                self.model.limiter.cool(span)
+            Manager.pause(span)
             return self(self.context.pop().content, shorten, retry - 1, timeout)
 
         self.context.append(response_message)
@@ -214,7 +299,7 @@ class AIOAgent(Agent):
             item for _, item in obs.items()
             if isinstance(item, Image.Image)
         ]
-        contents += [ImageContent(image) for image in images]
+        contents += [self._image(image) for image in images]
         return contents
 
 
@@ -290,5 +375,5 @@ class ActorAgent(AIOAgent):
             item for _, item in obs.items()
             if isinstance(item, Image.Image)
         ]
-        contents += [ImageContent(image) for image in images]
+        contents += [self._image(image) for image in images]
         return contents
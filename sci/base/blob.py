@@ -0,0 +1,196 @@
+import os
+import sys
+import json
+import hashlib
+import threading
+
+from io import BytesIO
+from typing import Optional, Dict, Tuple, Iterator
+
+from PIL import Image
+
+sys.dont_write_bytecode = True
+from .model import ImageContent
+
+
+# content-addressed store of screenshots shared by a whole run
+# - blobs are keyed by hash of pixels, so identical frames are saved once
+# - loose: one file per blob under {root}/{id[:2]}/
+# - packed: blobs appended to {root}/blobs.pack, indexed by index.jsonl
+# traj.jsonl refers to blobs as "blob:{id}", see BlobStore.resolve()
+class BlobStore:
+    DIRNAME = ".blobs"
+    PREFIX = "blob:"
+    PACK_FILENAME = "blobs.pack"
+    INDEX_FILENAME = "index.jsonl"
+    EXTENSIONS = {"png": "png", "jpeg": "jpg", "webp": "webp"}
+
+    # fast settings if quality is not given
+    PNG_COMPRESS_LEVEL = 1
+
+    def __init__(
+        self,
+        root: str,
+        codec: str = "png",
+        quality: Optional[int] = None,
+        packed: bool = False
+    ) -> None:
+        assert isinstance(root, str)
+        self.root = os.path.expanduser(root)
+        os.makedirs(self.root, exist_ok=True)
+
+        assert codec in ImageContent.CODECS
+        self.codec = codec
+
+        assert quality is None or 0 < quality <= 100
+        self.quality = quality
+
+        assert isinstance(packed, bool)
+        self.packed = packed
+
+        self.lock = threading.Lock()
+        # id -> (codec, offset, size); offset is None for loose blobs
+        self.index: Dict[str, Tuple[str, Optional[int], int]] = {}
+        self.__load_index()
+
+    @property
+    def pack_file_path(self) -> str:
+        return os.path.join(self.root, self.PACK_FILENAME)
+
+    @property
+    def index_file_path(self) -> str:
+        return os.path.join(self.root, self.INDEX_FILENAME)
+
+    def __blob_file_path(self, blob_id: str, codec: str) -> str:
+        return os.path.join(
+            self.root,
+            blob_id[:2],
+            f"{blob_id}.{self.EXTENSIONS[codec]}"
+        )
+
+    def __load_index(self) -> None:
+        if os.path.exists(self.index_file_path):
+            with open(self.index_file_path, mode="r", encoding="utf-8") as readable:
+                for line in readable:
+                    if line.strip() == "":
+                        continue
+                    item = json.loads(line)
+                    self.index[item["id"]] = (item["codec"], item["offset"], item["size"])
+
+        # loose blobs are recognized by their file names
+        reverse = {value: key for key, value in self.EXTENSIONS.items()}
+        for dirname in os.listdir(self.root):
+            dir_path = os.path.join(self.root, dirname)
+            if len(dirname) != 2 or not os.path.isdir(dir_path):
+                continue
+            for filename in os.listdir(dir_path):
+                blob_id, _, extension = filename.partition(".")
+                if extension in reverse and blob_id not in self.index:
+                    file_path = os.path.join(dir_path, filename)
+                    self.index[blob_id] = (reverse[extension], None, os.path.getsize(file_path))
+
+    @staticmethod
+    def digest(image: Image.Image) -> str:
+        hasher = hashlib.blake2b(digest_size=16)
+        hasher.update(f"{image.mode}:{image.width}x{image.height}:".encode())
+        hasher.update(image.tobytes())
+        return hasher.hexdigest()
+
+    def __contains__(self, blob_id: str) -> bool:
+        return blob_id in self.index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self.index))
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __encode(self, image: Image.Image) -> bytes:
+        kwargs = {}
+        if self.quality is not None:
+            kwargs["quality"] = self.quality
+        elif self.codec == "png":
+            kwargs["compress_level"] = self.PNG_COMPRESS_LEVEL
+        elif self.codec == "webp":
+            kwargs["lossless"] = True
+
+        if self.codec == "jpeg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.save(buffered:=BytesIO(), format=ImageContent.CODECS[self.codec][0], **kwargs)
+        return buffered.getvalue()
+
+    # blob_id can be passed if digest() has been called
+    def put(self, image: Image.Image, blob_id: Optional[str] = None) -> str:
+        assert isinstance(image, Image.Image)
+        if blob_id is None:
+            blob_id = BlobStore.digest(image)
+        if blob_id in self.index:
+            return blob_id
+
+        data = self.__encode(image)
+        with self.lock:
+            if blob_id in self.index:
+                return blob_id
+
+            if self.packed:
+                with open(self.pack_file_path, mode="ab") as appendable:
+                    offset = appendable.tell()
+                    appendable.write(data)
+                with open(self.index_file_path, mode="a", encoding="utf-8") as appendable:
+                    appendable.write(json.dumps({
+                        "id": blob_id,
+                        "codec": self.codec,
+                        "offset": offset,
+                        "size": len(data)
+                    }) + "\n")
+            else:
+                offset = None
+                blob_file_path = self.__blob_file_path(blob_id, self.codec)
+                os.makedirs(os.path.dirname(blob_file_path), exist_ok=True)
+                with open(blob_file_path, mode="wb") as writable:
+                    writable.write(data)
+
+            self.index[blob_id] = (self.codec, offset, len(data))
+        return blob_id
+
+    def read(self, blob_id: str) -> bytes:
+        assert blob_id in self.index, f"Blob {blob_id} not found in {self.root}"
+        codec, offset, size = self.index[blob_id]
+        if offset is None:
+            file_path, offset = self.__blob_file_path(blob_id, codec), 0
+        else:
+            file_path = self.pack_file_path
+
+        with open(file_path, mode="rb") as readable:
+            readable.seek(offset)
+            return readable.read(size)
+
+    def get(self, blob_id: str) -> Image.Image:
+        return Image.open(BytesIO(self.read(blob_id)))
+
+    @staticmethod
+    def reference(blob_id: str) -> str:
+        return BlobStore.PREFIX + blob_id
+
+    # find the store of a run from any dir of its logs
+    @staticmethod
+    def locate(log_path: str) -> Optional["BlobStore"]:
+        log_path = os.path.abspath(os.path.expanduser(log_path))
+        while True:
+            root = os.path.join(log_path, BlobStore.DIRNAME)
+            if os.path.isdir(root):
+                return BlobStore(root)
+            if (parent := os.path.dirname(log_path)) == log_path:
+                return None
+            log_path = parent
+
+    # resolve screenshot field of traj.jsonl in log_path to image
+    # both blob references and plain filenames are accepted
+    @staticmethod
+    def resolve(log_path: str, reference: str) -> Image.Image:
+        if not reference.startswith(BlobStore.PREFIX):
+            return Image.open(os.path.join(log_path, reference))
+
+        store = BlobStore.locate(log_path)
+        assert store is not None, f"No blob store found for {log_path}"
+        return store.get(reference[len(BlobStore.PREFIX):])
@@ -0,0 +1,173 @@
+import sys
+import os
+import json
+import base64
+import hashlib
+import threading
+import functools
+
+from io import BytesIO
+from typing import Optional, Dict, Any, Literal
+
+from PIL import Image
+
+sys.dont_write_bytecode = True
+from .transport import Traffic
+
+CassetteMode = Literal["record", "replay", "passthrough"]
+
+
+# pixels of image decoded from base64, with mode and size
+# cached as the same image is resent in following requests
+@functools.lru_cache(maxsize=256)
+def pixel_digest(encoded: str) -> str:
+    image = Image.open(BytesIO(base64.b64decode(encoded)))
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{image.mode}:{image.width}x{image.height}:".encode())
+    digest.update(image.tobytes())
+    return "pixels:" + digest.hexdigest()
+
+
+# stand-in of requests.Response rebuilt from a record
+class Replayed:
+    def __init__(self, record: Dict[str, Any]) -> None:
+        self.status_code: int = record["status"]
+        self.headers: Dict[str, str] = record["headers"]
+        self.text: str = record["text"]
+        self.traffic = Traffic(latency=0.0, sent=0, received=0)
+        self.replayed = True
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    @property
+    def content(self) -> bytes:
+        return self.text.encode("utf-8")
+
+    def json(self) -> Any:
+        return json.loads(self.text)
+
+
+# responses of models keyed by hash of normalized payload
+# appended to {cache_path}/cassette.jsonl and shared by models in a process
+# - record: hits are replayed, misses are sent and recorded
+# - replay: hits are replayed, misses are errors; nothing is sent
+# - passthrough: always sent, nothing is recorded
+# images are hashed by pixels so that codec and quality do not matter
+# use Cassette.get() instead of Cassette() to share instances
+class Cassette:
+    FILENAME = "cassette.jsonl"
+    MODES = ("record", "replay", "passthrough")
+    # rate limits and server errors are not worth replaying
+    SKIP_STATUS = {429, 500, 502, 503, 504}
+
+    CASSETTES: Dict[str, "Cassette"] = {}
+    LOCK = threading.Lock()
+
+    def __init__(self, cache_path: str, mode: CassetteMode = "record") -> None:
+        assert mode in self.MODES, f"Unsupported cache mode: {mode}"
+        self.cache_path = os.path.expanduser(cache_path)
+        self.mode = mode
+        self.lock = threading.Lock()
+        self.records: Dict[str, Dict[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.__load()
+
+    @property
+    def file_path(self) -> str:
+        return os.path.join(self.cache_path, self.FILENAME)
+
+    # lines broken by interruption are ignored
+    def __load(self) -> None:
+        if not os.path.exists(self.file_path):
+            return
+        with open(self.file_path, mode="r", encoding="utf-8") as readable:
+            for line in readable:
+                try:
+                    record = json.loads(line)
+                    self.records[record["key"]] = record
+                except Exception: ...
+
+    @staticmethod
+    def get(cache_path: str, mode: CassetteMode = "record") -> "Cassette":
+        key = os.path.abspath(os.path.expanduser(cache_path))
+        with Cassette.LOCK:
+            if key not in Cassette.CASSETTES:
+                Cassette.CASSETTES[key] = Cassette(cache_path, mode)
+            cassette = Cassette.CASSETTES[key]
+        cassette.mode = mode
+        return cassette
+
+    # base64 of images are replaced by digests of their pixels
+    @staticmethod
+    def normalize(value: Any) -> Any:
+        if isinstance(value, dict):
+            if "media_type" in value and isinstance(value.get("data"), str):
+                return {
+                    **{key: item for key, item in value.items() if key != "data"},
+                    "data": Cassette.__pixels(value["data"])
+                }
+            return {key: Cassette.normalize(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [Cassette.normalize(item) for item in value]
+        if isinstance(value, str) and value.startswith("data:image/"):
+            return Cassette.__pixels(value.split(",", 1)[-1])
+        return value
+
+    @staticmethod
+    def __pixels(encoded: str) -> str:
+        try:
+            return pixel_digest(encoded)
+        except Exception:
+            return "bytes:" + hashlib.blake2b(encoded.encode(), digest_size=16).hexdigest()
+
+    # headers are excluded, so are api keys in them
+    @staticmethod
+    def key(base_url: str, request: Dict[str, Any]) -> str:
+        normalized = json.dumps({
+            "base_url": base_url,
+            "json": Cassette.normalize(request.get("json"))
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    def lookup(self, key: str) -> Optional[Replayed]:
+        if self.mode == "passthrough":
+            return None
+        with self.lock:
+            record = self.records.get(key)
+            if record is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        assert record is not None or self.mode != "replay", \
+            f"Request not found in {self.file_path}: {key}"
+        return None if record is None else Replayed(record)
+
+    def record(self, key: str, response: Any) -> None:
+        if self.mode != "record" or response.status_code in self.SKIP_STATUS:
+            return
+
+        record = {
+            "key": key,
+            "status": response.status_code,
+            "headers": {
+                name: value for name, value in response.headers.items()
+                if name.lower() in ("content-type", "retry-after")
+            },
+            "text": response.text
+        }
+        with self.lock:
+            self.records[key] = record
+            os.makedirs(self.cache_path, exist_ok=True)
+            with open(self.file_path, mode="a", encoding="utf-8") as writable:
+                writable.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def __str__(self) -> str:
+        total = self.hits + self.misses
+        rate = 0.0 if total == 0 else self.hits / total
+        return (
+            f"mode={self.mode}, records={len(self.records)}, "
+            f"hits={self.hits}, misses={self.misses}, hit_rate={rate:.1%}"
+        )
@@ -0,0 +1,121 @@
+import sys
+import os
+import json
+import hashlib
+import traceback
+
+from typing import Optional, List, Dict, Any, Tuple
+
+sys.dont_write_bytecode = True
+from .task import Task
+
+
+# metadata of all task configs under tasks_path
+# cached in {tasks_path}/.catalog.json and keyed by relative path
+# - entries are reused if mtime and size are not changed
+# - otherwise hash of content decides whether to validate it again
+# - invalid configs are cached as well, with their errors
+# configs are validated by nil Task, while checks of
+# subclasses are left to the time when tasks are built
+class Catalog:
+    FILENAME = ".catalog.json"
+    VERSION = 1
+    FIELDS = ("type", "sort", "steps")
+
+    def __init__(self, tasks_path: str) -> None:
+        assert isinstance(tasks_path, str)
+        self.tasks_path = os.path.expanduser(tasks_path)
+        assert os.path.isdir(self.tasks_path)
+
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.hits = 0
+
+    @property
+    def file_path(self) -> str:
+        return os.path.join(self.tasks_path, self.FILENAME)
+
+    def __load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.file_path, mode="r", encoding="utf-8") as readable:
+                catalog = json.load(readable)
+            assert catalog["version"] == self.VERSION
+            return catalog["entries"]
+        except Exception:
+            return {}
+
+    # cache is skipped silently if tasks_path is read-only
+    def __dump(self) -> None:
+        temp_file_path = self.file_path + f".{os.getpid()}"
+        try:
+            with open(temp_file_path, mode="w", encoding="utf-8") as writable:
+                json.dump({
+                    "version": self.VERSION,
+                    "entries": self.entries
+                }, writable, ensure_ascii=False)
+            os.replace(temp_file_path, self.file_path)
+        except OSError: ...
+
+    # in the same order as Tester traverses
+    def __walk(self, current_infix: str = "") -> List[str]:
+        rel_paths = []
+        current_dir_path = os.path.join(self.tasks_path, current_infix)
+        for unknown_name in sorted(os.listdir(current_dir_path)):
+            if unknown_name.startswith(self.FILENAME):
+                continue
+            rel_path = os.path.join(current_infix, unknown_name)
+            if os.path.isfile(os.path.join(self.tasks_path, rel_path)):
+                rel_paths.append(rel_path)
+            else:
+                rel_paths.extend(self.__walk(rel_path))
+        return rel_paths
+
+    @staticmethod
+    def __validate(config_path: str) -> Dict[str, Any]:
+        try:
+            task = Task(config_path=config_path)
+            return {key: getattr(task, key) for key in Catalog.FIELDS}
+        except Exception:
+            return {"error": traceback.format_exc()}
+
+    def __entry(self, rel_path: str, cached: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        config_path = os.path.join(self.tasks_path, rel_path)
+        stat = os.stat(config_path)
+        if cached is not None \
+            and cached["mtime"] == stat.st_mtime_ns \
+            and cached["size"] == stat.st_size:
+            self.hits += 1
+            return cached
+
+        with open(config_path, mode="rb") as readable:
+            digest = hashlib.sha1(readable.read()).hexdigest()
+
+        if cached is not None and cached["hash"] == digest:
+            self.hits += 1
+            entry = cached.copy()
+        else:
+            entry = Catalog.__validate(config_path)
+            entry["hash"] = digest
+
+        entry["mtime"] = stat.st_mtime_ns
+        entry["size"] = stat.st_size
+        return entry
+
+    # return valid entries and errors of invalid ones keyed by relative path
+    def build(self) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, str]]:
+        cached, self.hits = self.__load(), 0
+        self.entries = {
+            rel_path: self.__entry(rel_path, cached.get(rel_path))
+            for rel_path in self.__walk()
+        }
+        if self.entries != cached:
+            self.__dump()
+
+        valid = {
+            rel_path: entry for rel_path, entry in self.entries.items()
+            if "error" not in entry
+        }
+        errors = {
+            rel_path: entry["error"] for rel_path, entry in self.entries.items()
+            if "error" in entry
+        }
+        return valid, errors
@@ -1,22 +1,19 @@
-import json
 import sys
-import re
-
 import os
+import re
+import json
 
 from typing import List, Tuple, Dict
 from typing import Optional, Any, Self
 from dataclasses import dataclass
 
-from .model import Message, TextContent
-
 sys.dont_write_bytecode = True
 from .manager import OBS
 from .log import VirtualLog
 from .agent import Agent, AIOAgent
 from .agent import PlannerAgent, GrounderAgent
 from .agent import CoderAgent, ActorAgent
-from .prompt import TypeSort, CodeLike
+from .prompt import TypeSort, CodeLike, Primitive
 
 
 @dataclass
@@ -75,21 +72,7 @@ class AllInOne(Community):
         } if step_index == 0 else None
 
         user_content = self.mono._step(obs, init_kwargs)
-
-        DEBUG_MODE = os.environ.get("DEBUG_MODE", "False").lower() == "true"
-        ACTION_PATH = os.environ.get("ACTION_PATH", None)
-        if DEBUG_MODE and ACTION_PATH is not None:
-            # for debugging purpose, 直接加载 debug 文件
-            with open(ACTION_PATH, "r") as f:
-                history = json.loads(f.read())
-                assistant_content = [content for content in history if content["role"] == "assistant"]
-                response_message = Message(
-                    style="openai",
-                    role="assistant",
-                    content=[TextContent(assistant_content[step_index]["content"][0]["text"])],
-                )
-        else:
-            response_message = self.mono(user_content, timeout=timeout)
+        response_message = self.mono(user_content, timeout=timeout)
 
         assert len(response_message.content) == 1
         response_content = response_message.content[0]
@@ -245,3 +228,47 @@ class Disentangled(Community):
                 results.append(CodeLike(code=post))
 
         return results
+
+
+# replays actions saved in traj.jsonl of a previous run without models
+# - tags of SoM are parsed again from the current observation
+# - TIMEOUT is raised once recorded steps are used up
+@dataclass
+class Replay(Community):
+    traj_path: str
+
+    def __post_init__(self):
+        super().__post_init__()
+        assert isinstance(self.traj_path, str)
+        assert os.path.exists(self.traj_path), f"Trajectory not found: {self.traj_path}"
+        with open(self.traj_path, mode="r", encoding="utf-8") as readable:
+            records = [json.loads(line) for line in readable if line.strip() != ""]
+        self.actions: Dict[int, List[str]] = {
+            record["step_index"]: record["actions"]
+            for record in records
+        }
+
+    def __call__(
+        self,
+        steps: Tuple[int, int],
+        inst: str,
+        obs: Dict[str, Any],
+        code_info: tuple[set[str], Optional[List[List[int]]]],
+        type_sort: TypeSort,
+        timeout: int
+    ) -> List[CodeLike]:
+        step_index, total_steps = steps
+        if step_index not in self.actions:
+            raise Primitive.PlannedTermination(Primitive.TIMEOUT)
+
+        primitives, tags = code_info
+        codes = [CodeLike(code=code) for code in self.actions[step_index]]
+        for code in codes:
+            if tags is not None and not code.is_primitive(primitives):
+                code.push_prefix(CodeLike.parse_tags(tags))
+
+        self.vlog.info(
+            f"Replay {step_index + 1}/{total_steps}: \n"
+                + "\n".join(self.actions[step_index])
+        )
+        return codes
@@ -0,0 +1,248 @@
+import sys
+import os
+import re
+import time
+import sqlite3
+import threading
+
+from typing import Optional, List, Set, Dict, Any, Iterable
+
+sys.dont_write_bytecode = True
+from .log import Log
+
+
+# run-level index of finished tasks stored in {logs_path}/index.db
+# - rows are written by Tester as soon as each task finishes
+# - result is NULL for tasks that were skipped due to errors
+# - logs produced before the index existed can be imported
+#   by import_logs(), where only result and steps are recoverable
+# startup latency of apps is kept in another table of the same db
+class RunIndex:
+    FILENAME = "index.db"
+    TIMEOUT = 30
+
+    COLUMNS = {
+        "ident": "TEXT PRIMARY KEY",
+        "app": "TEXT",
+        "sort": "TEXT",
+        "result": "REAL",
+        "stop_type": "TEXT",
+        "steps_used": "INTEGER",
+        "steps": "INTEGER",
+        "duration": "REAL",
+        "finished_at": "REAL",
+        "requests": "INTEGER",
+        "prompt_tokens": "INTEGER",
+        "completion_tokens": "INTEGER"
+    }
+
+    STARTUP_COLUMNS = {
+        "app": "TEXT",
+        "manager": "TEXT",
+        "version": "TEXT",
+        "latency": "REAL",
+        "started_at": "REAL"
+    }
+
+    STOP_PATTERN = r"Starting evaluation with stop type of (\w+)\."
+
+    def __init__(self, logs_path: str) -> None:
+        assert isinstance(logs_path, str)
+        self.logs_path = os.path.expanduser(logs_path)
+        os.makedirs(self.logs_path, exist_ok=True)
+
+        created = not os.path.exists(self.file_path)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(
+            self.file_path,
+            timeout=self.TIMEOUT,
+            check_same_thread=False
+        )
+        self.conn.row_factory = sqlite3.Row
+
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS tasks ("
+                    + ", ".join([f"{key} {value}" for key, value in self.COLUMNS.items()])
+                    + ")"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS startups ("
+                    + ", ".join([f"{key} {value}" for key, value in self.STARTUP_COLUMNS.items()])
+                    + ")"
+            )
+
+        # logs of previous runs are taken over once
+        if created:
+            self.import_logs()
+
+    @property
+    def file_path(self) -> str:
+        return os.path.join(self.logs_path, self.FILENAME)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def query(self, sql: str, params: Iterable[Any] = ()) -> List[sqlite3.Row]:
+        with self.lock:
+            return self.conn.execute(sql, tuple(params)).fetchall()
+
+    def __upsert(self, row: Dict[str, Any], replace: bool) -> None:
+        keys = list(row.keys())
+        with self.lock, self.conn:
+            self.conn.execute(
+                f"INSERT OR {'REPLACE' if replace else 'IGNORE'} INTO tasks "
+                    + f"({', '.join(keys)}) VALUES ({', '.join(['?'] * len(keys))})",
+                [row[key] for key in keys]
+            )
+
+    def record(
+        self,
+        ident: str,
+        app: str,
+        sort: str,
+        result: Optional[bool],
+        stop_type: Optional[str] = None,
+        steps_used: int = 0,
+        steps: Optional[int] = None,
+        duration: Optional[float] = None,
+        usage: Optional[Dict[str, int]] = None
+    ) -> None:
+        usage = {} if usage is None else usage
+        self.__upsert({
+            "ident": ident,
+            "app": app,
+            "sort": sort,
+            "result": None if result is None else float(result),
+            "stop_type": stop_type,
+            "steps_used": steps_used,
+            "steps": steps,
+            "duration": duration,
+            "finished_at": time.time(),
+            "requests": usage.get("requests", 0),
+            "prompt_tokens": usage.get("prompt_tokens", 0),
+            "completion_tokens": usage.get("completion_tokens", 0)
+        }, replace=True)
+
+    def record_startup(
+        self,
+        app: str,
+        manager: str,
+        version: str,
+        latency: float,
+        started_at: float
+    ) -> None:
+        with self.lock, self.conn:
+            self.conn.execute(
+                f"INSERT INTO startups ({', '.join(self.STARTUP_COLUMNS)}) "
+                    + f"VALUES ({', '.join(['?'] * len(self.STARTUP_COLUMNS))})",
+                (app, manager, version, latency, started_at)
+            )
+
+    # startup latency grouped by app, manager and version
+    def startups(self) -> List[Dict[str, Any]]:
+        return [dict(row) for row in self.query(
+            "SELECT app, manager, version, COUNT(*) AS count, "
+            "AVG(latency) AS mean, MIN(latency) AS min, MAX(latency) AS max "
+            "FROM startups GROUP BY app, manager, version ORDER BY app, manager, version"
+        )]
+
+    # idents with result.out written, i.e. not to be run again
+    # result.out on disk is the source of truth that Log also checks,
+    # so rows whose file is deleted are not regarded as finished
+    def finished(self) -> Set[str]:
+        return {
+            row["ident"] for row in
+            self.query("SELECT ident FROM tasks WHERE result IS NOT NULL")
+            if os.path.exists(os.path.join(
+                self.logs_path,
+                row["ident"],
+                Log.RESULT_FILENAME
+            ))
+        }
+
+    def totals(self) -> Dict[str, int]:
+        row = self.query(
+            "SELECT COUNT(*) AS total, "
+            "COALESCE(SUM(result > 0), 0) AS passed, "
+            "COALESCE(SUM(result = 0), 0) AS failed, "
+            "COALESCE(SUM(result IS NULL), 0) AS skipped "
+            "FROM tasks"
+        )[0]
+        return dict(row)
+
+    # mean score grouped by app; unfinished tasks are scored 0
+    def scores(self) -> List[Dict[str, Any]]:
+        return [dict(row) for row in self.query(
+            "SELECT app, COUNT(*) AS total, "
+            "SUM(result > 0) AS passed, "
+            "SUM(result IS NULL) AS unfinished, "
+            "AVG(COALESCE(result, 0)) AS score, "
+            "AVG(steps_used) AS steps, "
+            "AVG(duration) AS duration, "
+            "SUM(prompt_tokens) AS prompt_tokens, "
+            "SUM(completion_tokens) AS completion_tokens "
+            "FROM tasks GROUP BY app ORDER BY app"
+        )]
+
+    def __str__(self) -> str:
+        totals = self.totals()
+        return (
+            f"{totals['total']} total indexed in {self.file_path}: "
+            f"{totals['passed']} passed, "
+            f"{totals['failed']} failed, "
+            f"{totals['skipped']} skipped."
+        )
+
+    # every dir with log files is regarded as the log of a task
+    # app is assumed to be the name of its parent dir
+    def import_logs(self, replace: bool = False) -> int:
+        count = 0
+        for dir_path, dirnames, filenames in os.walk(self.logs_path):
+            dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+            log_filenames = sorted([
+                filename for filename in filenames
+                if filename.endswith(".log")
+                    and not filename.startswith(Log.LEGACY_MARKER)
+                    and not filename.startswith(Log.SUM_LOG_PREFIX)
+            ])
+            if dir_path == self.logs_path or len(log_filenames) == 0:
+                continue
+
+            ident = os.path.relpath(dir_path, self.logs_path).replace("\\", "/")
+            self.__upsert({
+                "ident": ident,
+                "app": os.path.basename(os.path.dirname(dir_path)),
+                "result": RunIndex.__read_result(dir_path),
+                "stop_type": RunIndex.__read_stop_type(
+                    os.path.join(dir_path, log_filenames[-1])
+                ),
+                "steps_used": RunIndex.__count_lines(
+                    os.path.join(dir_path, Log.TRAJ_FILENAME)
+                ),
+                "finished_at": os.path.getmtime(dir_path)
+            }, replace=replace)
+            count += 1
+        return count
+
+    @staticmethod
+    def __read_result(dir_path: str) -> Optional[float]:
+        try:
+            with open(os.path.join(dir_path, Log.RESULT_FILENAME), mode="r") as readable:
+                return float(readable.read().strip())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    @staticmethod
+    def __read_stop_type(file_path: str) -> Optional[str]:
+        with open(file_path, mode="r", encoding="utf-8", errors="ignore") as readable:
+            matches = re.findall(RunIndex.STOP_PATTERN, readable.read())
+        return matches[-1] if len(matches) > 0 else None
+
+    @staticmethod
+    def __count_lines(file_path: str) -> int:
+        if not os.path.exists(file_path):
+            return 0
+        with open(file_path, mode="r", encoding="utf-8") as readable:
+            return sum([1 for line in readable if line.strip() != ""])
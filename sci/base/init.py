@@ -1,6 +1,5 @@
 import sys
 import os
-import urllib.request
 
 from typing import TYPE_CHECKING
 
@@ -10,6 +9,7 @@ if TYPE_CHECKING:
 
 
 def raw_download(url: str, path: str) -> bool:
+    import urllib.request
     path = os.path.expanduser(path)
     urllib.request.urlretrieve(url, path)
     return True
@@ -0,0 +1,143 @@
+import sys
+import time
+import random
+import threading
+
+from email.utils import parsedate_to_datetime
+from typing import Optional, Dict, Tuple, Any
+
+sys.dont_write_bytecode = True
+
+
+# token bucket refilled continuously at rate per second
+# reserve() takes tokens at once and may leave the bucket in debt,
+# so that callers queue up in order of their arrival
+class Bucket:
+    def __init__(self, capacity: float, rate: float) -> None:
+        assert capacity > 0 and rate > 0
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def __refill(self, now: float) -> None:
+        self.tokens = min(
+            self.capacity,
+            self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+    # seconds to wait before amount can be used
+    def reserve(self, amount: float, now: float) -> float:
+        self.__refill(now)
+        self.tokens -= min(amount, self.capacity)
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def refund(self, amount: float, now: float) -> None:
+        self.__refill(now)
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+# shared by all models of the same (base_url, model_name) in a process
+# - rpm / tpm: requests / tokens per minute, unlimited if None
+# - cool(): all requests are held when server asks to retry after
+# use Limiter.get() instead of Limiter() to share instances
+class Limiter:
+    BACKOFF_BASE = 1.0
+    BACKOFF_MAX = 60.0
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+
+    LIMITERS: Dict[Tuple[str, str], "Limiter"] = {}
+    LOCK = threading.Lock()
+
+    def __init__(self, rpm: Optional[int] = None, tpm: Optional[int] = None) -> None:
+        self.lock = threading.Lock()
+        self.requests: Optional[Bucket] = None
+        self.tokens: Optional[Bucket] = None
+        self.cooldown = 0.0
+        self.configure(rpm, tpm)
+
+    # limits are updated if changed by any of the models
+    def configure(self, rpm: Optional[int], tpm: Optional[int]) -> None:
+        assert rpm is None or rpm > 0
+        assert tpm is None or tpm > 0
+        with self.lock:
+            if rpm is not None \
+                and (self.requests is None or self.requests.capacity != rpm):
+                self.requests = Bucket(rpm, rpm / 60)
+            if tpm is not None \
+                and (self.tokens is None or self.tokens.capacity != tpm):
+                self.tokens = Bucket(tpm, tpm / 60)
+
+    @staticmethod
+    def get(
+        base_url: str,
+        model_name: str,
+        rpm: Optional[int] = None,
+        tpm: Optional[int] = None
+    ) -> "Limiter":
+        with Limiter.LOCK:
+            key = (base_url, model_name)
+            if key not in Limiter.LIMITERS:
+                Limiter.LIMITERS[key] = Limiter()
+            limiter = Limiter.LIMITERS[key]
+        if rpm is not None or tpm is not None:
+            limiter.configure(rpm, tpm)
+        return limiter
+
+    def __reserve(self, tokens: int) -> float:
+        with self.lock:
+            now = time.monotonic()
+            delay = max(0.0, self.cooldown - now)
+            if self.requests is not None:
+                delay = max(delay, self.requests.reserve(1, now))
+            if self.tokens is not None and tokens > 0:
+                delay = max(delay, self.tokens.reserve(tokens, now))
+            return delay
+
+    # block until request can be sent; return seconds waited
+    def acquire(self, tokens: int = 0) -> float:
+        delay = self.__reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    async def aacquire(self, tokens: int = 0) -> float:
+        import asyncio
+        delay = self.__reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+    # give back tokens overestimated when acquired
+    def refund(self, tokens: int) -> None:
+        if self.tokens is not None and tokens > 0:
+            with self.lock:
+                self.tokens.refund(tokens, time.monotonic())
+
+    def cool(self, span: float) -> None:
+        with self.lock:
+            self.cooldown = max(self.cooldown, time.monotonic() + span)
+
+    @staticmethod
+    def retry_after(response: Any) -> Optional[float]:
+        value = getattr(response, "headers", {}).get("Retry-After")
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError: ...
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except Exception:
+            return None
+
+    # full jitter: uniform in [0, min(max, base * 2 ** attempt)]
+    # Retry-After is respected as the lower bound
+    @staticmethod
+    def backoff(attempt: int, retry_after: Optional[float] = None) -> float:
+        span = random.uniform(0, min(
+            Limiter.BACKOFF_MAX,
+            Limiter.BACKOFF_BASE * 2 ** attempt
+        ))
+        return span if retry_after is None else retry_after + span * 0.1
@@ -1,18 +1,24 @@
 import logging
+import functools
 import os
 import re
 import json
+import queue
+import atexit
 import random
 import string
+import threading
+import traceback
 
 from datetime import datetime
 from enum import Enum
 from typing import Optional, List, Dict, Any
-from typing import Callable, Self, TYPE_CHECKING
+from typing import Callable, Self, IO, TYPE_CHECKING
 
 from PIL import Image
 
 if TYPE_CHECKING:
+    from .blob import BlobStore
     from .task import Task
     from .agent import CodeLike
     from .community import Community
@@ -21,6 +27,76 @@ if TYPE_CHECKING:
 GLOBAL_VLOG = None
 HAVE_CALLED = False
 
+
+# writes files of trajectories in background
+# - jobs are queued with a bounded size, so that put() blocks
+#   when the writer falls behind instead of piling up screenshots
+# - appended files are kept open until flush()
+# - flush() waits for all queued jobs and syncs files to disk
+class Writer:
+    QUEUE_SIZE = 32
+
+    def __init__(self, on_error: Callable[[str], None]) -> None:
+        self.on_error = on_error
+        self.jobs: queue.Queue[Optional[Callable[[], None]]] = \
+            queue.Queue(maxsize=self.QUEUE_SIZE)
+        self.files: Dict[str, IO] = {}
+        self.thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+
+    def __run(self) -> None:
+        while (job := self.jobs.get()) is not None:
+            try:
+                job()
+            except Exception:
+                self.on_error(
+                    "Error when writing trajectory.\n"
+                        + traceback.format_exc()
+                )
+            finally:
+                self.jobs.task_done()
+        self.jobs.task_done()
+
+    def put(self, job: Callable[[], None]) -> None:
+        with self.lock:
+            if self.thread is None:
+                atexit.register(self.close)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.__run, daemon=True)
+                self.thread.start()
+        self.jobs.put(job)
+
+    # only called in writer thread
+    def append(self, file_path: str, lines: List[str]) -> None:
+        if file_path not in self.files:
+            self.files[file_path] = open(file_path, mode="a", encoding="utf-8")
+        self.files[file_path].write("".join(lines))
+
+    # only called in writer thread
+    def truncate(self, file_path: str) -> None:
+        if file_path in self.files:
+            self.files.pop(file_path).close()
+        open(file_path, mode="w", encoding="utf-8").close()
+
+    def __sync(self) -> None:
+        for writable in self.files.values():
+            writable.flush()
+            os.fsync(writable.fileno())
+            writable.close()
+        self.files.clear()
+
+    def flush(self) -> None:
+        if self.thread is None:
+            return
+        self.put(self.__sync)
+        self.jobs.join()
+
+    def close(self) -> None:
+        self.flush()
+        if self.thread is not None and self.thread.is_alive():
+            self.jobs.put(None)
+            self.thread.join()
+
 class Log:
     # IGNORE: refuse all calls outside of Log.log()
     # NATURALIZATION: print output in ways of Log
@@ -83,6 +159,8 @@ class Log:
     RECORD_FILENAME  = "record.mp4"
     REQUEST_FILENAME = "request_{agent}.json"
     SIMP_FILENAME    = "request_{agent}.simp.json"
+    REQUEST_STREAM   = "request_{agent}.jsonl"
+    SIMP_STREAM      = "request_{agent}.simp.jsonl"
     PROMPT_FILENAME  = "prompt_{agent}.txt"
 
     @property
@@ -120,6 +198,16 @@ class Log:
         assert self.file_handler is not None
         return os.path.join(self.save_path, self.SIMP_FILENAME)
 
+    @property
+    def request_stream_path(self) -> str:
+        assert self.file_handler is not None
+        return os.path.join(self.save_path, self.REQUEST_STREAM)
+
+    @property
+    def simp_stream_path(self) -> str:
+        assert self.file_handler is not None
+        return os.path.join(self.save_path, self.SIMP_STREAM)
+
     @property
     def prompt_file_path(self) -> str:
         assert self.file_handler is not None
@@ -159,6 +247,9 @@ class Log:
             self.__add_stream_handler()
 
         self.file_handler = None
+        self.writer = Writer(lambda message: self.error(message))
+        self.blob_store: Optional["BlobStore"] = None
+        self.dumped: Dict[str, Any] = {}
         self._registered = []
         self._independent = []
         self.register_callback = None
@@ -322,6 +413,8 @@ class Log:
         self.extra["domain"] = self.DEFAULT_DOMAIN if ident is None else ident
 
         assert isinstance(ignore, bool)
+        self.writer.flush()
+        self.dumped.clear()
         self.__clear(ignore)
 
         assert isinstance(callback, bool)
@@ -332,6 +425,8 @@ class Log:
         return os.path.exists(self.result_file_path)
 
     def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.writer.flush()
+        self.__compose_requests()
         assert isinstance(self.register_callback, bool)
         if self.register_callback:
             self.callback()
@@ -354,7 +449,8 @@ class Log:
         obs: Dict[str, Any],
         codes: List["CodeLike"],
         community: "Community",
-        is_textual: bool
+        is_textual: bool,
+        latency: Optional[Dict[str, float]] = None
     ) -> None:
         assert self.save_path is not None, "Call trigger() first"
 
@@ -365,6 +461,13 @@ class Log:
             "actions": [code_like.code for code_like in codes]
         }
 
+        # time consumed by each observation in seconds
+        if latency is not None:
+            traj_obj["latency"] = {
+                key: round(value, 3)
+                for key, value in latency.items()
+            }
+
         text_filename = self.TEXT_FILENAME.format(
             index=step_index,
             timestamp=timestamp
@@ -385,56 +488,116 @@ class Log:
         if len(filtered_text) == 1:
             key_name = "textual" if is_textual else "a11y_tree"
             traj_obj[key_name] = text_filename
-            with open(text_file_path, mode="w", encoding="utf-8") as writable:
-                writable.write(filtered_text[0])
+            self.writer.put(lambda: Log.__write_text(
+                text_file_path,
+                filtered_text[0]
+            ))
 
         # save screenshot (or SoM screenshot) to new file
         filtered_image = [
             item for item in obs.values()
             if isinstance(item, Image.Image)
         ]
+        # or to blob store if assigned, referred to by pixel hash
         if len(filtered_image) == 1:
-            traj_obj["screenshot"] = image_filename
-            filtered_image[0].save(image_file_path)
+            # lazily opened images should not be loaded in two threads
+            filtered_image[0].load()
+            if self.blob_store is None:
+                traj_obj["screenshot"] = image_filename
+                self.writer.put(lambda: filtered_image[0].save(image_file_path))
+            else:
+                blob_id = self.blob_store.digest(filtered_image[0])
+                traj_obj["screenshot"] = self.blob_store.reference(blob_id)
+                self.writer.put(lambda: self.blob_store.put(filtered_image[0], blob_id))
 
         # save trajetories by appending previous records
-        with open(self.traj_file_path, mode="a", encoding="utf-8") as appendable:
-            appendable.write(json.dumps(traj_obj, ensure_ascii=False) + "\n")
-
-        # save requests by overwriting previous record
+        traj_file_path = self.traj_file_path
+        self.writer.put(lambda: self.writer.append(
+            traj_file_path,
+            [json.dumps(traj_obj, ensure_ascii=False) + "\n"]
+        ))
+
+        # save requests by appending new messages only
+        # start over if context of agent is reset or shrunk
         for name, agent in community:
-            full_request = agent.dump_history(False)
-            simp_request = agent.dump_history(True)
-            with open(
-                self.request_file_path.format(agent=name),
-                mode="w",
-                encoding="utf-8"
-            ) as writable:
-                json.dump(
-                    full_request,
-                    writable,
-                    ensure_ascii=False,
-                    indent=2
-                )
+            context_id, dumped = self.dumped.get(name, (None, 0))
+            if context_id != id(agent.context) or dumped > len(agent.context) + 1:
+                dumped = 0
+            self.dumped[name] = (id(agent.context), len(agent.context) + 1)
+
+            full_request = agent.dump_history(False, start=dumped)
+            simp_request = agent.dump_history(True, start=dumped)
+            self.writer.put(functools.partial(
+                self.__write_request,
+                request_file_path=self.request_stream_path.format(agent=name),
+                simp_file_path=self.simp_stream_path.format(agent=name),
+                prompt_file_path=self.prompt_file_path.format(agent=name),
+                full_request=full_request,
+                simp_request=simp_request,
+                restart=dumped == 0
+            ))
 
-            with open(
-                self.simp_file_path.format(agent=name),
-                mode="w",
-                encoding="utf-8"
-            ) as writable:
-                json.dump(
-                    simp_request,
-                    writable,
-                    ensure_ascii=False,
-                    indent=2
-                )
+    @staticmethod
+    def __write_text(file_path: str, text: str) -> None:
+        with open(file_path, mode="w", encoding="utf-8") as writable:
+            writable.write(text)
 
-            with open(
-                self.prompt_file_path.format(agent=name),
-                mode="w",
-                encoding="utf-8"
-            ) as writable:
-                writable.write(full_request[0]["content"][0]["text"])
+    # only called in writer thread
+    def __write_request(
+        self,
+        request_file_path: str,
+        simp_file_path: str,
+        prompt_file_path: str,
+        full_request: List[Dict],
+        simp_request: List[Dict],
+        restart: bool
+    ) -> None:
+        if restart:
+            self.writer.truncate(request_file_path)
+            self.writer.truncate(simp_file_path)
+            Log.__write_text(
+                prompt_file_path,
+                full_request[0]["content"][0]["text"]
+            )
+
+        for file_path, request in (
+            (request_file_path, full_request),
+            (simp_file_path, simp_request)
+        ):
+            self.writer.append(file_path, [
+                json.dumps(message, ensure_ascii=False) + "\n"
+                for message in request
+            ])
+
+    # requests are appended to .jsonl files during the task,
+    # and composed into .json files of the previous format when it exits,
+    # so that readers of request_{agent}.json keep working
+    def __compose_requests(self) -> None:
+        if self.file_handler is None:
+            return
+        for name in self.dumped:
+            for stream_path, file_path in (
+                (self.request_stream_path, self.request_file_path),
+                (self.simp_stream_path, self.simp_file_path)
+            ):
+                stream_path = stream_path.format(agent=name)
+                if not os.path.exists(stream_path):
+                    continue
+                with open(file_path.format(agent=name), mode="w", encoding="utf-8") as writable:
+                    json.dump(
+                        Log.load_request(stream_path),
+                        writable,
+                        ensure_ascii=False,
+                        indent=2
+                    )
+
+    # load messages saved by save(), from either .jsonl or .json files
+    @staticmethod
+    def load_request(file_path: str) -> List[Dict]:
+        with open(file_path, mode="r", encoding="utf-8") as readable:
+            if not file_path.endswith(".jsonl"):
+                return json.load(readable)
+            return [json.loads(line) for line in readable if line.strip() != ""]
 
     # should not be set as protected method
     # as they will be used by Task objects
@@ -446,6 +609,7 @@ class Log:
             stop_args: List[str]
         ) -> bool:
             return_value = method(self, stop_type, stop_args)
+            self.vlog.writer.flush()
             with open(
                 self.vlog.result_file_path,
                 mode="w",
@@ -509,6 +673,13 @@ class VirtualLog:
     def __exit__(self, exc_type, exc_value, traceback) -> None:
         self()
 
+    # Log holds handlers with locks which cannot be copied
+    # so copies of vlog keep pointing to the same log
+    def __deepcopy__(self, memo: Dict[int, Any]) -> "VirtualLog":
+        vlog = VirtualLog()
+        vlog._log = self._log
+        return vlog
+
     # use vlog.fallback() when vlog might be nil
     # use GLOBAL_VLOG directly when vlog must be nil
     def fallback(self) -> "VirtualLog":
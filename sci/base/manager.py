@@ -3,10 +3,11 @@ import os
 import re
 import time
 import tempfile
+import threading
 
-from typing import Union, Tuple, Optional
+from typing import Union, Tuple, Optional, Iterable, Dict, List, Any
 from typing import Callable, Self, NoReturn, TypeVar
-from PIL import Image
+from PIL import Image, ImageChops
 
 sys.dont_write_bytecode = True
 from .log import VirtualLog
@@ -14,6 +15,17 @@ from .utils import error_factory
 
 T = TypeVar("T")
 
+# startup latency of apps: (app, manager, version, seconds, started_at)
+# drained by Tester into RunIndex so that it can be tracked across releases
+STARTUPS: List[Tuple[str, str, str, float, float]] = []
+STARTUPS_LOCK = threading.Lock()
+
+def drain_startups() -> List[Tuple[str, str, str, float, float]]:
+    with STARTUPS_LOCK:
+        records = STARTUPS.copy()
+        STARTUPS.clear()
+    return records
+
 # abstract base class of all apps
 # - subclass should include
 #   - __init__(): super().__init__() is required
@@ -30,10 +42,28 @@ T = TypeVar("T")
 #   - a11y_tree(): get a11y tree of app
 #   - set_of_marks(): get som of app
 #   - record_start() / record_stop(): record video for log
+#   - frame() / ready(): cheap probes used by settle()
 class Manager:
     ACTION_INTERVAL = 1
     HOMO_TIMEOUT = 240
     HETERO_TIMEOUT = 480
+    PROBE_TIMEOUT = 5
+
+    # UI is settled if frames are unchanged for SETTLE_STABLE seconds
+    # a frame is changed if more than CHANGE_TOLERANCE of its pixels
+    # differ by more than PIXEL_TOLERANCE in grayscale
+    SETTLE_INTERVAL = 0.2
+    SETTLE_STABLE = 0.6
+    SETTLE_TIMEOUT = 3
+    PIXEL_TOLERANCE = 16
+    CHANGE_TOLERANCE = 0.002
+    # settle() sleeps for fixed time unless enabled
+    settling = False
+
+    # intervals of wait_ready() start from READY_INTERVAL and double
+    READY_INTERVAL = 0.1
+    READY_INTERVAL_MAX = 2
+    READY_DEADLINE = 60
 
     @staticmethod
     def pause(span: Optional[int] = None) -> None:
@@ -103,6 +133,141 @@ class Manager:
         """a screenshot with interact-able elements marked with numerical tags"""
         raise NotImplementedError
 
+    def observe(self, obs_types: Iterable[str]) -> Optional[Dict[str, Any]]:
+        """observations of all types at once; None if not supported"""
+        return None
+
+    @property
+    def app_name(self) -> str:
+        splits = self.__class__.__module__.split(".")
+        return splits[-2] if len(splits) > 1 else splits[0]
+
+    # probe of wait_ready() for apps serving HTTP at self.base_url:
+    # GET path answers with the expected version
+    def http_ready(self, path: str = "/version") -> bool:
+        import requests
+        version = requests.get(
+            self.base_url + path,
+            timeout=self.PROBE_TIMEOUT
+        ).text
+        assert version == self.version, f"Unexpected version of {self.app_name}: {version}"
+        return True
+
+    # poll probe() with exponential backoff until it returns True
+    # - other exceptions (e.g. refused connections) count as not ready
+    # - AssertionError of probe (e.g. wrong version) is raised at once
+    # startup latency is logged and recorded in STARTUPS
+    def wait_ready(
+        self,
+        probe: Callable[[], bool],
+        deadline: Optional[float] = None
+    ) -> float:
+        deadline = self.READY_DEADLINE if deadline is None else deadline
+        start_time, interval, attempts = time.time(), self.READY_INTERVAL, 0
+        while True:
+            attempts += 1
+            try:
+                if probe():
+                    break
+            except AssertionError:
+                raise
+            except Exception: ...
+
+            elapsed = time.time() - start_time
+            assert elapsed < deadline, \
+                f"Timeout when waiting for {self.app_name} after {attempts} attempts"
+            time.sleep(min(interval, deadline - elapsed))
+            interval = min(interval * 2, self.READY_INTERVAL_MAX)
+
+        latency = time.time() - start_time
+        with STARTUPS_LOCK:
+            STARTUPS.append((
+                self.app_name,
+                self.__class__.__name__,
+                self.version,
+                latency,
+                start_time
+            ))
+        self.vlog.info(f"{self.app_name} is ready in {latency:.2f}s after {attempts} attempts.")
+        return latency
+
+    def frame(self) -> Optional[Image.Image]:
+        """a low-resolution frame to tell whether UI is changing; None if not supported"""
+        return None
+
+    def ready(self) -> Optional[bool]:
+        """whether app is ready for the next input; None if not supported"""
+        return None
+
+    @staticmethod
+    def _changed(last: Image.Image, current: Image.Image) -> bool:
+        if last.size != current.size:
+            return True
+        histogram = ImageChops.difference(
+            last.convert("L"),
+            current.convert("L")
+        ).histogram()
+        changed = sum(histogram[Manager.PIXEL_TOLERANCE + 1:])
+        return changed > Manager.CHANGE_TOLERANCE * last.width * last.height
+
+    def __poll_ready(self, start_time: float, timeout: float) -> bool:
+        while (ready := self.ready()) is False \
+            and time.time() - start_time < timeout:
+            time.sleep(self.SETTLE_INTERVAL)
+        return ready is True
+
+    def __poll_frame(
+        self,
+        start_time: float,
+        span: float,
+        changed: bool,
+        timeout: float
+    ) -> None:
+        if (last := self.frame()) is None:
+            return Manager.pause(span)
+
+        stable_time, seen = time.time(), not changed
+        while time.time() - start_time < timeout:
+            time.sleep(self.SETTLE_INTERVAL)
+            if (current := self.frame()) is None:
+                return Manager.pause(max(0, span - (time.time() - start_time)))
+
+            if Manager._changed(last, current):
+                stable_time, seen = time.time(), True
+            elif seen and time.time() - stable_time >= self.SETTLE_STABLE:
+                return
+            last = current
+
+    # wait until UI is settled instead of sleeping for fixed `span`
+    # - ready() is polled until True if supported by the app
+    # - otherwise frame() is polled until unchanged for SETTLE_STABLE
+    #   with changed=True, a change is awaited first (e.g. app launching)
+    # - pause(span) if neither is supported or settling is disabled
+    # timeout defaults to span if changed else SETTLE_TIMEOUT
+    # return seconds actually spent
+    def settle(
+        self,
+        span: Optional[float] = None,
+        changed: bool = False,
+        timeout: Optional[float] = None
+    ) -> float:
+        span = Manager.ACTION_INTERVAL if span is None else span
+        start_time = time.time()
+        if not self.settling:
+            Manager.pause(span)
+            return time.time() - start_time
+
+        if timeout is None:
+            timeout = span if changed else max(span, self.SETTLE_TIMEOUT)
+        try:
+            if self.ready() is not None:
+                self.__poll_ready(start_time, timeout)
+            else:
+                self.__poll_frame(start_time, span, changed, timeout)
+        except Exception:
+            Manager.pause(max(0, span - (time.time() - start_time)))
+        return time.time() - start_time
+
     def record_start(self) -> None:
         if self.is_gui:
             self.vlog.warning("record_start() is not implemented.")
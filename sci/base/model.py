@@ -1,21 +1,27 @@
 import sys
+import os
 import json
+import time
 import string
 import base64
 
 from dataclasses import dataclass, field
 from io import BytesIO
 
-from typing import Optional, List, Dict
-from typing import Literal, Any, ClassVar
+from typing import Optional, List, Dict, Tuple
+from typing import Literal, Any, ClassVar, TYPE_CHECKING
 
-import requests
-from requests import Response
 from PIL import Image
 
+if TYPE_CHECKING:
+    from requests import Response
+
 sys.dont_write_bytecode = True
 from . import utils
 from .override import *
+from .transport import Transport, SHARED_TRANSPORT
+from .limiter import Limiter
+from .cassette import Cassette, CassetteMode
 
 ModelType = Literal["openai", "anthropic"]
 RoleType = Literal["system", "user", "assistant"]
@@ -74,21 +80,60 @@ class TextContent(Content):
 
 @dataclass
 class ImageContent(Content):
+    # codec: (PIL format, media type)
+    CODECS: ClassVar[Dict[str, Tuple[str, str]]] = {
+        "png": ("PNG", "image/png"),
+        "jpeg": ("JPEG", "image/jpeg"),
+        "webp": ("WEBP", "image/webp")
+    }
+
     image: Image.Image
+    codec: str = "png"
+    quality: Optional[int] = None
+
+    # encoded once and reused by every dump of payload & history
+    # image is not supposed to be modified after being wrapped
+    encoded: Optional[str] = field(
+        default=None,
+        init=False,
+        repr=False,
+        compare=False
+    )
+
+    def __post_init__(self) -> None:
+        assert self.codec in self.CODECS, f"Unsupported codec: {self.codec}"
+        assert self.quality is None or 0 < self.quality <= 100
+
+    @property
+    def media_type(self) -> str:
+        return self.CODECS[self.codec][1]
+
+    @property
+    def base64(self) -> str:
+        if self.encoded is None:
+            image = self.image
+            if self.codec == "jpeg" and image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+
+            kwargs = {} if self.quality is None else {"quality": self.quality}
+            image.save(buffered:=BytesIO(), format=self.CODECS[self.codec][0], **kwargs)
+            self.encoded = base64.b64encode(buffered.getvalue()).decode()
+        return self.encoded
+
+    # kept for compatibility; follows codec despite the name
+    @property
+    def base64_png(self) -> str:
+        return self.base64
 
     @property
-    def base64_png(self):
-        self.image.save(buffered:=BytesIO(), format="PNG")
-        return base64.b64encode(buffered.getvalue()).decode()
+    def data_url(self) -> str:
+        return f"data:{self.media_type};base64,{self.base64}"
 
     def _openai(self, hide_image: bool = False, **_) -> Dict[str, Any]:
         return {
             "type": "image_url",
             "image_url": {
-                "url": (
-                    Content.PLACEHOLDER if hide_image \
-                        else f"data:image/png;base64,{self.base64_png}"
-                ),
+                "url": Content.PLACEHOLDER if hide_image else self.data_url,
                 "detail": "high"
             }
         }
@@ -98,14 +143,14 @@ class ImageContent(Content):
             "type": "image",
             "source": {
                 "type": "base64",
-                "media_type": "image/png",
-                "data": Content.PLACEHOLDER if hide_image else self.base64_png
+                "media_type": self.media_type,
+                "data": Content.PLACEHOLDER if hide_image else self.base64
             }
         }
 
     def _gui_actor(self, hide_image: bool = False, **_) -> Dict[str, Any]:
         return {
-            "image_base64": f"data:image/png;base64,{self.base64_png}"
+            "image_base64": self.data_url
         }
 
 
@@ -155,6 +200,17 @@ class Model:
     max_tokens: Optional[int] = 1500
     top_p: Optional[float] = 0.9
     temperature: Optional[float] = 0.5
+    transport: Optional[Transport] = None
+    rpm: Optional[int] = None
+    tpm: Optional[int] = None
+    retries: int = 3
+    # record / replay responses under cache_path; see Cassette
+    cache_path: Optional[str] = field(
+        default_factory=lambda: os.environ.get("MODEL_CACHE_PATH")
+    )
+    cache_mode: CassetteMode = field(
+        default_factory=lambda: os.environ.get("MODEL_CACHE_MODE", "record")
+    )
 
     def message(
         self,
@@ -164,13 +220,56 @@ class Model:
         return Message(style=self.model_style, role=role, content=content)
 
     @property
-    def proxies(self) -> Dict:
-        return None if self.proxy is None else {
-            "http": self.proxy,
-            "https": self.proxy
-        }
+    def client(self) -> Transport:
+        return SHARED_TRANSPORT if self.transport is None else self.transport
+
+    # shared by models requesting the same model at the same base_url
+    @property
+    def limiter(self) -> Limiter:
+        return Limiter.get(self.base_url, self.model_name, self.rpm, self.tpm)
 
-    def _request_openai(self, messages: Dict, timeout: int) -> Response:
+    @property
+    def cassette(self) -> Optional[Cassette]:
+        if self.cache_path is None:
+            return None
+        return Cassette.get(self.cache_path, self.cache_mode)
+
+    # (key, replayed response) if payload is found in cassette
+    def _lookup(self, request: Dict[str, Any]) -> Tuple[Optional[str], Optional[Any]]:
+        cassette = self.cassette
+        if cassette is None or cassette.mode == "passthrough":
+            return None, None
+        key = Cassette.key(self.base_url, request)
+        return key, cassette.lookup(key)
+
+    def _record(self, key: Optional[str], response: "Response") -> None:
+        if key is not None:
+            self.cassette.record(key, response)
+
+    # None if response should not be retried, or seconds to back off
+    def _backoff(self, response: "Response", attempt: int) -> Optional[float]:
+        if response.status_code not in Limiter.RETRY_STATUS \
+            or attempt >= self.retries:
+            return None
+
+        retry_after = Limiter.retry_after(response)
+        span = Limiter.backoff(attempt, retry_after)
+        # rate limited: hold all requests to the same model
+        if response.status_code == 429:
+            self.limiter.cool(span)
+        return span
+
+    def _settle(self, response: "Response", tokens: int, queue: float) -> "Response":
+        if hasattr(response, "traffic"):
+            response.traffic.queue = queue
+        used = sum(self.usage(response))
+        if tokens > 0 and used > 0:
+            self.limiter.refund(tokens - used)
+        return response
+
+    # _request_{style}() returns headers, payload and other args of request
+    # the request itself is sent by __call__() or acall() through transport
+    def _request_openai(self, messages: Dict) -> Dict[str, Any]:
         headers = {
             "Content-Type": "application/json",
         }
@@ -190,15 +289,12 @@ class Model:
         if self.top_p is None:       del payload["top_p"]
         if self.temperature is None: del payload["temperature"]
 
-        return requests.post(
-            self.base_url,
-            headers=headers,
-            proxies=self.proxies,
-            json=payload,
-            timeout=timeout
-        )
+        return {
+            "headers": headers,
+            "json": payload
+        }
 
-    def _request_anthropic(self, messages: Dict, timeout: int) -> Response:
+    def _request_anthropic(self, messages: Dict) -> Dict[str, Any]:
         assert self.api_key is not None
         assert self.version is not None
         headers = {
@@ -215,15 +311,12 @@ class Model:
             "top_p": self.top_p
         }
 
-        return requests.post(
-            self.base_url,
-            headers=headers,
-            proxies=self.proxies,
-            json=payload,
-            timeout=timeout
-        )
+        return {
+            "headers": headers,
+            "json": payload
+        }
 
-    def _request_gui_actor(self, messages: Dict, timeout: int) -> Response:
+    def _request_gui_actor(self, messages: Dict) -> Dict[str, Any]:
         content = messages[1]["content"]
         index = 0 if content[0]["type"] == "text" else 1
         payload = {
@@ -232,19 +325,59 @@ class Model:
             "model_name_or_path": self.model_name
         }
 
-        return requests.post(
-            self.base_url,
-            proxies=self.proxies,
-            json=payload,
-            verify=False,
-            timeout=timeout
-        )
+        return {
+            "json": payload,
+            "verify": False
+        }
 
-    def __call__(self, messages: Dict, timeout: int) -> Response:
-        return getattr(self, f"_request_{self.model_style}")(messages, timeout)
+    # tokens: estimated tokens of request, counted against tpm only once
+    # 429 and 5xx are retried with backoff for at most `retries` times
+    def __call__(self, messages: Dict, timeout: int, tokens: int = 0) -> "Response":
+        request = getattr(self, f"_request_{self.model_style}")(messages)
+        key, replayed = self._lookup(request)
+        if replayed is not None:
+            return replayed
+
+        queue, attempt = 0.0, 0
+        while True:
+            queue += self.limiter.acquire(0 if attempt > 0 else tokens)
+            response = self.client.post(
+                self.base_url,
+                timeout=timeout,
+                proxy=self.proxy,
+                **request
+            )
+            if (span := self._backoff(response, attempt)) is None:
+                self._record(key, response)
+                return self._settle(response, tokens, queue)
+            time.sleep(span)
+            queue, attempt = queue + span, attempt + 1
+
+    # responses of httpx share json() and text with those of requests
+    async def acall(self, messages: Dict, timeout: int, tokens: int = 0) -> "Response":
+        import asyncio
+        request = getattr(self, f"_request_{self.model_style}")(messages)
+        key, replayed = self._lookup(request)
+        if replayed is not None:
+            return replayed
+
+        queue, attempt = 0.0, 0
+        while True:
+            queue += await self.limiter.aacquire(0 if attempt > 0 else tokens)
+            response = await self.client.apost(
+                self.base_url,
+                timeout=timeout,
+                proxy=self.proxy,
+                **request
+            )
+            if (span := self._backoff(response, attempt)) is None:
+                self._record(key, response)
+                return self._settle(response, tokens, queue)
+            await asyncio.sleep(span)
+            queue, attempt = queue + span, attempt + 1
 
     @staticmethod
-    def _access_openai(response: Response) -> Message:
+    def _access_openai(response: "Response") -> Message:
         message = response.json()["choices"][0]["message"]
         return Message(
             style="openai",
@@ -253,7 +386,7 @@ class Model:
         )
 
     @staticmethod
-    def _access_anthropic(response: Response) -> Message:
+    def _access_anthropic(response: "Response") -> Message:
         message = response.json()
         return Message(
             style="anthropic",
@@ -262,7 +395,7 @@ class Model:
         )
 
     @staticmethod
-    def _access_gui_actor(response: Response) -> Message:
+    def _access_gui_actor(response: "Response") -> Message:
         message = response.json()
         return Message(
             style="gui_actor",
@@ -271,7 +404,23 @@ class Model:
         )
 
     @utils.error_factory(None)
-    def access(self, response: Response, context_window: int) -> Message:
+    def access(self, response: "Response", context_window: int) -> Message:
         message = getattr(Model, f"_access_{self.model_style}")(response)
         message.context_window = context_window
         return message
+
+    # _usage_{style}() returns (prompt_tokens, completion_tokens)
+    @staticmethod
+    def _usage_openai(response: "Response") -> Tuple[int, int]:
+        usage = response.json()["usage"]
+        return usage["prompt_tokens"], usage["completion_tokens"]
+
+    @staticmethod
+    def _usage_anthropic(response: "Response") -> Tuple[int, int]:
+        usage = response.json()["usage"]
+        return usage["input_tokens"], usage["output_tokens"]
+
+    # (0, 0) if usage is not reported by the style
+    @utils.error_factory((0, 0))
+    def usage(self, response: "Response") -> Tuple[int, int]:
+        return getattr(Model, f"_usage_{self.model_style}")(response)
@@ -1,5 +1,6 @@
 import sys
 import json
+import math
 import inspect
 
 sys.dont_write_bytecode = True
@@ -2,17 +2,22 @@ import sys
 import os
 import re
 import json
+import time
 import traceback
 
-from typing import List, Tuple, Set, Union, Optional
+from concurrent.futures import ThreadPoolExecutor
+
+from typing import List, Tuple, Set, Dict, Union, Optional
 from typing import Any, Iterable, Callable, NoReturn
 
+from PIL import Image
+
 sys.dont_write_bytecode = True
 from .agent import Primitive
 from .community import Community
 from .manager import OBS, Manager
 from .log import Log, VirtualLog
-from .utils import TypeSort, relative_py
+from .utils import TypeSort, relative_py, error_factory
 from . import init
 
 # base class for all tasks
@@ -27,6 +32,10 @@ from . import init
 class Task:
     CONFIG_RETRY = 5
     ACTION_INTERVAL = 1
+    OBSERVE_RETRY = 2
+    # confirm observations by another screenshot if frame() is not supported
+    # which doubles latency of observing, thus disabled by default
+    OBSERVE_CONFIRM = False
     EARLY_STOP = "stop"
 
     class PlannedNotImplemented(Exception):
@@ -48,7 +57,8 @@ class Task:
         self.path = config_path
 
         self.name = os.path.split(self.path)[1].split(".")[0]
-        self.config = json.load(open(self.path, mode="r", encoding="utf-8"))
+        with open(self.path, mode="r", encoding="utf-8") as readable:
+            self.config = json.load(readable)
 
         assert manager is None or isinstance(manager, Manager)
         assert community is None or isinstance(community, Community)
@@ -87,6 +97,22 @@ class Task:
 
         self.vlog = VirtualLog()
 
+        # outcome of last run for RunIndex
+        self.stop_type: Optional[str] = None
+        self.steps_used = 0
+        # seconds of observe, execute and settle of each step
+        # saved: seconds saved by Manager.settle() than fixed pauses
+        self.timings: List[Dict[str, float]] = []
+        self.init_saved = 0.0
+
+    @property
+    def usage(self) -> Dict[str, int]:
+        usage = {}
+        for _, agent in self.community:
+            for key, value in agent.usage.items():
+                usage[key] = usage.get(key, 0) + value
+        return usage
+
     @property
     def available(self) -> bool:
         manager = getattr(self, "manager", None)
@@ -212,7 +238,8 @@ class Task:
                 kwargs["manager"] = self.manager
 
             result = handler(**kwargs)
-            Manager.pause(wait)
+            if wait > 0:
+                self.init_saved += wait - self.manager.settle(wait, changed=True)
             return result
 
         # try `Task.CONFIG_RETRY` times
@@ -228,7 +255,7 @@ class Task:
             # if error occurred / do not return True
             # then stop init and retry in next iteration
             for init_item in self.initialize:
-                Manager.pause()
+                self.init_saved += Manager.ACTION_INTERVAL - self.manager.settle()
                 succeed = False
                 try:
                     succeed = func(**init_item)
@@ -250,11 +277,79 @@ class Task:
                 continue
         return False
 
+    # whether UI is unchanged while observations are captured
+    # - low-res frames before and after capture are compared if supported
+    # - otherwise another screenshot is compared only if OBSERVE_CONFIRM
+    def __stable(
+        self,
+        before: Optional[Image.Image],
+        observation: Dict[str, Any],
+        latency: Dict[str, float]
+    ) -> bool:
+        start_time = time.time()
+        try:
+            if before is not None:
+                after = self.__frame()
+                return after is None or not Manager._changed(before, after)
+            if not Task.OBSERVE_CONFIRM:
+                return True
+            screenshot = self.manager.screenshot()
+            return screenshot.size == observation[OBS.screenshot].size \
+                and screenshot.tobytes() == observation[OBS.screenshot].tobytes()
+        finally:
+            latency["confirm"] = time.time() - start_time
+
+    @error_factory(None)
+    def __frame(self) -> Optional[Image.Image]:
+        return self.manager.frame()
+
+    # try Manager.observe() for a single round-trip first
+    # otherwise gather observations concurrently
+    # returning latency of each in seconds
+    # (observations of a single round-trip share its latency)
+    # consistency guard: if screenshot is one of observations,
+    # observations are captured again when UI changes meanwhile,
+    # at most `Task.OBSERVE_RETRY` times
+    def _observe(self) -> Tuple[Dict[str, Any], Dict[str, float]]:
+        obs_types = sorted(self.obs_types)
+
+        def capture(obs_type: str) -> Tuple[Any, float]:
+            start_time = time.time()
+            return getattr(self.manager, obs_type)(), time.time() - start_time
+
+        def gather(executor: ThreadPoolExecutor) -> Tuple[Dict[str, Any], Dict[str, float]]:
+            start_time = time.time()
+            observation = self.manager.observe(obs_types)
+            if observation is not None:
+                span = time.time() - start_time
+                return observation, {obs_type: span for obs_type in observation}
+
+            captured = dict(zip(obs_types, executor.map(capture, obs_types)))
+            observation = {key: value for key, (value, _) in captured.items()}
+            latency = {key: span for key, (_, span) in captured.items()}
+            return observation, latency
+
+        with ThreadPoolExecutor(max_workers=len(obs_types) + 1) as executor:
+            for retry in range(Task.OBSERVE_RETRY + 1):
+                guarded = OBS.screenshot in obs_types \
+                    and len(obs_types) > 1 \
+                    and retry < Task.OBSERVE_RETRY
+                # frame before capture is taken alongside observations
+                before = executor.submit(self.__frame) if guarded else None
+                observation, latency = gather(executor)
+
+                if not guarded or self.__stable(before.result(), observation, latency):
+                    break
+                self.vlog.warning("UI changed when capturing observations; retrying.")
+        return observation, latency
+
     def _step(self, step_index: int) -> bool:
-        observation = {
-            obs_type: getattr(self.manager, obs_type)()
-            for obs_type in self.obs_types
-        }
+        timing = {"observe": 0.0, "execute": 0.0, "settle": 0.0, "saved": 0.0}
+        self.timings.append(timing)
+
+        start_time = time.time()
+        observation, latency = self._observe()
+        timing["observe"] = time.time() - start_time
 
         # special cases: SoM -> SoM + A11y Tree
         nested_tags = None
@@ -280,15 +375,22 @@ class Task:
             obs=observation,
             codes=response_codes,
             community=self.community,
-            is_textual=OBS.textual in observation
+            is_textual=OBS.textual in observation,
+            latency=latency
         )
 
         results = []
         for code_like in response_codes:
             if self.relative:
                 code_like.push_prefix(relative_py, back=False)
-            results.append(code_like(self.manager, self.primitives))
-            Manager.pause()
+            start_time = time.time()
+            try:
+                results.append(code_like(self.manager, self.primitives))
+            finally:
+                timing["execute"] += time.time() - start_time
+            span = self.manager.settle()
+            timing["settle"] += span
+            timing["saved"] += Manager.ACTION_INTERVAL - span
 
         # Manager.__call__() return True/None if success/undecidable
         # if all code blocks fail, one liquidation is counted
@@ -310,6 +412,7 @@ class Task:
             while step_index < self.steps:
                 invalid = self._step(step_index)
                 step_index += 1
+                self.steps_used = step_index
                 liquid += 1 if invalid else 0
                 if liquid >= self.penalty[0]:
                     liquid = 0
@@ -354,6 +457,8 @@ class Task:
             return True
 
     def __call(self) -> bool:
+        self.stop_type, self.steps_used, self.timings = None, 0, []
+        self.init_saved = 0.0
         self.vlog.info("Starting initialization.")
         assert self.init(), "Fail to initialize the task"
         if self.debug:
@@ -374,6 +479,13 @@ class Task:
         else:
             self.vlog.info("Starting prediction.")
             stop_type, stop_args = self.predict()
+        if self.manager.settling:
+            saved = sum([timing["saved"] for timing in self.timings])
+            self.vlog.info(
+                f"Settle saved {self.init_saved:.1f}s in initialization "
+                f"and {saved:.1f}s in {len(self.timings)} steps."
+            )
+        self.stop_type = stop_type.__name__
         self.vlog.info(f"Starting evaluation with stop type of {stop_type.__name__}.")
 
         return self.eval(stop_type, stop_args)
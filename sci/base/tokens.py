@@ -0,0 +1,115 @@
+import sys
+import math
+import functools
+
+from typing import Optional, List, Dict, Tuple, TYPE_CHECKING
+
+from PIL import Image
+
+sys.dont_write_bytecode = True
+from .model import Content, TextContent, ImageContent, Message, ModelType
+from .prompt import smart_resize, IMAGE_FACTOR
+
+if TYPE_CHECKING:
+    import tiktoken
+
+
+@functools.lru_cache(maxsize=None)
+def encoder(model_name: str = "gpt-4") -> "tiktoken.Encoding":
+    import tiktoken
+    return tiktoken.encoding_for_model(model_name)
+
+# encoder for estimation only: never raises
+# - models unknown to tiktoken are approximated by FALLBACK_ENCODING
+# - None if no encoding can be loaded (e.g. offline)
+@functools.lru_cache(maxsize=None)
+def estimate_encoder(model_name: str) -> Optional["tiktoken.Encoding"]:
+    try:
+        return encoder(model_name)
+    except Exception: ...
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(Estimator.FALLBACK_ENCODING)
+    except Exception:
+        return None
+
+
+# estimate tokens of payload before it is sent
+# - text: tiktoken, or BYTES_PER_TOKEN if tiktoken is not available
+# - image: by _image_{style}(), patches of smart_resize() by default
+# estimations of messages are cached as messages are never modified
+class Estimator:
+    FALLBACK_ENCODING = "o200k_base"
+    BYTES_PER_TOKEN = 4
+    MESSAGE_OVERHEAD = 4
+    PAYLOAD_OVERHEAD = 3
+
+    # anthropic: images are scaled into limits and cost (w * h) / 750
+    ANTHROPIC_LONG_EDGE = 1568
+    ANTHROPIC_MAX_PIXELS = 1150000
+    ANTHROPIC_PIXELS_PER_TOKEN = 750
+
+    def __init__(self, model_style: ModelType, model_name: str) -> None:
+        self.model_style = model_style
+        self.model_name = model_name
+        self.cache: Dict[Tuple[int, bool], Tuple[Message, int]] = {}
+
+    def clear(self) -> None:
+        self.cache.clear()
+
+    def text(self, text: str) -> int:
+        enc = estimate_encoder(self.model_name)
+        if enc is None:
+            return math.ceil(len(text.encode("utf-8")) / self.BYTES_PER_TOKEN)
+        return len(enc.encode(text, disallowed_special=()))
+
+    @staticmethod
+    def _image_patch(width: int, height: int) -> int:
+        try:
+            height, width = smart_resize(height, width)
+        except ValueError: ...
+        # one more for each of vision start & end tokens
+        return (height // IMAGE_FACTOR) * (width // IMAGE_FACTOR) + 2
+
+    @staticmethod
+    def _image_anthropic(width: int, height: int) -> int:
+        scale = min(
+            1.0,
+            Estimator.ANTHROPIC_LONG_EDGE / max(width, height),
+            math.sqrt(Estimator.ANTHROPIC_MAX_PIXELS / (width * height))
+        )
+        width, height = int(width * scale), int(height * scale)
+        return math.ceil(width * height / Estimator.ANTHROPIC_PIXELS_PER_TOKEN)
+
+    def image(self, image: Image.Image) -> int:
+        handler = getattr(self, f"_image_{self.model_style}", Estimator._image_patch)
+        return handler(image.width, image.height)
+
+    def content(self, content: Content, hide_text: bool, use_format: bool) -> int:
+        if isinstance(content, ImageContent):
+            return self.image(content.image)
+        if isinstance(content, TextContent):
+            return self.text(content._asdict(
+                hide_text=hide_text,
+                use_format=use_format
+            )["text"])
+        return 0
+
+    def message(self, message: Message, hide_text: bool = False) -> int:
+        key = (id(message), hide_text)
+        if key in self.cache and self.cache[key][0] is message:
+            return self.cache[key][1]
+
+        tokens = self.MESSAGE_OVERHEAD + sum([
+            self.content(content, hide_text, message.role == "user")
+            for content in message.content
+        ])
+        self.cache[key] = (message, tokens)
+        return tokens
+
+    # hide_text: whether texts of messages except for the last one are hidden
+    def payload(self, messages: List[Message], hide_text: bool = False) -> int:
+        return self.PAYLOAD_OVERHEAD + sum([
+            self.message(message, hide_text and index + 1 < len(messages))
+            for index, message in enumerate(messages)
+        ])
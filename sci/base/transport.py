@@ -0,0 +1,188 @@
+import sys
+import json
+import time
+import threading
+
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+from typing import Optional, Dict, Tuple, Any, TYPE_CHECKING
+
+# requests and asyncio are imported on first request
+if TYPE_CHECKING:
+    import requests
+    from requests import Response
+
+sys.dont_write_bytecode = True
+
+
+@dataclass
+class Traffic:
+    latency: float
+    sent: int
+    received: int
+    # time held by Limiter and backoff before the final attempt
+    queue: float = 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"queue={self.queue:.2f}s, "
+            f"latency={self.latency:.2f}s, "
+            f"sent={self.sent}B, "
+            f"received={self.received}B"
+        )
+
+
+# connections are pooled by origin (scheme://host:port) of base_url
+# - sync: one keep-alive requests.Session per origin
+# - async: one httpx.AsyncClient per origin and event loop
+#   HTTP/2 is used if h2 is installed (pip install httpx[http2])
+# all models share SHARED_TRANSPORT unless one is assigned explicitly
+class Transport:
+    POOL_SIZE = 16
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.sessions: Dict[str, "requests.Session"] = {}
+        self.clients: Dict[Tuple[int, str, Optional[str], bool], Any] = {}
+
+    # transport is supposed to be shared instead of being copied
+    def __deepcopy__(self, memo: Dict[int, Any]) -> "Transport":
+        return self
+
+    @staticmethod
+    def origin(url: str) -> str:
+        splits = urlsplit(url)
+        return f"{splits.scheme}://{splits.netloc}"
+
+    @staticmethod
+    def encode(
+        payload: Dict[str, Any],
+        headers: Optional[Dict[str, str]]
+    ) -> Tuple[bytes, Dict[str, str]]:
+        headers = {} if headers is None else headers.copy()
+        if all([key.lower() != "content-type" for key in headers]):
+            headers["Content-Type"] = "application/json"
+        return json.dumps(payload).encode("utf-8"), headers
+
+    def session(self, url: str) -> "requests.Session":
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        origin = Transport.origin(url)
+        with self.lock:
+            if origin not in self.sessions:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_maxsize=self.POOL_SIZE)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self.sessions[origin] = session
+            return self.sessions[origin]
+
+    def post(
+        self,
+        url: str,
+        json: Dict[str, Any],
+        timeout: int,
+        headers: Optional[Dict[str, str]] = None,
+        proxy: Optional[str] = None,
+        verify: bool = True
+    ) -> "Response":
+        data, headers = Transport.encode(json, headers)
+        proxies = None if proxy is None else {
+            "http": proxy,
+            "https": proxy
+        }
+
+        start_time = time.time()
+        response = self.session(url).post(
+            url,
+            data=data,
+            headers=headers,
+            proxies=proxies,
+            verify=verify,
+            timeout=timeout
+        )
+        response.traffic = Traffic(
+            latency=time.time() - start_time,
+            sent=len(data),
+            received=len(response.content)
+        )
+        return response
+
+    def client(self, url: str, proxy: Optional[str], verify: bool) -> Any:
+        import asyncio
+        import httpx
+
+        loop = asyncio.get_running_loop()
+        key = (id(loop), Transport.origin(url), proxy, verify)
+        with self.lock:
+            if key not in self.clients:
+                limits = httpx.Limits(max_connections=self.POOL_SIZE)
+                try:
+                    client = httpx.AsyncClient(
+                        http2=True,
+                        proxy=proxy,
+                        verify=verify,
+                        limits=limits
+                    )
+                except ImportError:
+                    client = httpx.AsyncClient(
+                        proxy=proxy,
+                        verify=verify,
+                        limits=limits
+                    )
+                self.clients[key] = client
+            return self.clients[key]
+
+    # fall back to pooled sessions in threads if httpx is not installed
+    async def apost(
+        self,
+        url: str,
+        json: Dict[str, Any],
+        timeout: int,
+        headers: Optional[Dict[str, str]] = None,
+        proxy: Optional[str] = None,
+        verify: bool = True
+    ) -> Any:
+        import asyncio
+        try:
+            client = self.client(url, proxy, verify)
+        except ImportError:
+            return await asyncio.to_thread(
+                self.post,
+                url,
+                json,
+                timeout,
+                headers=headers,
+                proxy=proxy,
+                verify=verify
+            )
+
+        data, headers = Transport.encode(json, headers)
+        start_time = time.time()
+        response = await client.post(
+            url,
+            content=data,
+            headers=headers,
+            timeout=timeout
+        )
+        response.traffic = Traffic(
+            latency=time.time() - start_time,
+            sent=len(data),
+            received=len(response.content)
+        )
+        return response
+
+    # close async clients created in current event loop
+    async def aclose(self) -> None:
+        import asyncio
+        loop_id = id(asyncio.get_running_loop())
+        with self.lock:
+            keys = [key for key in self.clients if key[0] == loop_id]
+            clients = [self.clients.pop(key) for key in keys]
+        for client in clients:
+            await client.aclose()
+
+
+SHARED_TRANSPORT = Transport()
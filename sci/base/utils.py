@@ -1,7 +1,6 @@
 import sys
 import os
 import inspect
-import multiprocessing
 import traceback
 
 from enum import Enum
@@ -105,6 +104,7 @@ def block(timeout, func, *args, **kwargs):
         except Exception as e:
             queue.put(("error", traceback.format_exc()))
 
+    import multiprocessing
     obj = {}
     queue = multiprocessing.Queue()
     proc = multiprocessing.Process(
@@ -3,3 +3,4 @@ import sys
 sys.dont_write_bytecode = True
 from .vmanager import VManager
 from .vtask import VTask
+from .vpool import VPool
@@ -1,13 +1,20 @@
 # extracted from OSWorld/mm_agents
 # ref: https://github.com/xlang-ai/OSWorld/blob/main/mm_agents/agent.py
 
+import math
+import functools
 import xml.etree.ElementTree as ET
 from io import BytesIO
-from typing import Tuple, List
+from typing import Tuple, List, Dict, Optional, TYPE_CHECKING
 
-import tiktoken
 from PIL import Image, ImageDraw, ImageFont
 
+from ..base.tokens import encoder
+
+# numpy is imported on first use to keep `import sci` light
+if TYPE_CHECKING:
+    import numpy as np
+
 attributes_ns_ubuntu = "https://accessibility.windows.example.org/ns/attributes"
 attributes_ns_windows = "https://accessibility.windows.example.org/ns/attributes"
 state_ns_ubuntu = "https://accessibility.ubuntu.example.org/ns/state"
@@ -83,8 +90,8 @@ def judge_node(node: ET, platform="ubuntu", check_image=False) -> bool:
                 and node.get("image", "false") == "true"
         )
 
-    coordinates: Tuple[int, int] = eval(node.get("{{{:}}}screencoord".format(_component_ns), "(-1, -1)"))
-    sizes: Tuple[int, int] = eval(node.get("{{{:}}}size".format(_component_ns), "(-1, -1)"))
+    coordinates = parse_pair(node.get("{{{:}}}screencoord".format(_component_ns), "(-1, -1)"))
+    sizes = parse_pair(node.get("{{{:}}}size".format(_component_ns), "(-1, -1)"))
     keeps = keeps and coordinates[0] >= 0 and coordinates[1] >= 0 and sizes[0] > 0 and sizes[1] > 0
     return keeps
 
@@ -95,13 +102,78 @@ def filter_nodes(root: ET, platform: str ="ubuntu", check_image: bool = False) -
             filtered_nodes.append(node)
     return filtered_nodes
 
+def node_text(node: ET, value_ns: str) -> str:
+    if node.text:
+        return node.text if '"' not in node.text \
+            else '"{:}"'.format(node.text.replace('"', '""'))
+    elif node.get("{{{:}}}class".format(class_ns_windows), "").endswith("EditWrapper") \
+            and node.get("{{{:}}}value".format(value_ns)):
+        text = node.get("{{{:}}}value".format(value_ns), "")
+        return text if '"' not in text else '"{:}"'.format(text.replace('"', '""'))
+    else:
+        return '""'
+
+# whether image.crop(box) has only one color for every box (x0, y0, x1, y1)
+# pixels out of image are regarded as 0, the same as padding of crop()
+# a region is uniform iff no adjacent pixels differ inside it,
+# which is answered for all boxes at once by integral images of differences
+def uniform_boxes(array: "np.ndarray", boxes: "np.ndarray") -> "np.ndarray":
+    import numpy as np
+    if array.ndim == 2:
+        array = array[..., None]
+    height, width = array.shape[:2]
+
+    # one integer per pixel so that pixels are compared at once
+    if array.dtype.kind == "u" and array.dtype.itemsize * array.shape[2] <= 8:
+        packed = np.zeros((height, width), dtype=np.uint64)
+        for channel in range(array.shape[2]):
+            packed = (packed << np.uint64(array.dtype.itemsize * 8)) | array[..., channel]
+    else:
+        packed = np.unique(array.reshape(-1, array.shape[2]), axis=0, return_inverse=True)[1]
+        packed = packed.reshape(height, width) + 1
+        packed[(array == 0).all(axis=2)] = 0
+
+    def integral(diff: np.ndarray) -> np.ndarray:
+        table = np.zeros((diff.shape[0] + 1, diff.shape[1] + 1), dtype=np.int32)
+        np.cumsum(np.cumsum(diff, axis=0, dtype=np.int32), axis=1, out=table[1:, 1:])
+        return table
+
+    def area(table: np.ndarray, x0, y0, x1, y1) -> np.ndarray:
+        x1, y1 = np.maximum(x1, x0), np.maximum(y1, y0)
+        return table[y1, x1] - table[y0, x1] - table[y1, x0] + table[y0, x0]
+
+    diff_x = integral(packed[:, 1:] != packed[:, :-1])
+    diff_y = integral(packed[1:] != packed[:-1])
+
+    x0 = np.clip(boxes[:, 0], 0, width)
+    y0 = np.clip(boxes[:, 1], 0, height)
+    x1 = np.clip(boxes[:, 2], 0, width)
+    y1 = np.clip(boxes[:, 3], 0, height)
+    empty = (x1 <= x0) | (y1 <= y0)
+
+    uniform = (area(diff_x, np.minimum(x0, width - 1), y0, np.maximum(x1 - 1, 0), y1) == 0) \
+        & (area(diff_y, x0, np.minimum(y0, height - 1), x1, np.maximum(y1 - 1, 0)) == 0)
+
+    padded = (boxes[:, 0] < 0) | (boxes[:, 1] < 0) | (boxes[:, 2] > width) | (boxes[:, 3] > height)
+    corner = packed[np.minimum(y0, height - 1), np.minimum(x0, width - 1)]
+    return empty | uniform & (~padded | (corner == 0))
+
+def uniform_crop(image: Image.Image, box: Tuple[int, int, int, int]) -> bool:
+    import numpy as np
+    array = np.asarray(image.crop(box))
+    array = array.reshape(-1, array.shape[2] if array.ndim == 3 else 1)
+    return bool((array == array[0]).all())
+
+# uniformity of all boxes is computed in advance on the pristine screenshot
+# since later boxes are tested after earlier ones are drawn,
+# boxes overlapping drawn areas are tested again on the current image;
+# drawing itself stays sequential as labels may overlap each other
 def draw_bounding_boxes(nodes: List, image_file_content: bytes, down_sampling_ratio=1.0, platform="ubuntu"):
+    import numpy as np
     if platform == "ubuntu":
-        _state_ns = state_ns_ubuntu
         _component_ns = component_ns_ubuntu
         _value_ns = value_ns_ubuntu
     elif platform == "windows":
-        _state_ns = state_ns_windows
         _component_ns = component_ns_windows
         _value_ns = value_ns_windows
     else:
@@ -121,67 +193,85 @@ def draw_bounding_boxes(nodes: List, image_file_content: bytes, down_sampling_ra
     except IOError:
         font = ImageFont.load_default()
 
-    index = 1
-
+    # (node, original coords & size, box)
+    candidates = []
     for _node in nodes:
         coords_str = _node.attrib.get('{{{:}}}screencoord'.format(_component_ns))
         size_str = _node.attrib.get('{{{:}}}size'.format(_component_ns))
+        if not (coords_str and size_str):
+            continue
 
-        if coords_str and size_str:
-            try:
-                coords = tuple(map(int, coords_str.strip('()').split(', ')))
-                size = tuple(map(int, size_str.strip('()').split(', ')))
+        try:
+            original_coords = tuple(map(int, coords_str.strip('()').split(', ')))
+            original_size = tuple(map(int, size_str.strip('()').split(', ')))
+            coords, size = original_coords, original_size
 
-                import copy
-                original_coords = copy.deepcopy(coords)
-                original_size = copy.deepcopy(size)
+            if float(down_sampling_ratio) != 1.0:
+                coords = tuple(int(coord * down_sampling_ratio) for coord in coords)
+                size = tuple(int(s * down_sampling_ratio) for s in size)
 
-                if float(down_sampling_ratio) != 1.0:
-                    coords = tuple(int(coord * down_sampling_ratio) for coord in coords)
-                    size = tuple(int(s * down_sampling_ratio) for s in size)
+            # other cases where ValueError is raised in the reference implementation
+            if len(coords) != 2 or len(size) != 2 or size[0] <= 0 or size[1] <= 0:
+                continue
+        except ValueError:
+            continue
 
-                if size[0] <= 0 or size[1] <= 0:
-                    raise ValueError(f"Size must be positive, got: {size}")
+        mark = [*original_coords, *original_size]
+        box = (coords[0], coords[1], coords[0] + size[0], coords[1] + size[1])
+        candidates.append((_node, mark, box))
 
-                bottom_right = (coords[0] + size[0], coords[1] + size[1])
+    boxes = np.array([box for _, _, box in candidates], dtype=np.int64).reshape(-1, 4)
+    uniforms = uniform_boxes(np.asarray(image), boxes)
 
-                if bottom_right[0] < coords[0] or bottom_right[1] < coords[1]:
-                    raise ValueError(f"Invalid coordinates or size, coords: {coords}, size: {size}")
-
-                cropped_image = image.crop((*coords, *bottom_right))
-                if len(set(list(cropped_image.getdata()))) == 1:
-                    continue
-
-                draw.rectangle([coords, bottom_right], outline="red", width=1)
-
-                text_position = (coords[0], bottom_right[1])
-                text_bbox: Tuple[int, int, int, int] = draw.textbbox(text_position, str(index), font=font, anchor="lb")
-
-                draw.rectangle(text_bbox, fill='black')
-                draw.text(text_position, str(index), font=font, anchor="lb", fill="white")
-
-                marks.append([original_coords[0], original_coords[1], original_size[0], original_size[1]])
-                drew_nodes.append(_node)
-
-                if _node.text:
-                    node_text = (_node.text if '"' not in _node.text \
-                                     else '"{:}"'.format(_node.text.replace('"', '""'))
-                                 )
-                elif _node.get("{{{:}}}class".format(class_ns_windows), "").endswith("EditWrapper") \
-                        and _node.get("{{{:}}}value".format(_value_ns)):
-                    node_text = _node.get("{{{:}}}value".format(_value_ns), "")
-                    node_text = (node_text if '"' not in node_text \
-                                     else '"{:}"'.format(node_text.replace('"', '""'))
-                                 )
-                else:
-                    node_text = '""'
-                text_information: str = "{:d}\t{:}\t{:}\t{:}".format(index, _node.tag, _node.get("name", ""), node_text)
-                text_informations.append(text_information)
+    # drawn areas, inclusive and with a margin of 1px
+    dirty = np.empty((len(candidates) * 5, 4), dtype=np.int64)
+    dirty_count = 0
 
-                index += 1
-
-            except ValueError:
-                pass
+    index = 1
+    for (_node, mark, box), uniform in zip(candidates, uniforms):
+        drawn = dirty[:dirty_count]
+        overlapped = (drawn[:, 0] < box[2]) & (drawn[:, 2] >= box[0]) \
+            & (drawn[:, 1] < box[3]) & (drawn[:, 3] >= box[1])
+        if overlapped.any():
+            uniform = uniform_crop(image, box)
+        if uniform:
+            continue
+
+        coords, bottom_right = box[:2], box[2:]
+        draw.rectangle([coords, bottom_right], outline="red", width=1)
+
+        text_position = (coords[0], bottom_right[1])
+        text_bbox: Tuple[int, int, int, int] = draw.textbbox(text_position, str(index), font=font, anchor="lb")
+
+        draw.rectangle(text_bbox, fill='black')
+        draw.text(text_position, str(index), font=font, anchor="lb", fill="white")
+
+        # four edges of the outline and the label
+        left, top, right, bottom = box
+        for rect in (
+            (left, top, right, top),
+            (left, bottom, right, bottom),
+            (left, top, left, bottom),
+            (right, top, right, bottom),
+            text_bbox
+        ):
+            dirty[dirty_count] = (
+                math.floor(rect[0]) - 1,
+                math.floor(rect[1]) - 1,
+                math.ceil(rect[2]) + 1,
+                math.ceil(rect[3]) + 1
+            )
+            dirty_count += 1
+
+        marks.append(mark)
+        drew_nodes.append(_node)
+        text_informations.append("{:d}\t{:}\t{:}\t{:}".format(
+            index,
+            _node.tag,
+            _node.get("name", ""),
+            node_text(_node, _value_ns)
+        ))
+        index += 1
 
     output_image_stream = BytesIO()
     image.save(output_image_stream, format='PNG')
@@ -189,51 +279,196 @@ def draw_bounding_boxes(nodes: List, image_file_content: bytes, down_sampling_ra
 
     return marks, drew_nodes, "\n".join(text_informations), image_content
 
-def linearize(a11y_tree: str, platform: str = "ubuntu"):
+KEEP_PREFIXES = ("document", )
+KEEP_SUFFIXES = (
+    "item",
+    "button",
+    "heading",
+    "label",
+    "scrollbar",
+    "searchbox",
+    "textbox",
+    "link",
+    "tabelement",
+    "textfield",
+    "textarea",
+    "menu"
+)
+KEEP_TAGS = frozenset({
+    "alert",
+    "canvas",
+    "check-box",
+    "combo-box",
+    "entry",
+    "icon",
+    "image",
+    "paragraph",
+    "scroll-bar",
+    "section",
+    "slider",
+    "static",
+    "table-cell",
+    "terminal",
+    "text",
+    "netuiribbontab",
+    "start",
+    "trayclockwclass",
+    "traydummysearchcontrol",
+    "uiimage",
+    "uiproperty",
+    "uiribboncommandbar"
+})
+
+# same as the tag condition in judge_node()
+@functools.lru_cache(maxsize=1024)
+def keep_tag(tag: str) -> bool:
+    return tag.startswith(KEEP_PREFIXES) \
+        or tag.endswith(KEEP_SUFFIXES) \
+        or tag in KEEP_TAGS
+
+# "(x, y)" -> (x, y); malformed pairs are (-1, -1) and thus filtered
+# attributes come from VM and are never evaluated
+def parse_pair(text: str) -> Tuple[float, float]:
+    try:
+        x, y = text.strip().strip("()").split(",")
+        return float(x), float(y)
+    except ValueError:
+        return -1, -1
+
+@functools.lru_cache(maxsize=None)
+def attribute_keys(platform: str) -> Dict[str, object]:
     if platform == "ubuntu":
-        _attributes_ns = attributes_ns_ubuntu
-        _state_ns = state_ns_ubuntu
-        _component_ns = component_ns_ubuntu
-        _value_ns = value_ns_ubuntu
+        attributes_ns, state_ns = attributes_ns_ubuntu, state_ns_ubuntu
+        component_ns, value_ns = component_ns_ubuntu, value_ns_ubuntu
+        visible = ("showing", "visible")
+        class_ns = attributes_ns_ubuntu
     elif platform == "windows":
-        _attributes_ns = attributes_ns_windows
-        _state_ns = state_ns_windows
-        _component_ns = component_ns_windows
-        _value_ns = value_ns_windows
+        attributes_ns, state_ns = attributes_ns_windows, state_ns_windows
+        component_ns, value_ns = component_ns_windows, value_ns_windows
+        visible = ("visible", )
+        class_ns = class_ns_windows
     else:
         raise ValueError("Invalid platform, must be 'ubuntu' or 'windows'")
 
-    filtered_nodes = filter_nodes(ET.fromstring(a11y_tree), platform)
-    linearized_a11y_tree = ["tag\tname\ttext\tclass\tdescription\tposition (top-left x&y)\tsize (w&h)"]
-
-    for node in filtered_nodes:
-        if node.text:
-            text = (node.text if '"' not in node.text else '"{:}"'.format(node.text.replace('"', '""')))
-        elif node.get("{{{:}}}class".format(class_ns_windows), "").endswith("EditWrapper") \
-                and node.get("{{{:}}}value".format(_value_ns)):
-            node_text = node.get("{{{:}}}value".format(_value_ns), "")
-            text = (node_text if '"' not in node_text else '"{:}"'.format(node_text.replace('"', '""')))
-        else:
-            text = '""'
-
-        linearized_a11y_tree.append("{:}\t{:}\t{:}\t{:}\t{:}\t{:}\t{:}".format(
-            node.tag, node.get("name", ""),
-            text,
-            node.get("{{{:}}}class".format(_attributes_ns), "") if platform == "ubuntu" else node.get("{{{:}}}class".format(class_ns_windows), ""),
-            node.get("{{{:}}}description".format(_attributes_ns), ""),
-            node.get('{{{:}}}screencoord'.format(_component_ns), ""),
-            node.get('{{{:}}}size'.format(_component_ns), "")
-        ))
-
-    return "\n".join(linearized_a11y_tree)
+    return {
+        "visible": tuple("{{{:}}}{:}".format(state_ns, key) for key in visible),
+        "enabled": tuple("{{{:}}}{:}".format(state_ns, key) for key in (
+            "enabled",
+            "editable",
+            "expandable",
+            "checkable"
+        )),
+        "screencoord": "{{{:}}}screencoord".format(component_ns),
+        "size": "{{{:}}}size".format(component_ns),
+        "class": "{{{:}}}class".format(class_ns),
+        "class_windows": "{{{:}}}class".format(class_ns_windows),
+        "value": "{{{:}}}value".format(value_ns),
+        "description": "{{{:}}}description".format(attributes_ns)
+    }
+
+# conditions of judge_node(check_image=False) that only depend on attributes
+def keep_attrib(tag: str, attrib: Dict[str, str], keys: Dict[str, object]) -> bool:
+    if not keep_tag(tag):
+        return False
+    if not all(attrib.get(key, "false") == "true" for key in keys["visible"]):
+        return False
+    if not any(attrib.get(key, "false") == "true" for key in keys["enabled"]):
+        return False
+
+    coordinates = parse_pair(attrib.get(keys["screencoord"], "(-1, -1)"))
+    sizes = parse_pair(attrib.get(keys["size"], "(-1, -1)"))
+    return coordinates[0] >= 0 and coordinates[1] >= 0 and sizes[0] > 0 and sizes[1] > 0
+
+def quote(text: str) -> str:
+    return text if '"' not in text else '"{:}"'.format(text.replace('"', '""'))
+
+# streaming linearization of a11y tree
+# same as rows of filter_nodes() but without building the whole tree
+# rows are reserved in pre-order when nodes start
+# and filled when they end, i.e. when their text is available
+def linearize(a11y_tree: str, platform: str = "ubuntu", chunk_size: int = 1 << 16) -> str:
+    keys = attribute_keys(platform)
+    rows: List[Optional[str]] = ["tag\tname\ttext\tclass\tdescription\tposition (top-left x&y)\tsize (w&h)"]
+    pending: Dict[ET.Element, int] = {}
+
+    def consume(parser: ET.XMLPullParser) -> None:
+        for event, node in parser.read_events():
+            if event == "start":
+                if keep_attrib(node.tag, node.attrib, keys):
+                    pending[node] = len(rows)
+                    rows.append(None)
+                continue
+
+            index = pending.pop(node, None)
+            if index is not None and (node.get("name", "") != "" or node.text):
+                if node.text:
+                    text = quote(node.text)
+                elif node.get(keys["class_windows"], "").endswith("EditWrapper") \
+                        and node.get(keys["value"]):
+                    text = quote(node.get(keys["value"], ""))
+                else:
+                    text = '""'
+
+                rows[index] = "{:}\t{:}\t{:}\t{:}\t{:}\t{:}\t{:}".format(
+                    node.tag,
+                    node.get("name", ""),
+                    text,
+                    node.get(keys["class"], ""),
+                    node.get(keys["description"], ""),
+                    node.get(keys["screencoord"], ""),
+                    node.get(keys["size"], "")
+                )
+
+            # text of parent is set before its first child starts
+            node.clear()
+
+    parser = ET.XMLPullParser(events=("start", "end"))
+    for offset in range(0, len(a11y_tree), chunk_size):
+        parser.feed(a11y_tree[offset:offset + chunk_size])
+        consume(parser)
+    parser.close()
+    consume(parser)
+
+    return "\n".join([row for row in rows if row is not None])
+
+# encode row by row and stop as soon as max_tokens is reached
+# the tree is cut on row boundaries, so no partial row will be left
+# returns (text, tokens of text, whether truncated)
+def budget(linearized_a11y_tree: str, max_tokens: int) -> Tuple[str, int, bool]:
+    enc = encoder()
+    rows = linearized_a11y_tree.split("\n")
+
+    # each token takes at least one byte
+    if len(linearized_a11y_tree.encode("utf-8")) <= max_tokens:
+        return linearized_a11y_tree, len(enc.encode(linearized_a11y_tree)), False
+
+    tokens = 0
+    for index, row in enumerate(rows):
+        # one more for the line break
+        count = len(enc.encode(row)) + (index > 0)
+        if tokens + count > max_tokens:
+            return "\n".join(rows[:index] + ["[...]"]) + "\n", tokens, True
+        tokens += count
+    return linearized_a11y_tree, tokens, False
 
 def trim(linearized_a11y_tree, max_tokens):
-    enc = tiktoken.encoding_for_model("gpt-4")
-    tokens = enc.encode(linearized_a11y_tree)
-    if len(tokens) > max_tokens:
-        linearized_a11y_tree = enc.decode(tokens[:max_tokens])
-        linearized_a11y_tree += "[...]\n"
-    return linearized_a11y_tree
+    return budget(linearized_a11y_tree, max_tokens)[0]
+
+# parts of multipart response from /observe: {name: (content type, body)}
+def parse_multipart(content_type: str, body: bytes) -> Dict[str, Tuple[str, bytes]]:
+    boundary = content_type.split("boundary=", maxsplit=1)[1].split(";")[0].strip('"')
+    parts = {}
+    for chunk in body.split(b"--" + boundary.encode("utf-8"))[1:]:
+        if chunk.startswith(b"--"):
+            break
+        head, content = chunk[2:].split(b"\r\n\r\n", maxsplit=1)
+        headers = dict([
+            [item.strip() for item in line.split(":", maxsplit=1)]
+            for line in head.decode("utf-8").split("\r\n")
+        ])
+        name = headers["Content-Disposition"].split('name="', maxsplit=1)[1].split('"')[0]
+        parts[name] = (headers["Content-Type"], content[:-2])
+    return parts
 
 def tag_screenshot(screenshot: bytes, a11y_tree: str, platform: str = "ubuntu"):
     nodes = filter_nodes(ET.fromstring(a11y_tree), platform=platform, check_image=True)
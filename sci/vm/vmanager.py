@@ -2,28 +2,34 @@ import sys
 import os
 import re
 import json
+import base64
 import zipfile
 import subprocess
 import threading
 import atexit
 
 from io import BytesIO
-from typing import Optional, Union, Iterable, Tuple, Dict, Any
-from typing import Self, NoReturn, Callable, TypedDict, NotRequired
+from typing import Optional, Union, Iterable, Tuple, Dict, Any, List
+from typing import Self, NoReturn, Callable, TypedDict, NotRequired, TYPE_CHECKING
 
-import requests
 from PIL import Image
-from filelock import FileLock
+
+if TYPE_CHECKING:
+    import requests
 
 sys.dont_write_bytecode = True
-from ..base import Manager
+from ..base import Manager, OBS
 from ..base import GLOBAL_VLOG
+from ..base import ImageContent
 from ..base.utils import error_factory
 
 from .. import Prompts
 from . import utils
 
 ENVS = {}
+# env key -> name of snapshot that env is reverted to and not used since
+READY: Dict[str, str] = {}
+FRAMES: Dict[str, Tuple[int, Image.Image]] = {}
 VMXS = "/tmp/sci_board.cfg"
 LOCK = "/tmp/sci_board.lock"
 
@@ -51,6 +57,9 @@ class VManager(Manager):
 
     INIT_NAME = "sci_bench"
     SERVER_PORT = 5000
+    RESET_COMMAND = "/bin/bash /home/user/server/reset.sh"
+    # width of frames polled by settle()
+    FRAME_WIDTH = 160
 
     def __init__(
         self,
@@ -59,6 +68,12 @@ class VManager(Manager):
         headless: bool = False,
         a11y_tree_limit: int = 10240,
         parallel: bool = False,
+        screenshot_size: Optional[Union[float, Tuple[int, int]]] = None,
+        screenshot_format: Optional[str] = None,
+        screenshot_quality: Optional[int] = None,
+        screenshot_delta: bool = False,
+        a11y_apps: Optional[List[str]] = None,
+        clone: bool = False,
         **kwargs
     ) -> None:
         super().__init__(version)
@@ -70,6 +85,11 @@ class VManager(Manager):
         assert isinstance(parallel, bool)
         self.parallel = parallel
 
+        # VM already claimed in this process is cloned instead of rejected
+        # used by workers of Tester, which claim the same vm_path for each
+        assert isinstance(clone, bool)
+        self.clone = clone
+
         if self.parallel:
             self.__vmx_path()
 
@@ -85,6 +105,27 @@ class VManager(Manager):
         assert isinstance(a11y_tree_limit, int)
         self.a11y_tree_limit = a11y_tree_limit
 
+        assert screenshot_size is None \
+            or isinstance(screenshot_size, float) \
+            or len(screenshot_size) == 2
+        self.screenshot_size = screenshot_size
+
+        assert screenshot_format is None or screenshot_format in ImageContent.CODECS
+        self.screenshot_format = screenshot_format
+
+        assert screenshot_quality is None or 0 < screenshot_quality <= 100
+        self.screenshot_quality = screenshot_quality
+
+        assert isinstance(screenshot_delta, bool)
+        self.screenshot_delta = screenshot_delta
+
+        # only walk a11y trees of these apps on server if provided
+        assert a11y_apps is None or all([isinstance(app, str) for app in a11y_apps])
+        self.a11y_apps = a11y_apps
+
+        # whether /observe is available on server; None if unknown
+        self.observable: Optional[bool] = None
+
         # if not os.path.exists(VManager.ISO_PATH):
         #     open(VManager.ISO_PATH, mode="w").close()
 
@@ -180,17 +221,29 @@ class VManager(Manager):
         vmx_path, vmx_name = os.path.split(self.path)
         base_path, dir_name = os.path.split(vmx_path)
 
-        assert len([
+        claimed = len([
             item for item in vmxs
             if item["path"] == os.path.normpath(self.path)
-        ]) == 0, "VM already in use"
+        ]) > 0
+        assert self.clone or not claimed, "VM already in use"
 
-        if len([
+        # a VM already in use shares location uuid with itself
+        # so it is cloned as well instead of being claimed twice
+        if claimed or len([
             item for item in vmxs
             if item["loc"] == self.location_uuid
         ]) > 0:
             from desktop_env.providers.vmware.manager import _update_vm
-            dir_name = f"VM-{len(vmxs)}"
+            in_use = {item["path"] for item in vmxs}
+            index = len(vmxs)
+            while os.path.normpath(os.path.join(
+                base_path,
+                f"VM-{index}",
+                f"VM-{index}.vmx"
+            )) in in_use:
+                index += 1
+
+            dir_name = f"VM-{index}"
             vmx_name = f"{dir_name}.vmx"
             _update_vm(self.path, dir_name)
 
@@ -202,6 +255,7 @@ class VManager(Manager):
         return vmxs
 
     def __vmx_path(self):
+        from filelock import FileLock
         with thread_lock:
             with FileLock(LOCK):
                 vmxs_cfg = self.__vmx_unify(self.__read_vmx_cfg())
@@ -280,7 +334,8 @@ class VManager(Manager):
             tolerance=tolerance
         )
 
-    def _request(self, query: str, param: Dict["str", Any]) -> requests.Response:
+    def _request(self, query: str, param: Dict["str", Any]) -> "requests.Response":
+        import requests
         # query string example: "POST:8080/api/version"
         # correspond to request.post(f"http://{base}:{port}{path}")
         reg_exp = r'(GET|POST)(:\d+)?(.+)'
@@ -312,6 +367,7 @@ class VManager(Manager):
         assert isinstance(snapshot_name, str)
 
         self.vlog.info(f"Revert to snapshot of {snapshot_name}.")
+        READY.pop(self.key, None)
         try:
             self.env.snapshot_name = snapshot_name
             self.env._revert_to_snapshot()
@@ -320,6 +376,37 @@ class VManager(Manager):
         except:
             return False
 
+    @_env_handler
+    @error_factory(False)
+    def reset(self) -> bool:
+        response = self._request("POST/setup/execute", {
+            "json": {
+                "command": VManager.RESET_COMMAND,
+                "shell": True
+            }
+        })
+        return response.status_code == 200
+
+    @_env_handler
+    @error_factory(False)
+    def healthy(self) -> bool:
+        return self._request("GET/platform", {}).status_code == 200
+
+    # the same as VTask._init(), but can be done ahead of time (e.g. by VPool)
+    # the next VTask on this env skips reverting by calling consume()
+    @_env_handler
+    def prepare(self, snapshot_name: str) -> bool:
+        succeed = self.revert(snapshot_name)
+        VManager.pause()
+        succeed = succeed and self.reset() and self.healthy()
+        if succeed:
+            READY[self.key] = snapshot_name
+        return succeed
+
+    # whether env is prepared with snapshot_name and not used since
+    def consume(self, snapshot_name: str) -> bool:
+        return READY.pop(self.key, None) == snapshot_name
+
     def __enter__(self) -> Self:
         global ENVS
         ENVS[self.key] = ENVS[self.key]()
@@ -329,6 +416,8 @@ class VManager(Manager):
     def __exit__(self, exc_type, exc_value, traceback) -> None:
         self.env.close()
         del ENVS[self.key]
+        READY.pop(self.key, None)
+        FRAMES.pop(self.key, None)
         del self.key
         super().__exit__(exc_type, exc_value, traceback)
 
@@ -337,38 +426,190 @@ class VManager(Manager):
     def textual(self) -> Optional[str]:
         return self.controller.get_terminal_output()
 
+    # None if screenshot is requested in the same way as OSWorld
+    @property
+    def screenshot_params(self) -> Optional[Dict[str, Any]]:
+        params = {}
+        if isinstance(self.screenshot_size, float):
+            params["scale"] = self.screenshot_size
+        elif self.screenshot_size is not None:
+            params["width"], params["height"] = self.screenshot_size
+
+        if self.screenshot_format is not None:
+            params["format"] = self.screenshot_format
+        if self.screenshot_quality is not None:
+            params["quality"] = self.screenshot_quality
+        if self.screenshot_delta:
+            params["delta"] = FRAMES[self.key][0] if self.key in FRAMES else 0
+        return params if len(params) > 0 else None
+
+    # paste changed tiles onto the last frame of current env
+    # delta frames should only be applied on the frame they are based on
+    def _reconstruct(self, frame: Dict[str, Any]) -> Image.Image:
+        size = (frame["width"], frame["height"])
+        tiles: List[Tuple[int, int, Image.Image]] = [
+            (x, y, Image.open(BytesIO(base64.b64decode(data))))
+            for x, y, data in frame["tiles"]
+        ]
+
+        if len(tiles) > 0 and tiles[0][:2] == (0, 0) and tiles[0][2].size == size:
+            image = tiles.pop(0)[2].convert("RGB")
+        else:
+            assert self.key in FRAMES, "Delta frame received without base"
+            image = FRAMES[self.key][1].copy()
+            assert image.size == size, "Delta frame mismatches its base"
+
+        for x, y, tile in tiles:
+            image.paste(tile, (x, y))
+
+        FRAMES[self.key] = (frame["id"], image)
+        return image.copy()
+
     @_env_handler
     @Manager._assert_handler
+    @error_factory(None)
     def screenshot(self) -> Optional[Image.Image]:
-        raw_screenshot = self.controller.get_screenshot()
-        return Image.open(BytesIO(raw_screenshot))
+        if (params := self.screenshot_params) is None:
+            raw_screenshot = self.controller.get_screenshot()
+            return Image.open(BytesIO(raw_screenshot))
+
+        response = self._request("GET/screenshot", {"params": params})
+        response.raise_for_status()
+
+        # servers deployed before delta mode always respond with images
+        if response.headers.get("Content-Type", "").startswith("application/json"):
+            return self._reconstruct(response.json())
+        return Image.open(BytesIO(response.content))
+
+    # downscaled by server if supported, otherwise locally
+    # delta is not requested so that base of screenshot() is kept
+    @_env_handler
+    @error_factory(None)
+    def frame(self) -> Optional[Image.Image]:
+        response = self._request("GET/screenshot", {"params": {
+            "width": self.FRAME_WIDTH,
+            "format": "png"
+        }})
+        response.raise_for_status()
+        frame = Image.open(BytesIO(response.content)).convert("L")
+        frame.thumbnail((self.FRAME_WIDTH, self.FRAME_WIDTH))
+        return frame
+
+    def _budget(self, a11y_tree: str) -> str:
+        a11y_tree, tokens, truncated = utils.budget(a11y_tree, self.a11y_tree_limit)
+        self.vlog.info(
+            f"A11y tree takes {tokens} tokens"
+                + (f"; truncated by limit of {self.a11y_tree_limit}." if truncated else ".")
+        )
+        return a11y_tree
+
+    @error_factory(None)
+    def _raw_a11y_tree(self) -> Optional[str]:
+        if self.a11y_apps is None:
+            return self.controller.get_accessibility_tree()
+
+        response = self._request("GET/accessibility", {
+            "params": {"app": ",".join(self.a11y_apps)}
+        })
+        response.raise_for_status()
+        return response.json()["AT"]
 
     @_env_handler
     @Manager._assert_handler
     def a11y_tree(self) -> Optional[str]:
-        raw_a11y_tree = self.controller.get_accessibility_tree()
+        raw_a11y_tree = self._raw_a11y_tree()
         a11y_tree = utils.linearize(raw_a11y_tree)
         if a11y_tree:
-            a11y_tree = utils.trim(a11y_tree, self.a11y_tree_limit)
+            a11y_tree = self._budget(a11y_tree)
         return a11y_tree
 
+    def _set_of_marks(
+        self,
+        raw_screenshot: bytes,
+        raw_a11y_tree: str
+    ) -> Tuple[Any, Image.Image, str]:
+        tags_info, _, som, a11y_tree = utils.tag_screenshot(raw_screenshot, raw_a11y_tree)
+        return (
+            tags_info,
+            Image.open(BytesIO(som)),
+            self._budget(a11y_tree)
+        )
+
     @_env_handler
     def set_of_marks(self) -> Union[Tuple[Image.Image, str], NoReturn]:
         # a11y tree consumes more time than screenshot
         # env may change if screenshot is taken in advance
-        raw_a11y_tree = self.controller.get_accessibility_tree()
+        raw_a11y_tree = self._raw_a11y_tree()
         raw_screenshot = self.controller.get_screenshot()
 
         # controller does not check nullity
         assert raw_a11y_tree is not None
         assert raw_screenshot is not None
+        return self._set_of_marks(raw_screenshot, raw_a11y_tree)
 
-        tags_info, _, som, a11y_tree = utils.tag_screenshot(raw_screenshot, raw_a11y_tree)
-        return (
-            tags_info,
-            Image.open(BytesIO(som)),
-            utils.trim(a11y_tree, self.a11y_tree_limit)
-        )
+    # one round-trip to /observe instead of one for each type
+    # return None to fall back to separate requests if
+    # - /observe is not deployed on server
+    # - SoM is requested with resized screenshots, which is not supported
+    @_env_handler
+    def observe(self, obs_types: Iterable[str]) -> Optional[Dict[str, Any]]:
+        obs_types = set(obs_types)
+        if self.observable is False:
+            return None
+        if OBS.set_of_marks in obs_types and (
+            OBS.screenshot in obs_types or self.screenshot_params is not None
+        ):
+            return None
+
+        types = {
+            OBS.screenshot: ["screenshot"],
+            OBS.a11y_tree: ["accessibility"],
+            OBS.textual: ["terminal"],
+            OBS.set_of_marks: ["screenshot", "accessibility"]
+        }
+        if not obs_types <= types.keys():
+            return None
+
+        response = self._request("GET/observe", {"params": {
+            "types": ",".join(sorted({
+                part for obs_type in obs_types
+                for part in types[obs_type]
+            })),
+            **({} if self.a11y_apps is None else {"app": ",".join(self.a11y_apps)}),
+            **(self.screenshot_params or {})
+        }})
+        if response.status_code == 404:
+            self.observable = False
+            self.vlog.warning("/observe is not available on server; fall back to separate requests.")
+            return None
+        response.raise_for_status()
+        self.observable = True
+
+        parts = utils.parse_multipart(response.headers["Content-Type"], response.content)
+        observation = {}
+        if OBS.screenshot in obs_types:
+            content_type, content = parts["screenshot"]
+            observation[OBS.screenshot] = self._reconstruct(json.loads(content)) \
+                if content_type.startswith("application/json") \
+                else Image.open(BytesIO(content))
+
+        if OBS.a11y_tree in obs_types:
+            a11y_tree = utils.linearize(parts["accessibility"][1].decode("utf-8"))
+            observation[OBS.a11y_tree] = self._budget(a11y_tree) if a11y_tree else a11y_tree
+
+        if OBS.textual in obs_types:
+            observation[OBS.textual] = json.loads(parts["terminal"][1])["output"]
+
+        if OBS.set_of_marks in obs_types:
+            observation[OBS.set_of_marks] = self._set_of_marks(
+                parts["screenshot"][1],
+                parts["accessibility"][1].decode("utf-8")
+            )
+
+        # the same as Manager._assert_handler()
+        for value in observation.values():
+            assert value is not None
+        return observation
 
     @_env_handler
     def show_som(self) -> None:
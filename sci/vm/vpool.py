@@ -0,0 +1,133 @@
+import sys
+import time
+import queue
+import threading
+import traceback
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Callable, Self
+
+sys.dont_write_bytecode = True
+from ..base import VirtualLog
+from .vmanager import VManager
+
+
+# a pool of VMs reverted, reset and health-checked in background
+# - spawn(parallel=True) should claim a new VM for each call
+# - acquire() returns path of a ready VM; managers created with
+#   the same vm_path share its env, which is already entered
+# - release() puts the VM back to be prepared again
+# VTask skips reverting as VManager.consume() tells that it is prepared
+class VPool:
+    RETRY = 3
+    POLL_INTERVAL = 1
+
+    def __init__(
+        self,
+        spawn: Callable[..., VManager],
+        size: int,
+        snapshot_name: str = VManager.INIT_NAME
+    ) -> None:
+        assert hasattr(spawn, "__call__")
+        self.spawn = spawn
+
+        assert isinstance(size, int) and size > 0
+        self.size = size
+
+        assert isinstance(snapshot_name, str)
+        self.snapshot_name = snapshot_name
+
+        self.vlog = VirtualLog()
+        self.lock = threading.Lock()
+        self.managers: Dict[str, VManager] = {}
+        self.ready: queue.Queue[str] = queue.Queue()
+        self.executor: Optional[ThreadPoolExecutor] = None
+
+        self.acquired = 0
+        self.hits = 0
+        self.wait_time = 0.0
+        self.failures = 0
+
+    @property
+    def alive(self) -> int:
+        return len(self.managers) - self.failures
+
+    @property
+    def metrics(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "acquired": self.acquired,
+                "hit_rate": self.hits / self.acquired if self.acquired > 0 else 0.0,
+                "total_wait": self.wait_time,
+                "average_wait": self.wait_time / self.acquired if self.acquired > 0 else 0.0,
+                "failures": self.failures
+            }
+
+    def __str__(self) -> str:
+        metrics = self.metrics
+        return (
+            f"VM pool of {self.size}: "
+            f"{metrics['acquired']} acquired, "
+            f"hit rate {metrics['hit_rate']:.2%}, "
+            f"average wait {metrics['average_wait']:.2f}s, "
+            f"{metrics['failures']} dropped"
+        )
+
+    def __prepare(self, vm_path: str) -> None:
+        manager = self.managers[vm_path]
+        for _ in range(VPool.RETRY):
+            try:
+                if not manager.entered:
+                    manager.__enter__()
+                if manager.prepare(self.snapshot_name):
+                    self.ready.put(vm_path)
+                    return
+            except Exception:
+                self.vlog.error(
+                    f"Error when preparing VM of {vm_path}.\n"
+                        + traceback.format_exc()
+                )
+
+        with self.lock:
+            self.failures += 1
+        self.vlog.error(f"VM of {vm_path} is dropped after {VPool.RETRY} failures.")
+
+    def __enter__(self) -> Self:
+        self.executor = ThreadPoolExecutor(max_workers=self.size)
+        for _ in range(self.size):
+            manager = self.spawn(parallel=True)
+            manager.vlog = self.vlog
+            self.managers[manager.path] = manager
+            self.executor.submit(self.__prepare, manager.path)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        for manager in self.managers.values():
+            if manager.entered:
+                manager.__exit__(None, None, None)
+        self.vlog.info(str(self))
+
+    # block until a VM is ready; None if all VMs are dropped
+    def acquire(self) -> Optional[str]:
+        start_time = time.time()
+        try:
+            vm_path, hit = self.ready.get_nowait(), True
+        except queue.Empty:
+            vm_path, hit = None, False
+            while vm_path is None and self.alive > 0:
+                try:
+                    vm_path = self.ready.get(timeout=VPool.POLL_INTERVAL)
+                except queue.Empty:
+                    continue
+
+        if vm_path is not None:
+            with self.lock:
+                self.acquired += 1
+                self.hits += hit
+                self.wait_time += time.time() - start_time
+        return vm_path
+
+    def release(self, vm_path: str) -> None:
+        assert vm_path in self.managers
+        self.executor.submit(self.__prepare, vm_path)
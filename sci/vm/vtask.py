@@ -39,10 +39,14 @@ class VTask(Task):
 
     @error_factory(False)
     def _init(self) -> bool:
+        if self.manager.consume(self.snapshot):
+            self.vlog.info(f"Snapshot of {self.snapshot} is already prepared.")
+            return True
+
         result = self.manager.revert(self.snapshot)
         VManager.pause()
         assert self._execute(
-            command="/bin/bash /home/user/server/reset.sh",
+            command=VManager.RESET_COMMAND,
             shell=True
         ) is not False
         return result
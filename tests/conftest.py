@@ -0,0 +1,18 @@
+import os
+import sys
+
+sys.dont_write_bytecode = True
+
+# sci is imported by tests
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# golden outputs (*.linearized.txt, som_*.json) are produced by
+# the implementation extracted from OSWorld before it was optimized
+FIXTURES = os.path.join(ROOT, "tests", "fixtures")
+
+
+def fixture(filename: str, mode: str = "r"):
+    encoding = None if "b" in mode else "utf-8"
+    with open(os.path.join(FIXTURES, filename), mode=mode, encoding=encoding) as readable:
+        return readable.read()
@@ -0,0 +1,32 @@
+from sci.vm import utils
+
+
+# one token per byte, so that budgets are exact without tiktoken files
+class ByteEncoder:
+    def encode(self, text: str):
+        return list(text.encode("utf-8"))
+
+
+def test_budget_keeps_rows_intact(monkeypatch):
+    monkeypatch.setattr(utils, "encoder", lambda: ByteEncoder())
+    rows = [
+        "tag\tname\ttext\tclass\tdescription\tposition (top-left x&y)\tsize (w&h)",
+        "push-button\tOK\t\"\"\t\t\t(10, 20)\t(80, 24)",
+        "label\tResult\t\"\"\t\t\t(10, 60)\t(120, 20)",
+        "text\t\t1 < 2\t\t\t(10, 90)\t(300, 200)"
+    ]
+    tree = "\n".join(rows)
+    limit = len("\n".join(rows[:3])) + 5
+
+    text, tokens, truncated = utils.budget(tree, limit)
+    assert truncated and tokens == len("\n".join(rows[:3]))
+    assert text == "\n".join(rows[:3]) + "\n[...]\n"
+    # the size column of the last row kept is not joined with the marker
+    assert text.split("\n")[2].split("\t")[-1] == "(120, 20)"
+    assert utils.trim(tree, limit) == text
+
+
+def test_budget_untouched_below_limit(monkeypatch):
+    monkeypatch.setattr(utils, "encoder", lambda: ByteEncoder())
+    tree = "tag\tname\nlabel\tResult"
+    assert utils.budget(tree, 100) == (tree, len(tree), False)
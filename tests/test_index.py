@@ -0,0 +1,23 @@
+import os
+
+from sci.base.index import RunIndex
+from sci.base.log import Log
+
+
+def write_result(logs_path: str, ident: str, result: str) -> None:
+    os.makedirs(os.path.join(logs_path, ident), exist_ok=True)
+    with open(os.path.join(logs_path, ident, Log.RESULT_FILENAME), mode="w") as writable:
+        writable.write(result)
+
+
+def test_finished_requires_result_file(tmp_path):
+    index = RunIndex(str(tmp_path))
+    index.record("App/kept", "App", "Raw", True)
+    index.record("App/deleted", "App", "Raw", False)
+    index.record("App/skipped", "App", "Raw", None)
+    write_result(str(tmp_path), "App/kept", "1")
+    write_result(str(tmp_path), "App/skipped", "0")
+
+    # rows whose result.out is deleted would otherwise skip entering managers
+    assert index.finished() == {"App/kept"}
+    index.close()
@@ -0,0 +1,41 @@
+from conftest import fixture
+from sci.vm import utils
+
+
+def test_fixture_matches_golden():
+    tree = fixture("a11y_ubuntu.xml")
+    expected = fixture("a11y_ubuntu.linearized.txt")
+    assert utils.linearize(tree) == expected
+    assert utils.linearize(tree, chunk_size=7) == expected
+
+    # invisible, empty, offscreen, disabled nodes are filtered
+    for name in ("Quit", "Empty", "Hidden", "Panel", "Input"):
+        assert f"\t{name}\t" not in expected
+    assert 'menu-item\tSave "as"\t""\t\t\t(4, 79)\t(120, 24)' in expected
+    assert 'label\tResult\t"a ""quoted"" value"\t' in expected
+    assert "table-cell\t\t1 < 2\t" in expected
+
+
+def test_synthetic_matches_golden():
+    tree = fixture("a11y_synthetic.xml")
+    expected = fixture("a11y_synthetic.linearized.txt")
+    for chunk_size in (1 << 6, 1 << 10, 1 << 16):
+        assert utils.linearize(tree, chunk_size=chunk_size) == expected
+
+
+# the original implementation evaluated coordinates with eval()
+def test_malformed_coordinates_filtered():
+    tree = fixture("a11y_ubuntu.xml").replace(
+        'cp:screencoord="(1800, 40)"',
+        "cp:screencoord=\"__import__('os').getcwd()\""
+    )
+    assert "\tCalculate\t" in fixture("a11y_ubuntu.linearized.txt")
+    assert "\tCalculate\t" not in utils.linearize(tree)
+
+
+def test_parse_pair():
+    assert utils.parse_pair("(12, -3)") == (12, -3)
+    assert utils.parse_pair(" (1.5,2) ") == (1.5, 2)
+    assert utils.parse_pair("__import__('os').getcwd()") == (-1, -1)
+    assert utils.parse_pair("(1, 2, 3)") == (-1, -1)
+    assert utils.parse_pair("") == (-1, -1)
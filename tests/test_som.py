@@ -0,0 +1,60 @@
+import json
+import random
+import hashlib
+import xml.etree.ElementTree as ET
+
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from conftest import fixture
+from sci.vm import utils
+
+
+# the check of the original implementation: one color in image.crop(box)
+def uniform_pil(image: Image.Image, box) -> bool:
+    return len(set(image.crop(box).getdata())) == 1
+
+
+# sizes are positive as draw_bounding_boxes() drops the others
+def random_boxes(rng: random.Random, width: int, height: int, count: int):
+    boxes = []
+    for _ in range(count):
+        x0, y0 = rng.randint(-20, width + 5), rng.randint(-20, height + 5)
+        boxes.append((x0, y0, x0 + rng.randint(1, 60), y0 + rng.randint(1, 40)))
+    return boxes
+
+
+def test_uniform_boxes_match_pil():
+    rng = random.Random(0)
+    image = Image.new("RGB", (160, 120), (236, 236, 236))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, 160, 16), fill=(0, 0, 0))
+    draw.rectangle((40, 40, 90, 70), outline=(255, 0, 0))
+    draw.text((10, 90), "label", fill=(0, 0, 0))
+
+    for mode in ("RGB", "RGBA", "L"):
+        converted = image.convert(mode)
+        boxes = random_boxes(rng, *converted.size, 500)
+        # on edges, fully outside and inside the black bar where padding is also black
+        boxes += [(-5, -5, 10, 10), (200, 200, 210, 210), (10, 2, 30, 12)]
+
+        expected = [uniform_pil(converted, box) for box in boxes]
+        actual = utils.uniform_boxes(np.asarray(converted), np.array(boxes, dtype=np.int64))
+        assert actual.tolist() == expected, mode
+
+
+def test_draw_bounding_boxes_match_golden():
+    golden = json.loads(fixture("som_synthetic.json"))
+    nodes = utils.filter_nodes(ET.fromstring(fixture("a11y_synthetic.xml")), check_image=True)
+    marks, drew_nodes, elements, image = utils.draw_bounding_boxes(
+        nodes,
+        fixture("screenshot.png", mode="rb")
+    )
+
+    assert marks == golden["marks"]
+    assert [nodes.index(node) for node in drew_nodes] == golden["nodes"]
+    assert elements.split("\n") == golden["elements"]
+    pixels = Image.open(BytesIO(image)).convert("RGB").tobytes()
+    assert hashlib.sha1(pixels).hexdigest() == golden["pixels"]
@@ -0,0 +1,74 @@
+import os
+import sys
+import time
+import argparse
+
+from PIL import Image, ImageDraw
+
+sys.dont_write_bytecode = True
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sci.base import Model, TextContent, ImageContent
+
+
+# previous behavior: encode on every access
+class UncachedContent(ImageContent):
+    @property
+    def base64(self) -> str:
+        self.encoded = None
+        return super().base64
+
+
+# desktop-like frame: flat panels with some text and noise
+def screenshot(index: int, size=(1920, 1080)) -> Image.Image:
+    image = Image.new("RGB", size, (236, 236, 236))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, size[0], 32), fill=(48, 48, 48))
+    for row in range(40):
+        draw.text((40, 60 + row * 24), f"line {row} of step {index} " * 6, fill=(0, 0, 0))
+    noise = Image.effect_noise((size[0] // 3, size[1] // 3), 32).convert("RGB")
+    image.paste(noise, (size[0] // 2, size[1] // 2))
+    return image
+
+
+def bench(content_cls, args) -> float:
+    model = Model(
+        model_style=args.style,
+        base_url="http://127.0.0.1",
+        model_name="bench"
+    )
+
+    system = model.message(role="system", content=[TextContent("system")])
+    context, total = [], 0.0
+    for index in range(args.steps):
+        context.append(model.message(role="user", content=[
+            TextContent("observation"),
+            content_cls(screenshot(index), codec=args.codec, quality=args.quality)
+        ]))
+
+        # what Agent.__call__ and Log.save do within a single step
+        start = time.perf_counter()
+        payload = [system, *context[-(args.context_window * 2 + 1):]]
+        [message._asdict() for message in payload]
+        for hide in (False, True):
+            [message._asdict(show_context=True, hide_text=hide, hide_image=hide) for message in [system, *context]]
+        total += time.perf_counter() - start
+
+        context.append(model.message(role="assistant", content=[TextContent("```wait```")]))
+    return total / args.steps
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="encode time of images per step")
+    parser.add_argument("--steps", type=int, default=15)
+    parser.add_argument("--context_window", type=int, default=3)
+    parser.add_argument("--style", default="openai")
+    parser.add_argument("--codec", default="png", choices=list(ImageContent.CODECS))
+    parser.add_argument("--quality", type=int, default=None)
+    args = parser.parse_args()
+
+    before = bench(UncachedContent, args)
+    after = bench(ImageContent, args)
+    print(f"codec={args.codec}, quality={args.quality}, steps={args.steps}")
+    print(f"before: {before * 1000:.1f}ms/step")
+    print(f"after: {after * 1000:.1f}ms/step")
+    print(f"speedup: {before / after:.1f}x")
@@ -0,0 +1,105 @@
+import os
+import sys
+import time
+import random
+import argparse
+import xml.etree.ElementTree as ET
+
+from typing import List
+
+sys.dont_write_bytecode = True
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sci.vm import utils
+
+TAGS = ["push-button", "label", "panel", "filler", "menu-item", "text", "canvas", "table-cell", "image", "frame"]
+
+
+# tree-based implementation replaced by utils.linearize(), kept as oracle
+def linearize_tree(a11y_tree: str, platform: str = "ubuntu") -> str:
+    if platform == "ubuntu":
+        attributes_ns, component_ns = utils.attributes_ns_ubuntu, utils.component_ns_ubuntu
+        value_ns, class_ns = utils.value_ns_ubuntu, utils.attributes_ns_ubuntu
+    elif platform == "windows":
+        attributes_ns, component_ns = utils.attributes_ns_windows, utils.component_ns_windows
+        value_ns, class_ns = utils.value_ns_windows, utils.class_ns_windows
+    else:
+        raise ValueError("Invalid platform, must be 'ubuntu' or 'windows'")
+
+    rows = ["tag\tname\ttext\tclass\tdescription\tposition (top-left x&y)\tsize (w&h)"]
+    for node in utils.filter_nodes(ET.fromstring(a11y_tree), platform):
+        rows.append("{:}\t{:}\t{:}\t{:}\t{:}\t{:}\t{:}".format(
+            node.tag,
+            node.get("name", ""),
+            utils.node_text(node, value_ns),
+            node.get("{{{:}}}class".format(class_ns), ""),
+            node.get("{{{:}}}description".format(attributes_ns), ""),
+            node.get("{{{:}}}screencoord".format(component_ns), ""),
+            node.get("{{{:}}}size".format(component_ns), "")
+        ))
+    return "\n".join(rows)
+
+
+# a11y tree of similar shape to those returned by /accessibility
+def synthesize(nodes: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    state = utils.state_ns_ubuntu
+    component = utils.component_ns_ubuntu
+    attributes = utils.attributes_ns_ubuntu
+
+    def node(depth: int, budget: List[int]) -> str:
+        budget[0] -= 1
+        tag = rng.choice(TAGS)
+        states = " ".join([
+            f'st:{key}="{"true" if rng.random() < 0.8 else "false"}"'
+            for key in ("showing", "visible", "enabled", "editable")
+        ])
+        coord = f"({rng.randint(-5, 1900)}, {rng.randint(-5, 1060)})"
+        size = f"({rng.randint(0, 400)}, {rng.randint(0, 60)})"
+        name = rng.choice(["", "OK", 'say "hi"', "Apply", "x & y"]).replace("&", "&amp;").replace('"', "&quot;")
+        text = rng.choice(["", "value", "a \"quoted\" text", "1 &lt; 2"])
+
+        children = []
+        while depth < 12 and budget[0] > 0 and rng.random() < 0.7:
+            children.append(node(depth + 1, budget))
+        return (
+            f'<{tag} name="{name}" {states} cp:screencoord="{coord}" cp:size="{size}" '
+            f'attr:class="c{rng.randint(0, 9)}" attr:description="">{text}{"".join(children)}</{tag}>'
+        )
+
+    budget, roots = [nodes], []
+    while budget[0] > 0:
+        roots.append(node(0, budget))
+    return (
+        f'<desktop-frame xmlns:st="{state}" xmlns:cp="{component}" xmlns:attr="{attributes}">'
+        + "".join(roots)
+        + "</desktop-frame>"
+    )
+
+
+def measure(func, tree: str, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(tree)
+    return (time.perf_counter() - start) / repeat
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="regression check & benchmark of a11y tree linearization")
+    parser.add_argument("paths", nargs="*", help="recorded raw a11y trees (xml); synthesized if not provided")
+    parser.add_argument("--nodes", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    trees = [(path, open(path, mode="r", encoding="utf-8").read()) for path in args.paths]
+    if len(trees) == 0:
+        trees = [(f"synthetic-{args.nodes}", synthesize(args.nodes))]
+
+    for name, tree in trees:
+        expected = linearize_tree(tree)
+        assert utils.linearize(tree) == expected, f"Output mismatched on {name}"
+        assert utils.linearize(tree, chunk_size=7) == expected, f"Output mismatched on {name}"
+
+        before = measure(linearize_tree, tree, args.repeat)
+        after = measure(utils.linearize, tree, args.repeat)
+        print(f"{name}: {len(expected.splitlines()) - 1} rows, identical output")
+        print(f"    tree: {before * 1000:.1f}ms, streaming: {after * 1000:.1f}ms, speedup: {before / after:.1f}x")
@@ -0,0 +1,57 @@
+import os
+import sys
+import json
+import time
+import tempfile
+import argparse
+
+sys.dont_write_bytecode = True
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sci.base import Log, Model, Agent, TextContent
+from bench_encode import screenshot
+
+OBS_KEY = "screenshot"
+
+
+# previous behavior: rewrite whole history and prompt every step
+def rewrite(log: Log, step_index: int, obs, community) -> None:
+    obs[OBS_KEY].save(os.path.join(log.save_path, f"step_{step_index}.png"))
+    for name, agent in community:
+        for hide, file_path in ((False, "request_{agent}.json"), (True, "request_{agent}.simp.json")):
+            with open(os.path.join(log.save_path, file_path.format(agent=name)), mode="w", encoding="utf-8") as writable:
+                json.dump(agent.dump_history(hide), writable, ensure_ascii=False, indent=2)
+        with open(os.path.join(log.save_path, f"prompt_{name}.txt"), mode="w", encoding="utf-8") as writable:
+            writable.write(agent.system_message.content[0].text)
+
+
+def bench(save, args) -> float:
+    model = Model(model_style="openai", base_url="http://127.0.0.1", model_name="bench")
+    agent = Agent(model)
+    agent._init("system " * 2000)
+    community = [("mono", agent)]
+
+    log, total = Log(disabled=True, global_vlog=False), 0.0
+    with tempfile.TemporaryDirectory() as base_path, log(base_path, "bench"):
+        for index in range(args.steps):
+            image = screenshot(index)
+            agent.context.append(model.message(role="user", content=[TextContent("observation"), agent._image(image)]))
+            agent.context.append(model.message(role="assistant", content=[TextContent("```wait```")]))
+            agent.context[-2].content[1].base64
+
+            start = time.perf_counter()
+            save(log, index, {OBS_KEY: image}, community)
+            total += time.perf_counter() - start
+    return total / args.steps
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="time spent by Log.save() on critical path per step")
+    parser.add_argument("--steps", type=int, default=15)
+    args = parser.parse_args()
+
+    before = bench(rewrite, args)
+    after = bench(lambda log, index, obs, community: log.save(index, obs, [], community, False), args)
+    print(f"steps={args.steps}")
+    print(f"before: {before * 1000:.1f}ms/step")
+    print(f"after: {after * 1000:.1f}ms/step")
+    print(f"speedup: {before / after:.1f}x")
@@ -0,0 +1,147 @@
+import os
+import sys
+import time
+import argparse
+import xml.etree.ElementTree as ET
+
+from io import BytesIO
+from typing import List, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+sys.dont_write_bytecode = True
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sci.vm import utils
+from bench_encode import screenshot
+from bench_linearize import synthesize
+
+
+# PIL-based implementation replaced by utils.draw_bounding_boxes(), kept as oracle
+def draw_bounding_boxes_pil(nodes: List, image_file_content: bytes, down_sampling_ratio=1.0, platform="ubuntu"):
+    if platform == "ubuntu":
+        _state_ns = utils.state_ns_ubuntu
+        _component_ns = utils.component_ns_ubuntu
+        _value_ns = utils.value_ns_ubuntu
+    elif platform == "windows":
+        _state_ns = utils.state_ns_windows
+        _component_ns = utils.component_ns_windows
+        _value_ns = utils.value_ns_windows
+    else:
+        raise ValueError("Invalid platform, must be 'ubuntu' or 'windows'")
+
+    image_stream = BytesIO(image_file_content)
+    image = Image.open(image_stream)
+    if float(down_sampling_ratio) != 1.0:
+        image = image.resize((int(image.size[0] * down_sampling_ratio), int(image.size[1] * down_sampling_ratio)))
+    draw = ImageDraw.Draw(image)
+    marks = []
+    drew_nodes = []
+    text_informations: List[str] = ["index\ttag\tname\ttext"]
+
+    try:
+        font = ImageFont.truetype("arial.ttf", 15)
+    except IOError:
+        font = ImageFont.load_default()
+
+    index = 1
+
+    for _node in nodes:
+        coords_str = _node.attrib.get('{{{:}}}screencoord'.format(_component_ns))
+        size_str = _node.attrib.get('{{{:}}}size'.format(_component_ns))
+
+        if coords_str and size_str:
+            try:
+                coords = tuple(map(int, coords_str.strip('()').split(', ')))
+                size = tuple(map(int, size_str.strip('()').split(', ')))
+
+                original_coords = coords
+                original_size = size
+
+                if float(down_sampling_ratio) != 1.0:
+                    coords = tuple(int(coord * down_sampling_ratio) for coord in coords)
+                    size = tuple(int(s * down_sampling_ratio) for s in size)
+
+                if size[0] <= 0 or size[1] <= 0:
+                    raise ValueError(f"Size must be positive, got: {size}")
+
+                bottom_right = (coords[0] + size[0], coords[1] + size[1])
+
+                if bottom_right[0] < coords[0] or bottom_right[1] < coords[1]:
+                    raise ValueError(f"Invalid coordinates or size, coords: {coords}, size: {size}")
+
+                cropped_image = image.crop((*coords, *bottom_right))
+                if len(set(list(cropped_image.getdata()))) == 1:
+                    continue
+
+                draw.rectangle([coords, bottom_right], outline="red", width=1)
+
+                text_position = (coords[0], bottom_right[1])
+                text_bbox: Tuple[int, int, int, int] = draw.textbbox(text_position, str(index), font=font, anchor="lb")
+
+                draw.rectangle(text_bbox, fill='black')
+                draw.text(text_position, str(index), font=font, anchor="lb", fill="white")
+
+                marks.append([original_coords[0], original_coords[1], original_size[0], original_size[1]])
+                drew_nodes.append(_node)
+
+                if _node.text:
+                    node_text = (_node.text if '"' not in _node.text \
+                                     else '"{:}"'.format(_node.text.replace('"', '""'))
+                                 )
+                elif _node.get("{{{:}}}class".format(utils.class_ns_windows), "").endswith("EditWrapper") \
+                        and _node.get("{{{:}}}value".format(_value_ns)):
+                    node_text = _node.get("{{{:}}}value".format(_value_ns), "")
+                    node_text = (node_text if '"' not in node_text \
+                                     else '"{:}"'.format(node_text.replace('"', '""'))
+                                 )
+                else:
+                    node_text = '""'
+                text_information: str = "{:d}\t{:}\t{:}\t{:}".format(index, _node.tag, _node.get("name", ""), node_text)
+                text_informations.append(text_information)
+
+                index += 1
+
+            except ValueError:
+                pass
+
+    output_image_stream = BytesIO()
+    image.save(output_image_stream, format='PNG')
+    image_content = output_image_stream.getvalue()
+
+    return marks, drew_nodes, "\n".join(text_informations), image_content
+
+
+def measure(func, nodes, raw: bytes, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(nodes, raw)
+    return (time.perf_counter() - start) / repeat
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="regression check & benchmark of set-of-marks tagging")
+    parser.add_argument("pairs", nargs="*", help="recorded pairs of screenshot (png) and raw a11y tree (xml)")
+    parser.add_argument("--nodes", type=int, default=3000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    assert len(args.pairs) % 2 == 0, "Screenshots and a11y trees should be paired"
+    cases = [(
+        args.pairs[index + 1],
+        open(args.pairs[index], mode="rb").read(),
+        open(args.pairs[index + 1], mode="r", encoding="utf-8").read()
+    ) for index in range(0, len(args.pairs), 2)]
+
+    if len(cases) == 0:
+        screenshot(0).save(buffered:=BytesIO(), format="PNG")
+        cases = [(f"synthetic-{args.nodes}", buffered.getvalue(), synthesize(args.nodes))]
+
+    for name, raw, tree in cases:
+        nodes = utils.filter_nodes(ET.fromstring(tree), check_image=True)
+        expected = draw_bounding_boxes_pil(nodes, raw)
+        assert utils.draw_bounding_boxes(nodes, raw) == expected, f"Output mismatched on {name}"
+
+        before = measure(draw_bounding_boxes_pil, nodes, raw, args.repeat)
+        after = measure(utils.draw_bounding_boxes, nodes, raw, args.repeat)
+        print(f"{name}: {len(nodes)} candidates, {len(expected[0])} tagged, identical output")
+        print(f"    pil: {before * 1000:.1f}ms, numpy: {after * 1000:.1f}ms, speedup: {before / after:.1f}x")
@@ -0,0 +1,55 @@
+import os
+import re
+import sys
+import argparse
+import subprocess
+
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# supposed to be imported on first use instead of by `import sci`
+HEAVY = ["numpy", "tiktoken", "requests", "asyncio", "httpx", "filelock", "multiprocessing", "sci.Lean", "sci.ChimeraX"]
+PATTERN = r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)"
+
+
+# {module: (self us, cumulative us, depth)} reported by python -X importtime
+def importtime(statement: str) -> Dict[str, Tuple[int, int, int]]:
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=ROOT,
+        capture_output=True,
+        text=True
+    )
+    assert process.returncode == 0, process.stderr
+    return {
+        name: (int(own), int(cumulative), len(indent))
+        for own, cumulative, indent, name in re.findall(PATTERN, process.stderr)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="startup time of `import sci` measured by -X importtime")
+    parser.add_argument("--statement", default="import sci")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--budget", type=float, default=None, help="exit with 1 if median time in ms exceeds it")
+    args = parser.parse_args()
+
+    runs: List[Dict[str, Tuple[int, int, int]]] = [importtime(args.statement) for _ in range(args.repeat)]
+    root = args.statement.split()[-1].split(".")[0]
+    totals = sorted([run[root][1] / 1000 for run in runs])
+    median = totals[len(totals) // 2]
+
+    last = runs[-1]
+    print(f"{args.statement}: median {median:.1f}ms, min {totals[0]:.1f}ms over {args.repeat} runs")
+    print(f"top {args.top} modules by self time:")
+    for name, (own, cumulative, _) in sorted(last.items(), key=lambda item: -item[1][0])[:args.top]:
+        print(f"    {name:<40}{own / 1000:>8.1f}ms{cumulative / 1000:>10.1f}ms")
+
+    loaded = [name for name in HEAVY if name in last]
+    print(f"heavy modules loaded: {', '.join(loaded) if len(loaded) > 0 else 'none'}")
+
+    if args.budget is not None and median > args.budget:
+        print(f"over budget of {args.budget:.1f}ms")
+        sys.exit(1)
@@ -1,28 +1,72 @@
 import os
-import numpy as np
-
-Apps = ["Celestia", "ChimeraX", "GrassGIS", "KAlgebra", "Lean", "TeXstudio"]
-root_dir = "/data/code/ScienceBoard/logs/tars_dpo-vm-screenshot"
-preds = []
-app_preds = {"Celestia": [], "ChimeraX": [], "GrassGIS": [], "KAlgebra": [], "Lean": [], "TeXstudio": []}
-for app in Apps:
-    task_dirs = os.listdir(os.path.join(root_dir, app))
-    
-    for task_dir in task_dirs:
-        result_dir = os.path.join(root_dir, app, task_dir, "result.out")
-        try:
-            with open(result_dir) as f:
-                data = float(f.read().strip())
-                if data > 0:
-                    print(f"{app} {task_dir} {data}")
-                preds.append(data)
-                app_preds[app].append(data) 
-        except FileNotFoundError:
-            print(f"{result_dir} not found")
-            preds.append(0)
-            app_preds[app].append(0) 
-
-
-print(f"Overall mean: {np.mean(preds)}")
-for app in Apps:
-    print(f"{app} mean: {np.mean(app_preds[app])}")
\ No newline at end of file
+import sys
+import argparse
+
+sys.dont_write_bytecode = True
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sci.base import RunIndex
+
+
+def fmt(value, pattern: str = "{:.2f}") -> str:
+    return "-" if value is None else pattern.format(value)
+
+
+def report(name: str, index: RunIndex, apps, verbose: bool) -> dict:
+    rows = {row["app"]: row for row in index.scores()}
+    apps = sorted(rows) if apps is None else apps
+
+    print(f"\n{name}")
+    print(f"{'app':<12}{'total':>7}{'passed':>8}{'unfin.':>8}{'score':>8}{'steps':>8}{'time/s':>9}{'tokens':>12}")
+    for app in apps:
+        row = rows.get(app, {})
+        tokens = None if row.get("prompt_tokens") is None \
+            else row["prompt_tokens"] + row["completion_tokens"]
+        print(
+            f"{app:<12}{row.get('total', 0):>7}{row.get('passed') or 0:>8}{row.get('unfinished') or 0:>8}"
+            f"{fmt(row.get('score')):>8}{fmt(row.get('steps'), '{:.1f}'):>8}"
+            f"{fmt(row.get('duration'), '{:.0f}'):>9}{fmt(tokens, '{:d}'):>12}"
+        )
+
+    overall = index.query(
+        "SELECT AVG(COALESCE(result, 0)) AS score FROM tasks "
+            + f"WHERE app IN ({', '.join(['?'] * len(apps))})",
+        apps
+    )[0]["score"]
+    print(f"{'overall':<12}{'':>31}{fmt(overall):>8}")
+
+    if verbose:
+        for row in index.query("SELECT ident, result FROM tasks WHERE result > 0 ORDER BY ident"):
+            print(f"    passed: {row['ident']} {row['result']}")
+    return {app: rows[app]["score"] for app in apps if app in rows}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="scores of runs grouped by apps, queried from index.db under logs_path")
+    parser.add_argument("logs_paths", nargs="+", help="logs_path of each run")
+    parser.add_argument("--apps", nargs="*", default=None, help="apps to be shown; all indexed apps by default")
+    parser.add_argument("--reimport", action="store_true", help="rebuild rows from log files, e.g. for runs not produced by Tester")
+    parser.add_argument("--verbose", action="store_true", help="list passed tasks")
+    parser.add_argument("--startup", action="store_true", help="show startup latency of apps")
+    args = parser.parse_args()
+
+    runs = {}
+    for logs_path in args.logs_paths:
+        index = RunIndex(logs_path)
+        if args.reimport:
+            index.import_logs(replace=True)
+        runs[logs_path] = report(logs_path, index, args.apps, args.verbose)
+        if args.startup:
+            print(f"{'startup':<12}{'manager':>12}{'version':>9}{'count':>7}{'mean/s':>8}{'min/s':>8}{'max/s':>8}")
+            for row in index.startups():
+                print(
+                    f"{row['app']:<12}{row['manager']:>12}{row['version']:>9}{row['count']:>7}"
+                    f"{row['mean']:>8.2f}{row['min']:>8.2f}{row['max']:>8.2f}"
+                )
+        index.close()
+
+    if len(runs) > 1:
+        apps = sorted({app for scores in runs.values() for app in scores})
+        names = [os.path.basename(os.path.normpath(logs_path)) for logs_path in runs]
+        print("\n" + f"{'app':<12}" + "".join([f"{name[:15]:>16}" for name in names]))
+        for app in apps:
+            print(f"{app:<12}" + "".join([f"{fmt(scores.get(app)):>16}" for scores in runs.values()]))
@@ -1,25 +1,34 @@
 # extracted from OSWorld/server/main
 # ref: not found
 
+import base64
 import concurrent.futures
+import copy
 import ctypes
+import json
 import os
 import platform
 import re
 import shlex
 import signal
 import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from io import BytesIO
 from pathlib import Path
 from typing import Any, Optional, Sequence
 from typing import List, Dict, Tuple
 
 import Xlib
 import lxml.etree
+import numpy as np
 import pyautogui
 import requests
-from PIL import Image
+from PIL import Image, ImageChops
 from Xlib import display, X
-from flask import Flask, request, jsonify, send_file, abort  # , send_from_directory
+from flask import Flask, Response, request, jsonify, send_file, abort  # , send_from_directory
 from lxml.etree import _Element
 
 platform_name: str = platform.system()
@@ -136,15 +145,17 @@ def launch_app():
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
-@app.route('/screenshot', methods=['GET'])
-def capture_screen_with_cursor():
-    # fixme: when running on virtual machines, the cursor is not captured, don't know why
+SCREENSHOT_FORMATS = {"png": ("PNG", "image/png"), "jpeg": ("JPEG", "image/jpeg"), "webp": ("WEBP", "image/webp")}
+SCREENSHOT_TILE = 64
 
-    file_path = os.path.join(os.path.dirname(__file__), "screenshots", "screenshot.png")
-    user_platform = platform.system()
+# last frame sent in delta mode: {"id": int, "frame": np.ndarray}
+# the id changes whenever a new frame is taken so that stale bases are detected
+last_frame: Dict[str, Any] = {"id": 0, "frame": None}
+last_frame_lock = threading.Lock()
 
-    # Ensure the screenshots directory exists
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+def _capture_screen() -> Optional[Image.Image]:
+    user_platform = platform.system()
 
     # fixme: This is a temporary fix for the cursor not being captured on Windows and Linux
     if user_platform == "Windows":
@@ -153,6 +164,7 @@ def capture_screen_with_cursor():
             with open(path, 'wb') as file:
                 file.write(response.content)
 
+        os.makedirs("screenshots", exist_ok=True)
         cursor_path = os.path.join("screenshots", "cursor.png")
         if not os.path.exists(cursor_path):
             cursor_url = "https://vip.helloimg.com/images/2023/12/02/oQPzmt.png"
@@ -163,7 +175,7 @@ def capture_screen_with_cursor():
         # make the cursor smaller
         cursor = cursor.resize((int(cursor.width / 1.5), int(cursor.height / 1.5)))
         screenshot.paste(cursor, (cursor_x, cursor_y), cursor)
-        screenshot.save(file_path)
+        return screenshot
     elif user_platform == "Linux":
         cursor_obj = Xcursor()
         imgarray = cursor_obj.getCursorImageArrayFast()
@@ -171,14 +183,128 @@ def capture_screen_with_cursor():
         screenshot = pyautogui.screenshot()
         cursor_x, cursor_y = pyautogui.position()
         screenshot.paste(cursor_img, (cursor_x, cursor_y), cursor_img)
-        screenshot.save(file_path)
+        return screenshot
     elif user_platform == "Darwin":  # (Mac OS)
         # Use the screencapture utility to capture the screen with the cursor
-        subprocess.run(["screencapture", "-C", file_path])
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, "screenshot.png")
+            subprocess.run(["screencapture", "-C", file_path])
+            with Image.open(file_path) as screenshot:
+                return screenshot.copy()
     else:
         logger.warning(f"The platform you're using ({user_platform}) is not currently supported")
+        return None
+
+
+def _screenshot_args() -> Dict[str, Any]:
+    args = {
+        "width": request.args.get("width", type=int),
+        "height": request.args.get("height", type=int),
+        "scale": request.args.get("scale", type=float),
+        "format": request.args.get("format", "png").lower(),
+        "quality": request.args.get("quality", type=int),
+        "delta": request.args.get("delta", type=int),
+        "tile": request.args.get("tile", SCREENSHOT_TILE, type=int)
+    }
+    if args["format"] not in SCREENSHOT_FORMATS:
+        abort(400, description=f"Unsupported format: {args['format']}")
+    return args
+
+
+def _resize_screen(screenshot: Image.Image, args: Dict[str, Any]) -> Image.Image:
+    width, height, scale = args["width"], args["height"], args["scale"]
+
+    if scale is not None:
+        width, height = round(screenshot.width * scale), round(screenshot.height * scale)
+    elif width is not None and height is None:
+        height = round(screenshot.height * width / screenshot.width)
+    elif height is not None and width is None:
+        width = round(screenshot.width * height / screenshot.height)
+
+    if width is None or (width, height) == screenshot.size:
+        return screenshot
+    return screenshot.resize((width, height), Image.LANCZOS)
+
+
+def _encode_screen(screenshot: Image.Image, codec: str, quality: Optional[int]) -> bytes:
+    if codec == "jpeg" and screenshot.mode not in ("RGB", "L"):
+        screenshot = screenshot.convert("RGB")
+    kwargs = {} if quality is None else {"quality": quality}
+    screenshot.save(buffered := BytesIO(), format=SCREENSHOT_FORMATS[codec][0], **kwargs)
+    return buffered.getvalue()
 
-    return send_file(file_path, mimetype='image/png')
+
+def _changed_tiles(base: np.ndarray, frame: np.ndarray, tile: int) -> List[Tuple[int, int]]:
+    changed = (base != frame).reshape(*frame.shape[:2], -1).any(axis=2)
+    rows, cols = -(-changed.shape[0] // tile), -(-changed.shape[1] // tile)
+    padded = np.zeros((rows * tile, cols * tile), dtype=bool)
+    padded[:changed.shape[0], :changed.shape[1]] = changed
+    tiles = padded.reshape(rows, tile, cols, tile).any(axis=(1, 3))
+    return [(int(col) * tile, int(row) * tile) for row, col in zip(*np.nonzero(tiles))]
+
+
+# returns (body, mimetype) of screenshot following args from _screenshot_args()
+def _screenshot_body(screenshot: Image.Image, args: Dict[str, Any]) -> Tuple[bytes, str]:
+    codec, quality = args["format"], args["quality"]
+    screenshot = _resize_screen(screenshot, args).convert("RGB")
+
+    delta, tile = args["delta"], args["tile"]
+    if delta is None:
+        return _encode_screen(screenshot, codec, quality), SCREENSHOT_FORMATS[codec][1]
+
+    frame = np.asarray(screenshot)
+    with last_frame_lock:
+        base = last_frame["frame"]
+        if base is not None and last_frame["id"] == delta and base.shape == frame.shape:
+            tiles = _changed_tiles(base, frame, tile)
+        else:
+            tiles = None
+
+        # fall back to a full frame if most of the screen changed
+        total = -(-frame.shape[0] // tile) * -(-frame.shape[1] // tile)
+        if tiles is None or len(tiles) * 2 > total:
+            patches = [(0, 0, screenshot)]
+        else:
+            patches = [(x, y, screenshot.crop((
+                x,
+                y,
+                min(x + tile, screenshot.width),
+                min(y + tile, screenshot.height)
+            ))) for x, y in tiles]
+
+        last_frame["id"] += 1
+        last_frame["frame"] = frame
+        frame_id = last_frame["id"]
+
+    return json.dumps({
+        "id": frame_id,
+        "width": screenshot.width,
+        "height": screenshot.height,
+        "format": codec,
+        "tile": tile,
+        "tiles": [
+            [x, y, base64.b64encode(_encode_screen(patch, codec, quality)).decode()]
+            for x, y, patch in patches
+        ]
+    }).encode("utf-8"), "application/json"
+
+
+# query params (all optional; no params -> full-resolution PNG as before):
+# - width / height / scale: target size; aspect ratio is kept if only one side is given
+# - format / quality: png, jpeg or webp, encoded in memory
+# - delta: id of the frame held by the client; returns json of changed tiles
+#   {"id", "width", "height", "format", "tile", "tiles": [[x, y, base64], ...]}
+#   a single tile at (0, 0) covering the whole frame is sent if base is stale
+@app.route('/screenshot', methods=['GET'])
+def capture_screen_with_cursor():
+    # fixme: when running on virtual machines, the cursor is not captured, don't know why
+    args = _screenshot_args()
+    screenshot = _capture_screen()
+    if screenshot is None:
+        abort(500)
+
+    body, mimetype = _screenshot_body(screenshot, args)
+    return Response(body, mimetype=mimetype)
 
 
 def _has_active_terminal(desktop: Accessible) -> bool:
@@ -192,6 +318,32 @@ def _has_active_terminal(desktop: Accessible) -> bool:
     return False
 
 
+# 1. the terminal window (frame of application is st:active) is open and active
+# 2. the terminal tab (terminal status is st:focused) is focused
+TERMINAL_XPATH = '//application[@name="gnome-terminal-server"]/frame[@st:active="true"]//terminal[@st:focused="true"]'
+OBSERVE_RETRY = 2
+# the same as Manager._changed() of sci/base/manager.py:
+# UI is stable if at most CHANGE_TOLERANCE of pixels in downscaled frames
+# differ by more than PIXEL_TOLERANCE, so that blinking carets are ignored
+OBSERVE_FRAME_WIDTH = 160
+OBSERVE_PIXEL_TOLERANCE = 16
+OBSERVE_CHANGE_TOLERANCE = 0.002
+
+
+def _observe_frame(screenshot: Image.Image) -> Image.Image:
+    frame = screenshot.convert("L")
+    frame.thumbnail((OBSERVE_FRAME_WIDTH, OBSERVE_FRAME_WIDTH))
+    return frame
+
+
+def _observe_stable(last: Image.Image, current: Image.Image) -> bool:
+    if last.size != current.size:
+        return False
+    histogram = ImageChops.difference(last, current).histogram()
+    changed = sum(histogram[OBSERVE_PIXEL_TOLERANCE + 1:])
+    return changed <= OBSERVE_CHANGE_TOLERANCE * last.width * last.height
+
+
 @app.route('/terminal', methods=['GET'])
 def get_terminal_output():
     user_platform = platform.system()
@@ -200,11 +352,8 @@ def get_terminal_output():
         if user_platform == "Linux":
             desktop: Accessible = pyatspi.Registry.getDesktop(0)
             if _has_active_terminal(desktop):
-                desktop_xml: _Element = _create_atspi_node(desktop)
-                # 1. the terminal window (frame of application is st:active) is open and active
-                # 2. the terminal tab (terminal status is st:focused) is focused
-                xpath = '//application[@name="gnome-terminal-server"]/frame[@st:active="true"]//terminal[@st:focused="true"]'
-                terminals: List[_Element] = desktop_xml.xpath(xpath, namespaces=_accessibility_ns_map_ubuntu)
+                desktop_xml: _Element = _accessibility_xml(["gnome-terminal-server"])
+                terminals: List[_Element] = desktop_xml.xpath(TERMINAL_XPATH, namespaces=_accessibility_ns_map_ubuntu)
                 output = terminals[0].text.rstrip() if len(terminals) == 1 else None
         else:  # windows and macos platform is not implemented currently
             # raise NotImplementedError
@@ -659,20 +808,107 @@ def _create_axui_node(node, nodes: set = None, depth: int = 0, bbox: tuple = Non
     return xml_node
 
 
-@app.route("/accessibility", methods=["GET"])
-def get_accessibility_tree():
+# subtrees of applications are cached and served until any event below
+# is emitted from the application; listeners run in a daemon thread
+# text and name changes are also listened, as they alter the tree as well
+class _AtspiCache:
+    EVENTS = [
+        "object:children-changed",
+        "object:state-changed",
+        "object:bounds-changed",
+        "object:text-changed",
+        "object:property-change:accessible-name"
+    ]
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        # app key -> times of invalidation
+        self.versions: Dict[Tuple[str, Optional[int]], int] = {}
+        # app key -> (version when walked, subtree)
+        self.trees: Dict[Tuple[str, Optional[int]], Tuple[int, _Element]] = {}
+        self.listening = False
+
+    @staticmethod
+    def key(app_node: Accessible) -> Tuple[str, Optional[int]]:
+        try:
+            return app_node.name, app_node.get_process_id()
+        except Exception:
+            return app_node.name, None
+
+    def listen(self) -> None:
+        if self.listening:
+            return
+
+        def callback(event) -> None:
+            try:
+                app_node = event.host_application
+                if app_node is None:
+                    return
+                key = _AtspiCache.key(app_node)
+            except Exception:
+                return
+            with self.lock:
+                self.versions[key] = self.versions.get(key, 0) + 1
+
+        def run() -> None:
+            try:
+                pyatspi.Registry.registerEventListener(callback, *self.EVENTS)
+                self.listening = True
+                pyatspi.Registry.start()
+            except Exception as e:
+                logger.warning("AT-SPI cache disabled. Error: %s", e)
+            self.listening = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def clear(self) -> None:
+        with self.lock:
+            self.trees.clear()
+
+    # cached subtrees are copied, as lxml moves elements when appended
+    def __call__(self, app_node: Accessible) -> _Element:
+        key = _AtspiCache.key(app_node)
+        with self.lock:
+            version = self.versions.get(key, 0)
+            if self.listening and key in self.trees and self.trees[key][0] == version:
+                return copy.deepcopy(self.trees[key][1])
+
+        xml_tree = _create_atspi_node(app_node, 1)
+        with self.lock:
+            self.trees[key] = (version, xml_tree)
+        return copy.deepcopy(xml_tree)
+
+
+atspi_cache = _AtspiCache()
+
+
+# whether name of app contains any of the given names (case-insensitive)
+def _match_app(app_name: str, apps: Optional[List[str]]) -> bool:
+    return apps is None or any([name.lower() in (app_name or "").lower() for name in apps])
+
+
+def _accessibility_apps() -> Optional[List[str]]:
+    apps = request.args.get("app")
+    return None if apps is None else [name.strip() for name in apps.split(",") if name.strip()]
+
+
+def _accessibility_xml(apps: Optional[List[str]] = None) -> Optional[_Element]:
     os_name: str = platform.system()
 
     # AT-SPI works for KDE as well
     if os_name == "Linux":
+        atspi_cache.listen()
         desktop: Accessible = pyatspi.Registry.getDesktop(0)
         xml_node = lxml.etree.Element("desktop-frame", nsmap=_accessibility_ns_map_ubuntu)
         with concurrent.futures.ThreadPoolExecutor() as executor:
-            futures = [executor.submit(_create_atspi_node, app_node, 1) for app_node in desktop]
+            futures = [
+                executor.submit(atspi_cache, app_node) for app_node in desktop
+                if _match_app(app_node.name, apps)
+            ]
             for future in concurrent.futures.as_completed(futures):
                 xml_tree = future.result()
                 xml_node.append(xml_tree)
-        return jsonify({"AT": lxml.etree.tostring(xml_node, encoding="unicode")})
+        return xml_node
 
     elif os_name == "Windows":
         # Attention: Windows a11y tree is implemented to be read through `pywinauto` module, however,
@@ -680,11 +916,14 @@ def get_accessibility_tree():
         desktop: Desktop = Desktop(backend="uia")
         xml_node = lxml.etree.Element("desktop", nsmap=_accessibility_ns_map_windows)
         with concurrent.futures.ThreadPoolExecutor() as executor:
-            futures = [executor.submit(_create_pywinauto_node, wnd, 1) for wnd in desktop.windows()]
+            futures = [
+                executor.submit(_create_pywinauto_node, wnd, 1) for wnd in desktop.windows()
+                if _match_app(wnd.window_text(), apps)
+            ]
             for future in concurrent.futures.as_completed(futures):
                 xml_tree = future.result()
                 xml_node.append(xml_tree)
-        return jsonify({"AT": lxml.etree.tostring(xml_node, encoding="unicode")})
+        return xml_node
 
     elif os_name == "Darwin":
         xml_node = lxml.etree.Element("desktop", nsmap=_accessibility_ns_map_macos)
@@ -697,6 +936,7 @@ def get_accessibility_tree():
                      (Quartz.kCGWindowListExcludeDesktopElements | Quartz.kCGWindowListOptionOnScreenOnly),
                      Quartz.kCGNullWindowID, ) if
                  win["kCGWindowLayer"] == 0 and win["kCGWindowOwnerName"] != "Window Server"
+                 and _match_app(win["kCGWindowOwnerName"], apps)
                  ]]
 
             for future in concurrent.futures.as_completed(futures):
@@ -704,11 +944,87 @@ def get_accessibility_tree():
                 if xml_tree is not None:
                     xml_node.append(xml_tree)
 
-        return jsonify({"AT": lxml.etree.tostring(xml_node, encoding="unicode")})
+        return xml_node
 
     else:
+        return None
+
+
+# - app: comma-separated names of applications to be walked; all by default
+@app.route("/accessibility", methods=["GET"])
+def get_accessibility_tree():
+    xml_node = _accessibility_xml(_accessibility_apps())
+    if xml_node is None:
+        return "Currently not implemented for platform {:}.".format(platform.platform()), 500
+    return jsonify({"AT": lxml.etree.tostring(xml_node, encoding="unicode")})
+
+
+def _multipart(parts: Dict[str, Tuple[bytes, str]]) -> Response:
+    boundary = uuid.uuid4().hex
+    chunks = []
+    for name, (body, mimetype) in parts.items():
+        chunks.append((
+            f"--{boundary}\r\n"
+            f"Content-Type: {mimetype}\r\n"
+            f"Content-Disposition: form-data; name=\"{name}\"\r\n\r\n"
+        ).encode("utf-8") + body + b"\r\n")
+    chunks.append(f"--{boundary}--\r\n".encode("utf-8"))
+    return Response(b"".join(chunks), content_type=f"multipart/mixed; boundary={boundary}")
+
+
+# all requested modalities in a single multipart/mixed response
+# - types: comma-separated subset of screenshot, accessibility and terminal
+# - app: the same as /accessibility
+# - other query params are the same as /screenshot
+# the a11y tree is traversed once for both accessibility and terminal,
+# during which the screenshot is taken in another thread;
+# the screenshot is taken again after traversal to make sure that the UI is stable,
+# compared in downscaled frames with tolerance rather than byte by byte
+@app.route("/observe", methods=["GET"])
+def observe():
+    types = set(request.args.get("types", "screenshot,accessibility").split(","))
+    if not types <= {"screenshot", "accessibility", "terminal"}:
+        abort(400, description=f"Unsupported types: {types}")
+
+    args = _screenshot_args()
+    apps = _accessibility_apps()
+    if apps is not None and "terminal" in types:
+        apps.append("gnome-terminal-server")
+
+    need_tree = "accessibility" in types or "terminal" in types
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        for _ in range(OBSERVE_RETRY + 1):
+            future = executor.submit(_capture_screen) if "screenshot" in types else None
+            xml_node = _accessibility_xml(apps) if need_tree else None
+            screenshot = future.result() if future is not None else None
+            if screenshot is None or xml_node is None:
+                break
+            confirm = _capture_screen()
+            if confirm is not None \
+                and _observe_stable(_observe_frame(screenshot), _observe_frame(confirm)):
+                break
+
+    parts = {}
+    if "screenshot" in types:
+        if screenshot is None:
+            abort(500)
+        parts["screenshot"] = _screenshot_body(screenshot, args)
+
+    if need_tree and xml_node is None:
         return "Currently not implemented for platform {:}.".format(platform.platform()), 500
 
+    if "accessibility" in types:
+        parts["accessibility"] = (lxml.etree.tostring(xml_node, encoding="utf-8"), "application/xml")
+
+    if "terminal" in types:
+        output = None
+        if platform.system() == "Linux" and _has_active_terminal(pyatspi.Registry.getDesktop(0)):
+            terminals: List[_Element] = xml_node.xpath(TERMINAL_XPATH, namespaces=_accessibility_ns_map_ubuntu)
+            output = terminals[0].text.rstrip() if len(terminals) == 1 else None
+        parts["terminal"] = (json.dumps({"output": output}).encode("utf-8"), "application/json")
+
+    return _multipart(parts)
+
 
 @app.route('/screen_size', methods=['POST'])
 def get_screen_size():
@@ -1157,6 +1473,7 @@ def optimize():
     data = request.json
 
     MAX_DEPTH = data.get("depth", 50)
+    atspi_cache.clear()
     return "OK"
 
 @app.route("/read", methods=["GET"])
@@ -1200,20 +1517,150 @@ def chimerax_run():
         params={"command": command}
     ).json()
 
-@app.route("/lean/check", methods=["POST"])
-def lean_check():
-    data = request.json
-    header = data.get("header", "__PANIC__")
+# warm Lean REPL with Mathlib imported once
+# each check is run as a command forked from env of the imports,
+# so that only Basic.lean is elaborated instead of the whole project
+class _LeanREPL:
+    LAKE = "/home/user/.elan/bin/lake"
+    PROJECT_PATH = "/home/user/sci"
+    IMPORTS = ["import Mathlib"]
+    WARM_TIMEOUT = 900
+    CHECK_TIMEOUT = 300
+    RECYCLE_CHECKS = 200
+    # messages of header that REPL fails to run, which `lake build` may pass
+    HEADER_ERRORS = ("'import' command", "unknown module prefix", "unknown package")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.process = None
+        self.env = None
+        self.checks = 0
+
+    def kill(self):
+        if self.process is not None and self.process.poll() is None:
+            os.killpg(self.process.pid, signal.SIGKILL)
+            self.process.wait()
+        self.process, self.env = None, None
+
+    def __call(self, query: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        self.process.stdin.write(json.dumps(query) + "\n\n")
+        self.process.stdin.flush()
+
+        # stdout is read by another thread so that hung REPL can be killed
+        lines = []
+        def read():
+            while (line := self.process.stdout.readline()) != "":
+                if line == "\n" and len(lines) > 0:
+                    return
+                if line != "\n":
+                    lines.append(line)
+        reader = threading.Thread(target=read, daemon=True)
+        reader.start()
+        reader.join(timeout)
+
+        if reader.is_alive():
+            self.kill()
+            raise TimeoutError(f"Lean REPL did not respond in {timeout}s")
+        if len(lines) == 0:
+            self.kill()
+            raise EOFError("Lean REPL exited unexpectedly")
+        return json.loads("".join(lines))
+
+    # must be called with lock acquired
+    def __warm(self):
+        if self.process is not None and self.process.poll() is None \
+            and self.checks < self.RECYCLE_CHECKS:
+            return
+
+        self.kill()
+        self.process = subprocess.Popen(
+            [self.LAKE, "exe", "repl"],
+            cwd=self.PROJECT_PATH,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            start_new_session=True
+        )
+        self.checks = 0
+        output = self.__call({"cmd": "\n".join(self.IMPORTS)}, self.WARM_TIMEOUT)
+        assert "env" in output, f"Failed to import {self.IMPORTS}: {output}"
+        self.env = output["env"]
+
+    def warm(self):
+        with self.lock:
+            self.__warm()
+
+    # same semantics as `lake build`: no errors and no sorries
+    # raise if the header fails in REPL, so that callers fall back to `lake build`
+    def check(self, body: str) -> bool:
+        with self.lock:
+            self.__warm()
+            self.checks += 1
+            output = self.__call({"cmd": body, "env": self.env}, self.CHECK_TIMEOUT)
+
+        messages = output.get("messages", [])
+        assert not any([
+            message.get("severity") == "error"
+                and any([error in message.get("data", "") for error in self.HEADER_ERRORS])
+            for message in messages
+        ]), f"Header failed in REPL: {messages}"
+        no_sorry = len(output.get("sorries", [])) == 0 and all([
+            "declaration uses 'sorry'" not in message.get("data", "")
+            for message in messages
+        ])
+        no_error = "env" in output and all([
+            message.get("severity") != "error"
+            for message in messages
+        ])
+        return no_sorry and no_error
+
+lean_repl = _LeanREPL()
+
+# split header of file (comments and imports) from the rest of file
+# None if the header cannot be run in env of lean_repl, in which case
+# imports differ from those loaded, or some imports are left in the body
+def _lean_body(content: str) -> Optional[str]:
+    index, imports = 0, []
+    while index < len(content):
+        if content[index].isspace():
+            index += 1
+        elif content.startswith("--", index):
+            newline = content.find("\n", index)
+            index = len(content) if newline == -1 else newline
+        elif content.startswith("/-", index):
+            # block comments of Lean can be nested
+            depth, index = 1, index + 2
+            while depth > 0:
+                match = re.compile(r"/-|-/").search(content, index)
+                if match is None:
+                    return None
+                depth += 1 if match.group() == "/-" else -1
+                index = match.end()
+        elif re.match(r"import\s", content[index:index + 7]):
+            line = re.split(r"\n|--|/-", content[index:], maxsplit=1)[0]
+            modules = line.split()[1:]
+            if len(modules) == 0:
+                return None
+            imports.extend([f"import {module}" for module in modules])
+            index += len(line)
+        else:
+            break
 
-    with open("/home/user/sci/Sci/Basic.lean", mode="r", encoding="utf-8") as r:
-        if header not in r.read().split("\n"):
-            return {
-                "pass": False
-            }
+    body = content[index:]
+    if not set(imports).issubset(_LeanREPL.IMPORTS) \
+        or re.search(r"^\s*(import|prelude)\s", body, re.MULTILINE):
+        return None
+
+    # keep line and column numbers of messages the same as in file
+    header = content[:index]
+    column = len(header) - (header.rfind("\n") + 1)
+    return "\n" * header.count("\n") + " " * column + body
 
+def _lake_build() -> bool:
     lake = subprocess.run(
-        ["stdbuf", "-oL", "/home/user/.elan/bin/lake", "build"],
-        cwd="/home/user/sci",
+        ["stdbuf", "-oL", _LeanREPL.LAKE, "build"],
+        cwd=_LeanREPL.PROJECT_PATH,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
         text=True
@@ -1221,10 +1668,62 @@ def lean_check():
 
     no_sorry = "declaration uses 'sorry'" not in lake.stdout
     no_error = lake.returncode == 0
+    return no_sorry and no_error
+
+# load Mathlib in background while the task is running
+@app.route("/lean/warm", methods=["POST"])
+def lean_warm():
+    threading.Thread(target=lean_repl.warm, daemon=True).start()
+    return "OK"
+
+# fall back to `lake build` if the file imports other libs or REPL fails
+@app.route("/lean/check", methods=["POST"])
+def lean_check():
+    data = request.json
+    header = data.get("header", "__PANIC__")
+    start = time.time()
+
+    with open("/home/user/sci/Sci/Basic.lean", mode="r", encoding="utf-8") as r:
+        content = r.read()
+    if header not in content.split("\n"):
+        return {
+            "pass": False,
+            "mode": "header",
+            "latency": time.time() - start
+        }
+
+    body, mode = _lean_body(content), "repl"
+    try:
+        assert body is not None, "Header not supported by REPL"
+        passed = lean_repl.check(body)
+    except Exception as err:
+        logger.warning(f"Lean REPL check failed: {err}; fall back to lake build.")
+        passed, mode = _lake_build(), "build"
+
     return {
-        "pass": no_sorry and no_error
+        "pass": passed,
+        "mode": mode,
+        "latency": time.time() - start
     }
 
+# copied from sci/TeXstudio/compiler.py, which keeps aux files between checks
+try:
+    from compiler import Compiler
+except ImportError:
+    Compiler = None
+
+def _tex_serial(path: str, file: str, bibtex: bool) -> bool:
+    def sub_check(*args):
+        return subprocess.run(args, cwd=path, text=True).returncode != 0
+
+    if sub_check("pdflatex", f"{file}.tex"):
+        return False
+    if bibtex:
+        if sub_check("bibtex", f"{file}"):       return False
+        if sub_check("pdflatex", f"{file}.tex"): return False
+        if sub_check("pdflatex", f"{file}.tex"): return False
+    return True
+
 @app.route("/tex/check", methods=["POST"])
 def tex_check():
     data = request.json
@@ -1232,17 +1731,15 @@ def tex_check():
     file = data.get("file", "main")
     bibtex = data.get("bibtex", False)
 
-    passed = lambda arg: {"pass": bool(arg)}
-    def sub_check(*args):
-        return subprocess.run(args, cwd=path, text=True).returncode != 0
+    if Compiler is not None:
+        compiled = Compiler.get(path, file, preload=True)(bibtex=bibtex)
+        return {"pass": compiled.passed, **compiled._asdict()}
 
-    if sub_check("pdflatex", f"{file}.tex"):
-        return passed(False)
-    if bibtex:
-        if sub_check("bibtex", f"{file}"):       return passed(False)
-        if sub_check("pdflatex", f"{file}.tex"): return passed(False)
-        if sub_check("pdflatex", f"{file}.tex"): return passed(False)
-    return passed(True)
+    start = time.time()
+    return {
+        "pass": _tex_serial(path, file, bibtex),
+        "latency": time.time() - start
+    }
 
 if __name__ == '__main__':
     app.run(debug=True, host="0.0.0.0")